@@ -0,0 +1,149 @@
+# review_engine/claim_rules.py
+import re
+
+import numpy as np
+import pandas as pd
+
+from review_engine.statistical_rules import resolve_column
+
+# 叙述性字段：其中的数字结论需与账面数据核对
+NARRATIVE_COLUMNS = ['关键结论描述', 'management_discussion', 'kam_description']
+# 可核对的财务指标（长名在前，避免“应收账款”被“应收”截断）
+CLAIM_METRICS = ['营业收入', '营业成本', '净利润', '利润总额', '应收账款', '应付账款', '其他应收款',
+                 '预付账款', '存货', '货币资金', '固定资产', '资产总额', '总资产', '负债总额',
+                 '销售费用', '管理费用', '研发费用', '财务费用']
+# 英文账面列的别名 (本期, 上期)
+METRIC_ALIASES = {
+    '营业收入': (['ledger_revenue'], ['prior_ledger_revenue', 'prior_revenue']),
+    '净利润': (['net_profit'], ['prior_net_profit']),
+    '应收账款': (['accounts_receivable'], ['prior_accounts_receivable']),
+    '存货': (['inventory'], ['prior_inventory']),
+}
+DIRECTION_SIGNS = {'增长': 1, '增加': 1, '上升': 1, '提高': 1, '上涨': 1,
+                   '下降': -1, '减少': -1, '降低': -1, '下滑': -1, '下跌': -1}
+UNIT_SCALES = {'%': None, '元': 1.0, '万元': 1e4, '亿元': 1e8}
+
+# 一套编译好的模式对整列 extractall：指标 + 至多12个非数字的修饰字（余额、较上年……）+ 方向词（可无）+ 数值 + 单位
+CLAIM_PATTERN = re.compile(
+    '(?P<text>(?P<metric>' + '|'.join(sorted(CLAIM_METRICS, key=len, reverse=True)) + ')'
+    r'[^\d，。；,;]{0,12}?'
+    '(?P<direction>' + '|'.join(DIRECTION_SIGNS) + ')?'
+    r'(?:了|约|近|超过|达到?|为|至){0,3}'
+    r'(?P<value>\d[\d,]*(?:\.\d+)?)\s*'
+    r'(?P<unit>%|万元|亿元|元))'
+)
+
+
+def _ledger_columns(records_df, metric):
+    """(current, prior) ledger columns of a metric, each None if absent."""
+    current_aliases, prior_aliases = METRIC_ALIASES.get(metric, ([], []))
+    current = resolve_column(records_df, current_aliases + [f'{metric}余额', metric, f'{metric}_本期', f'本期{metric}'])
+    prior = resolve_column(records_df, prior_aliases + [f'上年{metric}余额', f'年初{metric}余额', f'{metric}_上年',
+                                                        f'{metric}_上期', f'上年{metric}'])
+    return current, prior
+
+
+def extract_claims(records_df, narrative_columns=None):
+    """Extracts numeric claims from every narrative column with a single compiled pattern.
+    Returns:
+        pd.DataFrame: One row per claim with row (position), column, metric, sign (+1/-1/0),
+                      value, unit and text (the matched claim).
+    """
+    columns = [c for c in (narrative_columns or NARRATIVE_COLUMNS) if c in records_df.columns]
+    frames = []
+    for column in columns:
+        texts = pd.Series(records_df[column].astype(str).to_numpy(), index=np.arange(len(records_df)))
+        matches = texts.str.extractall(CLAIM_PATTERN)
+        if matches.empty:
+            continue
+        frames.append(pd.DataFrame({
+            'row': matches.index.get_level_values(0).to_numpy(),
+            'column': column,
+            'metric': matches['metric'].to_numpy(),
+            'sign': matches['direction'].map(DIRECTION_SIGNS).fillna(0).astype(np.int8).to_numpy(),
+            'value': pd.to_numeric(matches['value'].str.replace(',', '', regex=False), errors='coerce').to_numpy(),
+            'unit': matches['unit'].to_numpy(),
+            'text': matches['text'].to_numpy(),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['row', 'column', 'metric', 'sign', 'value', 'unit', 'text'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def numeric_claim_mismatches(records_df, narrative_columns=None, pct_tolerance=2.0, amount_tolerance=0.01):
+    """Checks the numeric claims of narrative columns against ledger columns.
+    - Change claims ("应收账款余额较上年增长30%") are compared to (本期 - 上期) / |上期| of the metric;
+      a wrong direction or a gap above pct_tolerance percentage points is flagged.
+    - Amount claims ("营业收入为1,200万元", "营业收入增加500万元") are compared to the current balance,
+      or to the change when a direction word is present; a relative gap above amount_tolerance is flagged.
+    Claims whose metric has no ledger column in the batch are skipped.
+    Returns:
+        dict: {row position: details text}
+    """
+    if records_df.empty:
+        return {}
+    claims = extract_claims(records_df, narrative_columns)
+    if claims.empty:
+        return {}
+
+    # 按指标取账面列，一次性按行号广播到所有结论
+    current = np.full(len(claims), np.nan)
+    prior = np.full(len(claims), np.nan)
+    for metric in claims['metric'].unique():
+        current_col, prior_col = _ledger_columns(records_df, metric)
+        mask = (claims['metric'] == metric).to_numpy()
+        rows = claims['row'].to_numpy()[mask]
+        if current_col is not None:
+            current[mask] = pd.to_numeric(records_df[current_col], errors='coerce').to_numpy(dtype=np.float64)[rows]
+        if prior_col is not None:
+            prior[mask] = pd.to_numeric(records_df[prior_col], errors='coerce').to_numpy(dtype=np.float64)[rows]
+
+    sign = claims['sign'].to_numpy()
+    value = claims['value'].to_numpy(dtype=np.float64)
+    is_pct = (claims['unit'] == '%').to_numpy()
+    scale = claims['unit'].map(lambda unit: UNIT_SCALES[unit] or 1.0).to_numpy(dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        actual_pct = (current - prior) / np.abs(prior) * 100
+        claimed_pct = sign * value
+        pct_checkable = is_pct & (sign != 0) & np.isfinite(actual_pct)
+        pct_wrong = pct_checkable & ((np.sign(actual_pct) != sign) | (np.abs(actual_pct - claimed_pct) > pct_tolerance))
+
+        claimed_amount = value * scale * np.where(sign != 0, sign, 1)
+        actual_amount = np.where(sign != 0, current - prior, current)
+        amount_checkable = ~is_pct & np.isfinite(actual_amount)
+        amount_gap = np.abs(claimed_amount - actual_amount) / np.maximum(np.abs(actual_amount), 1.0)
+        amount_wrong = amount_checkable & (amount_gap > amount_tolerance)
+
+    flagged = {}
+    for i in np.flatnonzero(pct_wrong | amount_wrong):
+        if pct_wrong[i]:
+            actual = f"账面{'增长' if actual_pct[i] >= 0 else '下降'}{abs(actual_pct[i]):.1f}%"
+        else:
+            actual = f"账面{'变动' if sign[i] else '金额'}为 {actual_amount[i]:,.2f} 元"
+        detail = (f"{claims['column'].iat[i]}称“{claims['text'].iat[i]}”，{actual}"
+                  f"（本期 {current[i]:,.2f}" + (f" / 上期 {prior[i]:,.2f}）" if np.isfinite(prior[i]) else "）"))
+        row = int(claims['row'].iat[i])
+        flagged[row] = f"{flagged[row]}；{detail}" if row in flagged else detail
+    return flagged
+
+
+if __name__ == '__main__':
+    demo_df = pd.DataFrame({
+        '报告编号': ['AR1', 'AR2', 'AR3', 'AR4'],
+        '关键结论描述': ['应收账款余额较上年增长30%，主要由于客户回款延迟',
+                   '营业收入同比下降5%，净利润增加200万元',
+                   '存货余额较年初减少12.5%',
+                   '营业收入为1,200万元'],
+        '应收账款余额': [1_300_000, np.nan, np.nan, np.nan],
+        '上年应收账款余额': [1_150_000, np.nan, np.nan, np.nan],
+        'ledger_revenue': [np.nan, 9_600_000, np.nan, 12_000_000],
+        'prior_ledger_revenue': [np.nan, 10_000_000, np.nan, np.nan],
+        'net_profit': [np.nan, 1_500_000, np.nan, np.nan],
+        'prior_net_profit': [np.nan, 1_200_000, np.nan, np.nan],
+        '存货余额': [np.nan, np.nan, 875_000, np.nan],
+        '年初存货余额': [np.nan, np.nan, 1_000_000, np.nan],
+    })
+    print(extract_claims(demo_df).to_string())
+    for pos, details in numeric_claim_mismatches(demo_df).items():
+        print(f"{demo_df['报告编号'].iat[pos]}: {details}")
@@ -1,14 +1,37 @@
 # data_processing/data_loader.py
 import os
+import threading
+import time
 import pandas as pd
 import PyPDF2
 
+from data_processing.dtype_optimizer import optimize_dtypes, memory_report
+from data_processing.image_cache import ImageCache
+from data_processing.pdf_extractor import MappedDocument, PageParallelExtractor
+from data_processing.section_index import SectionIndex, build_section_index
+from data_processing.text_summarizer import document_hash
+
 class DataLoader:
-    def __init__(self):
-        pass
+    def __init__(self, section_index_dir='cache/section_index', image_cache_dir='cache/images',
+                 image_cache_bytes=512 * 1024 * 1024):
+        # 每份已提取PDF的章节索引，按内容哈希存放
+        self.section_index_dir = section_index_dir
+        self.section_indexes = {}
+        # 最近一次结构化数据压缩前后的逐列内存对比
+        self.last_memory_report = None
+        # 按页并行提取PDF的进程池，首次使用时创建
+        self._pdf_extractor = None
+        # 附件图片的OCR输入与缩略图缓存（按内容哈希，超出容量时淘汰最久未用的条目）
+        self.image_cache = ImageCache(image_cache_dir, max_bytes=image_cache_bytes)
+        self._pillow_missing = False
 
-    def load_structured_data(self, file_path):
-        """Loads structured data (e.g., CSV, Excel) from various sources like ERP or audit reports."""
+    def load_structured_data(self, file_path, optimize=True, arrow_strings=False):
+        """Loads structured data (e.g., CSV, Excel) from various sources like ERP or audit reports.
+        Args:
+            file_path (str): CSV or Excel file.
+            optimize (bool): Compact dtypes after loading (categoricals, booleans, downcast numerics).
+            arrow_strings (bool): Also store free-text columns as Arrow-backed strings (requires pyarrow).
+        """
         try:
             if file_path.endswith('.csv'):
                 df = pd.read_csv(file_path)
@@ -17,28 +40,58 @@ class DataLoader:
             else:
                 raise ValueError("Unsupported file format for structured data.")
             print(f"Successfully loaded structured data from: {file_path}")
+            if optimize:
+                compact_df = optimize_dtypes(df, arrow_strings=arrow_strings)
+                self.last_memory_report = memory_report(df, compact_df)
+                total = self.last_memory_report.iloc[-1]
+                print(f"Memory: {total['bytes_before'] / 1e6:.2f} MB -> {total['bytes_after'] / 1e6:.2f} MB "
+                      f"({total['reduction']:.1f}x smaller)")
+                df = compact_df
             return df
         except Exception as e:
             print(f"Error loading structured data from {file_path}: {e}")
             return None
 
     def load_image_data(self, image_path):
-        """Loads image data (e.g., scanned vouchers). Placeholder for actual image loading."""
-        # In a real application, this would use a library like Pillow (PIL)
+        """Loads image data (e.g., scanned vouchers).
+        The image is decoded once into a normalized (grayscale, binarized, deskewed, downscaled)
+        OCR input and a thumbnail, both cached by content hash; later calls reuse them.
+        Returns:
+            str: Path of the OCR input, or the original path when Pillow is not installed.
+        """
+        if self._pillow_missing:
+            return image_path
         try:
-            # Example: from PIL import Image; img = Image.open(image_path)
-            print(f"Simulating loading image data from: {image_path}")
-            # For now, just return the path as a placeholder
+            return self.image_cache.prepare(image_path)['ocr_path']
+        except ImportError as e:
+            print(f"{e} Using original images for OCR.")
+            self._pillow_missing = True
             return image_path
         except Exception as e:
             print(f"Error loading image data from {image_path}: {e}")
             return None
 
-    def load_document_data(self, doc_path):
-        """Loads document data (e.g., PDF attachments) and extracts text content."""
+    def load_image_thumbnail(self, image_path):
+        """Path of the cached thumbnail of an image, or None if it cannot be produced."""
+        if self._pillow_missing:
+            return None
+        try:
+            return self.image_cache.thumbnail(image_path)
+        except ImportError:
+            self._pillow_missing = True
+        except Exception as e:
+            print(f"Error creating thumbnail of {image_path}: {e}")
+        return None
+
+    def load_document_data(self, doc_path, workers=1):
+        """Loads document data (e.g., PDF attachments) and extracts text content.
+        Args:
+            doc_path (str): Document file.
+            workers (int): With more than one, PDF pages are extracted in parallel worker processes
+                           that share a read-only memory map of the file.
+        """
         import signal
-        import time
-        
+
         def timeout_handler(signum, frame):
             raise TimeoutError("PDF处理超时")
         
@@ -51,58 +104,31 @@ class DataLoader:
                 # 对于大文件设置超时
                 timeout_seconds = min(60, max(10, int(file_size * 2)))  # 根据文件大小动态设置超时
                 
-                # 设置超时处理（仅在非Windows系统上）
-                if os.name != 'nt':  # 非Windows系统
-                    signal.signal(signal.SIGALRM, timeout_handler)
-                    signal.alarm(timeout_seconds)
-                
                 start_time = time.time()
-                
-                with open(doc_path, 'rb') as file:
+                if workers > 1:
+                    # 工作进程中无法使用 SIGALRM，由提取器按截止时间丢弃未完成的页
+                    text, page_offsets = self._extract_pdf_parallel(doc_path, workers, timeout_seconds)
+                else:
+                    # 设置超时处理（仅在非Windows系统的主线程上：SIGALRM 在其他线程中会抛出 ValueError；
+                    # 接入守护进程与流水线的工作线程依靠逐页的截止时间检查）
+                    use_alarm = os.name != 'nt' and threading.current_thread() is threading.main_thread()
+                    if use_alarm:
+                        signal.signal(signal.SIGALRM, timeout_handler)
+                        signal.alarm(timeout_seconds)
                     try:
-                        reader = PyPDF2.PdfReader(file)
-                        total_pages = len(reader.pages)
-                        
-                        # 限制处理页数以避免超长处理时间
-                        max_pages = min(total_pages, 100)  # 最多处理100页
-                        
-                        text = ''
-                        for page_num in range(max_pages):
-                            # 检查处理时间
-                            if time.time() - start_time > timeout_seconds:
-                                print(f"PDF处理超时，已处理 {page_num} 页")
-                                break
-                                
-                            try:
-                                page_text = reader.pages[page_num].extract_text() or ''
-                                text += page_text
-                                
-                                # 每10页输出一次进度
-                                if (page_num + 1) % 10 == 0:
-                                    print(f"已处理 {page_num + 1}/{max_pages} 页")
-                                    
-                            except Exception as page_error:
-                                print(f"处理第 {page_num + 1} 页时出错: {page_error}")
-                                continue
-                        
-                        if total_pages > max_pages:
-                            text += f"\n\n[注意: 文档共{total_pages}页，仅处理了前{max_pages}页]"
-                            
-                    except Exception as pdf_error:
-                        if os.name != 'nt':
+                        text, page_offsets = self._extract_pdf_sequential(doc_path, start_time, timeout_seconds)
+                    finally:
+                        if use_alarm:
                             signal.alarm(0)  # 取消超时
-                        raise pdf_error
-                
-                if os.name != 'nt':
-                    signal.alarm(0)  # 取消超时
-                    
+
                 processing_time = time.time() - start_time
                 print(f"Successfully extracted text from PDF: {doc_path} (处理时间: {processing_time:.1f}秒)")
                 
                 if not text.strip():
                     print(f"警告: PDF文件 {doc_path} 可能是扫描版本，无法提取文本")
                     return "[PDF文件无法提取文本内容，可能需要OCR处理]"
-                    
+                
+                self._index_sections(text, page_offsets)
                 return text
             else:
                 # For other document types, just return the path for now or raise an error
@@ -116,6 +142,77 @@ class DataLoader:
             print(f"Error loading document data from {doc_path}: {e}")
             return None
 
+    def _extract_pdf_sequential(self, doc_path, start_time, timeout_seconds, max_pages=100):
+        """Extracts page by page in this process from a read-only memory map of the file."""
+        with MappedDocument(doc_path) as document:
+            reader = PyPDF2.PdfReader(document.stream())
+            total_pages = len(reader.pages)
+
+            # 限制处理页数以避免超长处理时间
+            max_pages = min(total_pages, max_pages)  # 最多处理100页
+
+            text = ''
+            page_offsets = []
+            for page_num in range(max_pages):
+                # 检查处理时间
+                if time.time() - start_time > timeout_seconds:
+                    print(f"PDF处理超时，已处理 {page_num} 页")
+                    break
+
+                # 提取失败的页也记录偏移（空区间），后续页的页码才不会错位
+                page_offsets.append(len(text))
+                try:
+                    page_text = reader.pages[page_num].extract_text() or ''
+                    text += page_text
+
+                    # 每10页输出一次进度
+                    if (page_num + 1) % 10 == 0:
+                        print(f"已处理 {page_num + 1}/{max_pages} 页")
+
+                except Exception as page_error:
+                    print(f"处理第 {page_num + 1} 页时出错: {page_error}")
+                    continue
+
+            if total_pages > max_pages:
+                text += f"\n\n[注意: 文档共{total_pages}页，仅处理了前{max_pages}页]"
+        return text, page_offsets
+
+    def _extract_pdf_parallel(self, doc_path, workers, timeout_seconds, max_pages=100):
+        """Extracts pages in worker processes that share a memory map of the file."""
+        if self._pdf_extractor is None or self._pdf_extractor.workers != workers:
+            if self._pdf_extractor is not None:
+                self._pdf_extractor.close()
+            self._pdf_extractor = PageParallelExtractor(workers=workers)
+        text, page_offsets, total_pages, processed = self._pdf_extractor.extract(
+            doc_path, max_pages=max_pages, timeout=timeout_seconds)
+        print(f"已处理 {processed}/{min(total_pages, max_pages)} 页（{workers} 个进程）")
+        if total_pages > max_pages:
+            text += f"\n\n[注意: 文档共{total_pages}页，仅处理了前{max_pages}页]"
+        return text, page_offsets
+
+    def _index_sections(self, text, page_offsets):
+        """Builds and saves the section index of an extracted document."""
+        doc_hash = document_hash(text)
+        section_index = build_section_index(text, doc_hash, page_offsets)
+        self.section_indexes[doc_hash] = section_index
+        try:
+            section_index.save(self.section_index_dir)
+        except OSError as e:
+            print(f"无法保存章节索引: {e}")
+        print(f"章节索引已建立: {', '.join(section_index.names())}")
+        return section_index
+
+    def get_section_index(self, text):
+        """Returns the section index of previously extracted text, loading it from disk if needed."""
+        doc_hash = document_hash(text)
+        section_index = self.section_indexes.get(doc_hash)
+        if section_index is None:
+            section_index = SectionIndex.load(self.section_index_dir, doc_hash)
+            if section_index is None:
+                section_index = build_section_index(text, doc_hash)
+            self.section_indexes[doc_hash] = section_index
+        return section_index
+
 if __name__ == '__main__':
     loader = DataLoader()
     # Example usage (assuming you have dummy files)
@@ -0,0 +1,124 @@
+# data_processing/dtype_optimizer.py
+import numpy as np
+import pandas as pd
+
+# 是/否类字段的取值对 (真值, 假值)，整列取值落在某一对之内时转为布尔
+BOOLEAN_PAIRS = [
+    ('是', '否'),
+    ('匹配', '不匹配'),
+    ('充分', '不充分'),
+    ('有', '无'),
+    ('Y', 'N'),
+    ('Yes', 'No'),
+    ('yes', 'no'),
+    ('TRUE', 'FALSE'),
+    ('True', 'False'),
+]
+# 叙述性长文本列：下游按字符串处理（填充空值、分词、正则抽取），不转为分类类型
+FREE_TEXT_COLUMNS = ('关键结论描述', 'management_discussion', 'kam_description', '审计报告全文', 'pdf_text')
+
+
+def _as_boolean(series):
+    """Returns series converted to bool, or None if it is not a complete Yes/No column.
+    Columns with blanks are left to the categorical path: pandas' nullable NA raises in the
+    boolean contexts the rule conditions use.
+    """
+    if series.empty or series.isna().any():
+        return None
+    uniques = set(series.unique())
+    for true_value, false_value in BOOLEAN_PAIRS:
+        if uniques <= {true_value, false_value}:
+            return series.map({true_value: True, false_value: False}).astype(bool)
+    return None
+
+
+def _downcast_numeric(series):
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        # 保持有符号类型：无符号列在相减或后续分块出现负数时会回绕或被静默升级
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        # 无空值且全为整数的浮点列转为整数；含空值时保留 NaN 语义，不转可空整数
+        if len(values) and np.isfinite(values).all() and np.array_equal(values, np.round(values)) \
+                and np.abs(values).max() < 2 ** 31:
+            return pd.to_numeric(series.astype(np.int64), downcast='integer')
+        # 金额等字段只有在 float32 可无损表示时才降精度，避免账面数据出现舍入误差
+        float32 = values.astype(np.float32)
+        if np.array_equal(float32.astype(np.float64), values, equal_nan=True):
+            return series.astype(np.float32)
+    return series
+
+
+def optimize_dtypes(records_df, categorical_ratio=0.5, max_categories=50000, arrow_strings=False,
+                    max_category_length=40):
+    """Compacts the dtypes of a loaded frame.
+    - Yes/No style text columns (是/否, 匹配/不匹配, ...) without blanks become bool.
+    - Other text columns whose distinct-value ratio is at most categorical_ratio become categoricals,
+      except free text (FREE_TEXT_COLUMNS, or an average length above max_category_length).
+    - Integers and floats are downcast to signed types where no precision is lost.
+    - With arrow_strings, remaining free-text columns use Arrow-backed strings (requires pyarrow).
+    Args:
+        records_df (pd.DataFrame): Frame to optimize (not modified).
+        categorical_ratio (float): Maximum distinct values / rows for a categorical.
+        max_categories (int): Maximum distinct values for a categorical.
+        arrow_strings (bool): Store remaining text columns as string[pyarrow].
+        max_category_length (int): Average text length above which a column is treated as free text.
+    Returns:
+        pd.DataFrame: The optimized copy.
+    """
+    if arrow_strings:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Arrow-backed strings require pyarrow (pip install pyarrow).")
+
+    optimized = {}
+    n_rows = max(len(records_df), 1)
+    for column in records_df.columns:
+        series = records_df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            optimized[column] = _downcast_numeric(series)
+            continue
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            optimized[column] = series
+            continue
+        as_bool = _as_boolean(series)
+        if as_bool is not None:
+            optimized[column] = as_bool
+            continue
+        n_unique = series.nunique(dropna=True)
+        free_text = column in FREE_TEXT_COLUMNS or \
+            series.dropna().astype(str).str.len().mean() > max_category_length
+        if not free_text and n_unique <= max_categories and n_unique / n_rows <= categorical_ratio:
+            optimized[column] = series.astype('category')
+        elif arrow_strings and series.map(lambda v: v is None or isinstance(v, str) or v != v).all():
+            optimized[column] = series.astype('string[pyarrow]')
+        else:
+            optimized[column] = series
+    return pd.DataFrame(optimized, index=records_df.index)
+
+
+def memory_report(before_df, after_df):
+    """Per-column memory (deep) and dtype before and after optimization, with a TOTAL row."""
+    before = before_df.memory_usage(deep=True, index=False)
+    after = after_df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'column': before.index,
+        'dtype_before': [str(before_df[c].dtype) for c in before.index],
+        'dtype_after': [str(after_df[c].dtype) for c in before.index],
+        'bytes_before': before.values,
+        'bytes_after': after.reindex(before.index).values,
+    })
+    total = pd.DataFrame([{'column': 'TOTAL', 'dtype_before': '', 'dtype_after': '',
+                           'bytes_before': int(before.sum()), 'bytes_after': int(after.sum())}])
+    report = pd.concat([report, total], ignore_index=True)
+    report['reduction'] = (report['bytes_before'] / report['bytes_after'].clip(lower=1)).round(2)
+    return report
+
+
+if __name__ == '__main__':
+    audit_df = pd.read_csv('audit_report_data.csv')
+    compact_df = optimize_dtypes(audit_df)
+    print(memory_report(audit_df, compact_df).to_string(index=False))
@@ -0,0 +1,183 @@
+# review_engine/duplicate_index.py
+import re
+
+import numpy as np
+import pandas as pd
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# 近似重复比较前去掉空白和标点
+_NORMALIZE_PATTERN = re.compile(r'[\s，。、；：！？,.;:!?"“”‘’()（）]+')
+
+
+def find_exact_duplicate_groups(records_df, key_columns):
+    """Groups rows that share the same values in key_columns using a hash index.
+    Rows with a missing value in any key column are ignored.
+    Args:
+        records_df (pd.DataFrame): Batch of records.
+        key_columns (list of str): Columns that together identify a record (e.g. invoice_code, invoice_number).
+    Returns:
+        list of np.ndarray: Row positions of every group with two or more members.
+    """
+    if any(col not in records_df.columns for col in key_columns) or records_df.empty:
+        return []
+    keys_df = records_df[list(key_columns)]
+    complete = keys_df.notna().all(axis=1).to_numpy()
+    positions = np.flatnonzero(complete)
+    if len(positions) < 2:
+        return []
+    hashes = pd.util.hash_pandas_object(keys_df.iloc[positions].astype(str), index=False).to_numpy()
+    return _groups_from_labels(hashes, positions)
+
+
+def _groups_from_labels(labels, positions):
+    """Returns groups (size >= 2) of positions that share a label."""
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    boundaries = np.flatnonzero(np.diff(sorted_labels)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(sorted_labels)]))
+    return [positions[order[start:end]] for start, end in zip(starts, ends) if end - start > 1]
+
+
+class MinHashLSH:
+    def __init__(self, num_perm=64, bands=16, shingle_size=3, threshold=0.8, seed=42):
+        """Near-duplicate text detection with MinHash signatures and LSH banding.
+        Args:
+            num_perm (int): Signature length. Must be divisible by bands.
+            bands (int): Number of LSH bands; more bands find lower-similarity pairs.
+            shingle_size (int): Character shingle length.
+            threshold (float): Minimum estimated Jaccard similarity to report a pair.
+            seed (int): Seed of the hash permutations, fixed so results are reproducible.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+    def _shingle_hashes(self, texts):
+        """Returns (doc_idx, shingle_hash) for every character shingle, computed column-wide."""
+        n = self.shingle_size
+        # 短于 shingle_size 的文本整体作为一个 shingle
+        texts = [t if len(t) >= n else t.ljust(n, '\0') for t in texts]
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        doc_of_char = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        windows = len(codes) - n + 1
+        if windows <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+        h = np.zeros(windows, dtype=np.uint64)
+        for offset in range(n):
+            h = (h * np.uint64(1000003) + codes[offset:offset + windows]) & _MAX_HASH
+        valid = doc_of_char[:windows] == doc_of_char[n - 1:]
+        return doc_of_char[:windows][valid], h[valid]
+
+    def signatures(self, texts):
+        """Computes MinHash signatures of all texts.
+        Returns:
+            np.ndarray: uint64 array of shape (len(texts), num_perm).
+        """
+        doc_idx, shingles = self._shingle_hashes(texts)
+        signatures = np.full((len(texts), self.num_perm), _MAX_HASH, dtype=np.uint64)
+        if len(shingles) == 0:
+            return signatures
+        # doc_idx 已按文档顺序排列，可用 reduceat 按文档求最小值
+        starts = np.flatnonzero(np.concatenate(([True], doc_idx[1:] != doc_idx[:-1])))
+        docs = doc_idx[starts]
+        for perm in range(self.num_perm):
+            permuted = ((self._a[perm] * shingles + self._b[perm]) % _MERSENNE_PRIME) & _MAX_HASH
+            signatures[docs, perm] = np.minimum.reduceat(permuted, starts)
+        return signatures
+
+    def find_groups(self, texts):
+        """Finds groups of near-duplicate texts in roughly linear time.
+        Args:
+            texts (list of str): Normalized texts.
+        Returns:
+            list of np.ndarray: Positions of every near-duplicate group with two or more members.
+        """
+        n_docs = len(texts)
+        if n_docs < 2:
+            return []
+        signatures = self.signatures(texts)
+        parent = np.arange(n_docs)
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        positions = np.arange(n_docs)
+        for band in range(self.bands):
+            band_rows = signatures[:, band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            bucket_keys = np.full(n_docs, band, dtype=np.uint64)
+            for column in range(self.rows_per_band):
+                bucket_keys = (bucket_keys * np.uint64(1000003)) ^ band_rows[:, column]
+            # 每个桶只与桶内第一个文档比较，避免桶内两两比较
+            for bucket in _groups_from_labels(bucket_keys, positions):
+                leader = bucket[0]
+                similarity = (signatures[bucket[1:]] == signatures[leader]).mean(axis=1)
+                for member in bucket[1:][similarity >= self.threshold]:
+                    root_a, root_b = find(leader), find(member)
+                    if root_a != root_b:
+                        parent[root_b] = root_a
+
+        roots = np.array([find(i) for i in range(n_docs)])
+        return _groups_from_labels(roots, positions)
+
+
+def find_near_duplicate_groups(records_df, text_column, lsh=None, min_length=10):
+    """Groups rows whose text_column values are near-identical.
+    Args:
+        records_df (pd.DataFrame): Batch of records.
+        text_column (str): Narrative column to compare (e.g. 关键结论描述).
+        lsh (MinHashLSH, optional): Configured detector. Defaults to MinHashLSH().
+        min_length (int): Normalized texts shorter than this are ignored.
+    Returns:
+        list of np.ndarray: Row positions of every group with two or more members.
+    """
+    if text_column not in records_df.columns or records_df.empty:
+        return []
+    # 先转对象列再填充空值：分类列不接受不在类别中的 ''
+    normalized = records_df[text_column].astype(object).fillna('').astype(str).str.replace(_NORMALIZE_PATTERN, '', regex=True)
+    eligible = np.flatnonzero((normalized.str.len() >= min_length).to_numpy())
+    if len(eligible) < 2:
+        return []
+    lsh = lsh or MinHashLSH()
+    groups = lsh.find_groups(normalized.iloc[eligible].tolist())
+    return [eligible[group] for group in groups]
+
+
+def groups_to_details(groups, report_ids, label):
+    """Turns duplicate groups into {row position: details text} for the violation output."""
+    details = {}
+    for group in groups:
+        ids = [str(report_ids[pos]) for pos in group]
+        for pos, own_id in zip(group, ids):
+            others = [other for other in ids if other != own_id][:5]
+            more = f" 等{len(ids) - 1}份" if len(ids) - 1 > 5 else ''
+            details[int(pos)] = f"{label}: 与报告 {', '.join(others)}{more} 重复"
+    return details
+
+
+if __name__ == '__main__':
+    reports_df = pd.read_csv('audit_report_data.csv')
+    text_groups = find_near_duplicate_groups(reports_df, '关键结论描述')
+    print(f"Near-duplicate 关键结论描述 groups: {len(text_groups)}")
+    for group in text_groups[:3]:
+        print(reports_df['报告编号'].iloc[group].tolist(), reports_df['关键结论描述'].iloc[group[0]])
+
+    invoices_df = pd.DataFrame({
+        'report_id': ['V001', 'V002', 'V003', 'V004'],
+        'invoice_code': ['1234567890', '1234567890', '1111111111', '1234567890'],
+        'invoice_number': ['98765432', '98765432', '98765432', '00000001'],
+    })
+    invoice_groups = find_exact_duplicate_groups(invoices_df, ['invoice_code', 'invoice_number'])
+    print(groups_to_details(invoice_groups, invoices_df['report_id'].tolist(), '发票重复使用'))
@@ -0,0 +1,98 @@
+# review_engine/history_rules.py
+import re
+
+import numpy as np
+import pandas as pd
+
+from review_engine.statistical_rules import resolve_column
+
+# 同比核对的财务指标列
+YOY_METRIC_COLUMNS = ['ledger_revenue', 'reported_revenue', '营业收入', 'net_profit', '净利润',
+                      'total_assets', '资产总额', '应收账款余额', '存货余额']
+OPINION_COLUMNS = ['审计意见', 'audit_opinion']
+KAM_COLUMNS = ['kam_description', '关键审计事项']
+# 关键审计事项按分隔符拆分为事项
+_KAM_SPLIT = re.compile(r'[；;。\n]|\d+[.、)]')
+
+
+def is_modified_opinion(opinions):
+    """True for qualified, adverse or disclaimer opinions (保留意见/否定意见/无法表示意见)."""
+    text = pd.Series(opinions).astype(str)
+    qualified = text.str.contains('保留意见', regex=False) & ~text.str.contains('无保留', regex=False)
+    return (qualified | text.str.contains('否定意见', regex=False)
+            | text.str.contains('无法表示意见', regex=False)).to_numpy()
+
+
+def yoy_growth_check(records_df, history_store, threshold=0.5, metric_columns=None):
+    """Flags metrics whose change against the prior-period report exceeds ±threshold.
+    Returns:
+        dict: {row position: details text}
+    """
+    metrics = [c for c in (metric_columns or YOY_METRIC_COLUMNS) if c in records_df.columns]
+    if not metrics or records_df.empty:
+        return {}
+    prior = history_store.prior_values(records_df, metrics)
+    if prior is None:
+        return {}
+    flagged = {}
+    for metric in metrics:
+        if f'prior_{metric}' not in prior.columns:
+            continue
+        current = pd.to_numeric(records_df[metric], errors='coerce').to_numpy(dtype=np.float64)
+        previous = pd.to_numeric(prior[f'prior_{metric}'], errors='coerce').to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (current - previous) / np.abs(previous)
+        for pos in np.flatnonzero(np.isfinite(growth) & (np.abs(growth) > threshold)):
+            detail = (f"{metric} 同比{'增长' if growth[pos] > 0 else '下降'}{abs(growth[pos]):.1%}"
+                      f"（本期 {current[pos]:,.2f} / 上期 {previous[pos]:,.2f}），超过±{threshold:.0%}")
+            flagged[int(pos)] = f"{flagged[int(pos)]}；{detail}" if int(pos) in flagged else detail
+    return flagged
+
+
+def opinion_change_check(records_df, history_store, opinion_col=None):
+    """Flags reports whose opinion became modified while the prior period's was unmodified.
+    Returns:
+        dict: {row position: details text}
+    """
+    opinion_col = opinion_col or resolve_column(records_df, OPINION_COLUMNS)
+    if opinion_col is None or records_df.empty:
+        return {}
+    prior = history_store.prior_values(records_df, [opinion_col])
+    if prior is None or f'prior_{opinion_col}' not in prior.columns:
+        return {}
+    previous = prior[f'prior_{opinion_col}']
+    changed = is_modified_opinion(records_df[opinion_col]) & previous.notna().to_numpy() \
+        & ~is_modified_opinion(previous.fillna(''))
+    return {
+        int(pos): (f"审计意见由上期（{prior['prior_period_end'].iat[pos]:%Y-%m-%d}）的“{previous.iat[pos]}”"
+                   f"变为“{records_df[opinion_col].iat[pos]}”，需核实变更原因与披露")
+        for pos in np.flatnonzero(changed)
+    }
+
+
+def _kam_items(text):
+    if not isinstance(text, str):
+        return set()
+    return {item.strip() for item in _KAM_SPLIT.split(text) if len(item.strip()) >= 2}
+
+
+def kam_continuity_check(records_df, history_store, kam_col=None):
+    """Flags prior-period key audit matters that no longer appear this period.
+    Returns:
+        dict: {row position: details text}
+    """
+    kam_col = kam_col or resolve_column(records_df, KAM_COLUMNS)
+    if kam_col is None or records_df.empty:
+        return {}
+    prior = history_store.prior_values(records_df, [kam_col])
+    if prior is None or f'prior_{kam_col}' not in prior.columns:
+        return {}
+    previous = prior[f'prior_{kam_col}']
+    flagged = {}
+    # 连接已批量完成，这里只对有上期事项的行做集合比较
+    for pos in np.flatnonzero(previous.notna().to_numpy()):
+        current_text = str(records_df[kam_col].iat[pos])
+        dropped = [item for item in sorted(_kam_items(previous.iat[pos])) if item not in current_text]
+        if dropped:
+            flagged[int(pos)] = f"上期关键审计事项本期未再列示：{'；'.join(dropped)}"
+    return flagged
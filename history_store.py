@@ -0,0 +1,208 @@
+# database/history_store.py
+import os
+import zlib
+from collections import OrderedDict
+
+import pandas as pd
+
+# 历史报告的单位与期间列候选，按顺序取第一个存在的列
+HISTORY_ENTITY_COLUMNS = ['被审计单位', 'entity']
+HISTORY_PERIOD_COLUMNS = ['报告期间', 'period', '年度', 'audit_period']
+_DATE_PATTERN = r'(\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2})'
+_YEAR_PATTERN = r'(\d{4})(?!.*\d{4})'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("The history store requires pyarrow (pip install pyarrow).")
+
+
+def _resolve(records_df, column, candidates):
+    if column is not None:
+        return column if column in records_df.columns else None
+    return next((c for c in candidates if c in records_df.columns), None)
+
+
+def period_end(periods):
+    """Normalizes period values ('2024', '2024年度', '2024-01-01 to 2024-12-31', ...) to the
+    period end date: the last date in the text, otherwise December 31 of the last year mentioned.
+    """
+    text = pd.Series(periods).astype(str)
+    # 整批都没有完整日期时 str[-1] 得到全空的浮点列，先转回字符串类型再做替换
+    last_date = text.str.findall(_DATE_PATTERN).str[-1].astype('string')
+    parsed = pd.to_datetime(last_date.str.replace(r'[年月/.]', '-', regex=True), errors='coerce')
+    year_end = pd.to_datetime(text.str.extract(_YEAR_PATTERN)[0] + '-12-31', errors='coerce')
+    return parsed.fillna(year_end)
+
+
+class HistoryStore:
+    def __init__(self, root_dir='data/history', retention_years=10, n_buckets=64, cache_files=64):
+        """On-disk history of past reports indexed by (被审计单位, period).
+        Reports are stored as Parquet files partitioned by entity bucket and year
+        (root/bucket=NN/year=YYYY.parquet), so a lookup reads only the buckets of the entities in
+        the batch and only the years it needs. Files are loaded lazily and kept in a small LRU.
+        Args:
+            root_dir (str): Directory of the partitioned store.
+            retention_years (int): Years kept; older partitions are removed on append.
+            n_buckets (int): Entity hash buckets.
+            cache_files (int): Partition files kept in memory.
+        """
+        self.root_dir = root_dir
+        self.retention_years = retention_years
+        self.n_buckets = n_buckets
+        self.cache_files = cache_files
+        self._cache = OrderedDict()
+
+    # --- partitions ---------------------------------------------------------
+    def _bucket(self, entity):
+        return zlib.crc32(str(entity).encode('utf-8')) % self.n_buckets
+
+    def _partition_path(self, bucket, year):
+        return os.path.join(self.root_dir, f"bucket={bucket:02d}", f"year={year}.parquet")
+
+    def _years(self, bucket):
+        bucket_dir = os.path.dirname(self._partition_path(bucket, 0))
+        if not os.path.isdir(bucket_dir):
+            return []
+        return sorted(int(name[5:-8]) for name in os.listdir(bucket_dir)
+                      if name.startswith('year=') and name.endswith('.parquet'))
+
+    def _read_partition(self, bucket, year):
+        key = (bucket, year)
+        frame = self._cache.get(key)
+        if frame is None:
+            frame = pd.read_parquet(self._partition_path(bucket, year))
+            self._cache[key] = frame
+            while len(self._cache) > self.cache_files:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return frame
+
+    def _normalize(self, records_df, entity_col=None, period_col=None):
+        """Adds the _entity and _period_end index columns; rows without either are dropped."""
+        entity_col = _resolve(records_df, entity_col, HISTORY_ENTITY_COLUMNS)
+        period_col = _resolve(records_df, period_col, HISTORY_PERIOD_COLUMNS)
+        if entity_col is None or period_col is None:
+            return None
+        normalized = records_df.copy()
+        normalized['_entity'] = records_df[entity_col].astype(str).str.strip().to_numpy()
+        normalized['_period_end'] = period_end(records_df[period_col]).astype('datetime64[ns]').to_numpy()
+        valid = normalized['_period_end'].notna() & (normalized['_entity'] != '') & records_df[entity_col].notna().to_numpy()
+        return normalized[valid.to_numpy()]
+
+    # --- writing ------------------------------------------------------------------
+    def append(self, records_df, entity_col=None, period_col=None):
+        """Adds reports to the history; a report of the same (entity, period) replaces the old one.
+        Returns:
+            int: Number of reports stored.
+        """
+        _require_pyarrow()
+        normalized = self._normalize(records_df, entity_col, period_col)
+        if normalized is None or normalized.empty:
+            return 0
+        # 分类等压缩类型统一还原为对象列，保证各分区文件的结构一致
+        for column in normalized.columns:
+            if isinstance(normalized[column].dtype, pd.CategoricalDtype):
+                normalized[column] = normalized[column].astype(object)
+        buckets = normalized['_entity'].map(self._bucket)
+        years = normalized['_period_end'].dt.year
+        for (bucket, year), part in normalized.groupby([buckets, years], sort=False):
+            path = self._partition_path(bucket, year)
+            if os.path.exists(path):
+                part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+            part = part.drop_duplicates(['_entity', '_period_end'], keep='last')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            part.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            self._cache.pop((bucket, year), None)
+        self.prune(int(years.max()) - self.retention_years + 1)
+        return len(normalized)
+
+    def prune(self, oldest_year):
+        """Removes partitions of years before oldest_year."""
+        for bucket in range(self.n_buckets):
+            for year in self._years(bucket):
+                if year < oldest_year:
+                    os.remove(self._partition_path(bucket, year))
+                    self._cache.pop((bucket, year), None)
+
+    # --- lookups ---------------------------------------------------------------------
+    def load(self, entities, min_year=None, max_year=None):
+        """History of the given entities, reading only their buckets and the requested years."""
+        entities = {str(entity).strip() for entity in entities}
+        frames = []
+        for bucket in sorted({self._bucket(entity) for entity in entities}):
+            for year in self._years(bucket):
+                if (min_year is None or year >= min_year) and (max_year is None or year <= max_year):
+                    frame = self._read_partition(bucket, year)
+                    frames.append(frame[frame['_entity'].isin(entities)])
+        if not frames:
+            return pd.DataFrame(columns=['_entity', '_period_end'])
+        history = pd.concat(frames, ignore_index=True)
+        history['_period_end'] = pd.to_datetime(history['_period_end']).astype('datetime64[ns]')
+        return history
+
+    def prior_values(self, records_df, columns, entity_col=None, period_col=None, max_gap_days=400):
+        """Prior-period values of each report, joined for the whole batch at once.
+        For every row, the latest stored report of the same entity with an earlier period end
+        (at most max_gap_days earlier) is matched with pd.merge_asof.
+        Args:
+            records_df (pd.DataFrame): Current batch.
+            columns (list of str): Columns to fetch from the prior report.
+        Returns:
+            pd.DataFrame: Positionally aligned with records_df, with 'prior_period_end' and
+                          'prior_<column>' for each requested column present in the history
+                          (NaN where there is no prior report). None if the batch has no entity
+                          or period column.
+        """
+        normalized = self._normalize(records_df.reset_index(drop=True), entity_col, period_col)
+        if normalized is None:
+            return None
+        result = pd.DataFrame(index=range(len(records_df)))
+        result['prior_period_end'] = pd.NaT
+        if normalized.empty:
+            return result
+        first_year = int(normalized['_period_end'].dt.year.min()) - max(1, max_gap_days // 365 + 1)
+        history = self.load(normalized['_entity'].unique(), min_year=first_year,
+                            max_year=int(normalized['_period_end'].dt.year.max()))
+        if history.empty:
+            return result
+        available = [c for c in columns if c in history.columns]
+
+        left = normalized[['_entity', '_period_end']].copy()
+        left['_pos'] = left.index
+        right = history[['_entity', '_period_end'] + available].copy()
+        right['prior_period_end'] = right['_period_end']
+        right = right.rename(columns={c: f'prior_{c}' for c in available})
+        merged = pd.merge_asof(left.sort_values('_period_end'), right.sort_values('_period_end'),
+                               on='_period_end', by='_entity', direction='backward',
+                               allow_exact_matches=False, tolerance=pd.Timedelta(days=max_gap_days))
+        merged = merged.set_index('_pos')
+        for column in ['prior_period_end'] + [f'prior_{c}' for c in available]:
+            result[column] = merged[column].reindex(result.index)
+        return result
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Imports past audit reports into the history store.")
+    parser.add_argument('files', nargs='+', help="CSV or Excel files of past reports")
+    parser.add_argument('--root', default='data/history')
+    parser.add_argument('--entity-col')
+    parser.add_argument('--period-col')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.root)
+    for path in args.files:
+        frame = pd.read_csv(path) if path.lower().endswith('.csv') else pd.read_excel(path)
+        stored = store.append(frame, entity_col=args.entity_col, period_col=args.period_col)
+        print(f"{path}: {stored}/{len(frame)} reports stored")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# data_processing/image_cache.py
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# 纠偏搜索范围与步长（度）；扫描件的倾斜通常在几度以内
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+
+
+def _require_pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise ImportError("Image preprocessing requires Pillow (pip install Pillow).")
+    return Image, ImageOps
+
+
+def otsu_threshold(gray):
+    """Otsu's threshold of a uint8 grayscale array."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def estimate_skew(gray_image, max_angle=DESKEW_MAX_ANGLE, step=DESKEW_STEP, probe_side=600):
+    """Skew angle (degrees) that makes text lines horizontal, by the projection-profile method:
+    the rotation whose row sums of ink vary the most aligns the lines with the rows.
+    """
+    Image, _ = _require_pillow()
+    probe = gray_image.copy()
+    probe.thumbnail((probe_side, probe_side))
+    ink = np.asarray(probe) < otsu_threshold(np.asarray(probe))
+    ink_image = Image.fromarray((ink * 255).astype(np.uint8))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = np.asarray(ink_image.rotate(float(angle), resample=Image.NEAREST, fillcolor=0))
+        score = float(np.var(rotated.sum(axis=1, dtype=np.int64)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+class ImageCache:
+    def __init__(self, cache_dir='cache/images', max_bytes=512 * 1024 * 1024, ocr_max_side=2400,
+                 thumbnail_size=(160, 160), binarize=True, deskew=True):
+        """Decodes each attachment image once and caches its OCR input and GUI thumbnail.
+        Entries are keyed by the SHA-256 of the file content, so renamed or re-imported copies hit
+        the cache. The least recently used entries are evicted when the cache exceeds max_bytes.
+        Args:
+            cache_dir (str): Directory of the cached PNGs and the index.
+            max_bytes (int): Size budget of all cached files.
+            ocr_max_side (int): Longest side of the OCR input; larger scans are downscaled.
+            thumbnail_size (tuple): Bounding box of the thumbnail.
+            binarize (bool): Otsu-binarize the OCR input (otherwise normalized grayscale).
+            deskew (bool): Straighten skewed scans before OCR.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ocr_max_side = ocr_max_side
+        self.thumbnail_size = tuple(thumbnail_size)
+        self.binarize = binarize
+        self.deskew = deskew
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable image cache index {self.index_path}: {e}")
+
+    # --- paths and index ------------------------------------------------------
+    def _paths(self, digest):
+        return (os.path.join(self.cache_dir, f"{digest}.ocr.png"),
+                os.path.join(self.cache_dir, f"{digest}.thumb.png"))
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits its budget. Caller holds the lock."""
+        total = sum(entry['bytes'] for entry in self._entries.values())
+        for digest, entry in sorted(self._entries.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(digest):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= entry['bytes']
+            del self._entries[digest]
+            self.stats['evictions'] += 1
+
+    def is_cached_output(self, path):
+        """True for an OCR input or thumbnail produced by this cache."""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.cache_dir)
+
+    # --- preprocessing -----------------------------------------------------------
+    def _preprocess(self, data):
+        """Decodes image bytes once and returns (ocr_image, thumbnail, info)."""
+        Image, ImageOps = _require_pillow()
+        # 内存中的字节流无需关闭；按EXIF方向摆正手机拍摄的凭证
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        width, height = image.size
+
+        thumbnail = image.convert('RGB')
+        thumbnail.thumbnail(self.thumbnail_size)
+
+        gray = ImageOps.autocontrast(image.convert('L'), cutoff=1)
+        # 先缩小再纠偏，旋转与阈值计算都在较小的图上进行
+        if max(gray.size) > self.ocr_max_side:
+            gray.thumbnail((self.ocr_max_side, self.ocr_max_side), Image.LANCZOS)
+        skew = estimate_skew(gray) if self.deskew else 0.0
+        if skew:
+            gray = gray.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        if self.binarize:
+            threshold = otsu_threshold(np.asarray(gray))
+            gray = gray.point(lambda value: 255 if value > threshold else 0, mode='1')
+        return gray, thumbnail, {'width': width, 'height': height, 'skew': skew}
+
+    def prepare(self, image_path):
+        """Returns the cache entry of an image, preprocessing it on first sight.
+        Returns:
+            dict: {'hash', 'ocr_path', 'thumbnail_path', 'width', 'height', 'skew'}
+        """
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        ocr_path, thumbnail_path = self._paths(digest)
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and os.path.exists(ocr_path) and os.path.exists(thumbnail_path):
+                entry['last_used'] = time.time()
+                self.stats['hits'] += 1
+                return dict(entry, hash=digest, ocr_path=ocr_path, thumbnail_path=thumbnail_path)
+            self.stats['misses'] += 1
+
+        ocr_image, thumbnail, info = self._preprocess(data)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        ocr_image.save(ocr_path, optimize=True)
+        thumbnail.save(thumbnail_path, optimize=True)
+
+        with self._lock:
+            info.update(bytes=os.path.getsize(ocr_path) + os.path.getsize(thumbnail_path), last_used=time.time())
+            self._entries[digest] = info
+            self._evict()
+            self._save_index()
+        return dict(info, hash=digest, ocr_path=ocr_path, thumbnail_path=thumbnail_path)
+
+    def ocr_input(self, image_path):
+        """Path of the preprocessed OCR input of an image (unchanged if it already is one)."""
+        if self.is_cached_output(image_path):
+            return image_path
+        return self.prepare(image_path)['ocr_path']
+
+    def thumbnail(self, image_path):
+        """Path of the GUI thumbnail of an image."""
+        return self.prepare(image_path)['thumbnail_path']
+
+    def flush(self):
+        """Persists last-use times updated by cache hits."""
+        with self._lock:
+            self._save_index()
+
+    def size_bytes(self):
+        with self._lock:
+            return sum(entry['bytes'] for entry in self._entries.values())
+
+
+if __name__ == '__main__':
+    import sys
+
+    cache = ImageCache()
+    for path in sys.argv[1:]:
+        started = time.perf_counter()
+        entry = cache.prepare(path)
+        print(f"{path}: {entry['width']}x{entry['height']}, skew {entry['skew']:+.1f}°, "
+              f"OCR input {entry['ocr_path']} ({time.perf_counter() - started:.3f}s)")
+    cache.flush()
+    print(f"Cache: {cache.size_bytes() / 1e6:.1f} MB, {cache.stats}")
@@ -0,0 +1,343 @@
+# data_processing/ingest_daemon.py
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+# 各类文件的处理方式
+STRUCTURED_EXTENSIONS = ('.csv', '.xls', '.xlsx')
+DOCUMENT_EXTENSIONS = ('.pdf',)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+# ERP 写入过程中常见的临时文件
+TEMPORARY_SUFFIXES = ('.tmp', '.part', '.partial', '.crdownload', '~')
+# 写入结果库时使用的报告编号、单位与期间列候选
+REPORT_ID_COLUMNS = ['报告ID', '报告编号', 'report_id']
+ENTITY_COLUMNS = ['被审计单位', 'entity']
+PERIOD_COLUMNS = ['报告期间', 'period', '年度']
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestState:
+    def __init__(self, state_path, max_attempts=5, retry_backoff=60.0):
+        """Per-file processing state persisted as JSON so restarts don't reprocess anything.
+        Entries are keyed by path and record size, mtime, content hash, outcome and attempts.
+        Args:
+            state_path (str): JSON state file.
+            max_attempts (int): Attempts of an unchanged file before it is left alone until it changes.
+            retry_backoff (float): Seconds before the first retry of a failed file; doubles per attempt.
+        """
+        self.state_path = state_path
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable ingest state {state_path}: {e}")
+
+    def is_done(self, path, size, mtime):
+        """True if the file needs no processing now: it was processed unchanged, or it failed and
+        its next retry is not yet due (or its attempts are used up)."""
+        entry = self.files.get(path)
+        if entry is None or entry['size'] != size or entry['mtime'] != mtime:
+            return False
+        if entry['status'] == 'done':
+            return True
+        # 失败的文件按指数退避重试；次数用完后等文件本身变化再处理
+        attempts = entry.get('attempts', 1)
+        if attempts >= self.max_attempts:
+            return True
+        return time.time() - entry['processed_at'] < self.retry_backoff * 2 ** (attempts - 1)
+
+    def seen_hash(self, content_hash):
+        return any(entry.get('hash') == content_hash and entry['status'] == 'done' for entry in self.files.values())
+
+    def mark(self, path, size, mtime, content_hash, status, message=''):
+        with self._lock:
+            previous = self.files.get(path)
+            attempts = 1
+            if status == 'failed' and previous is not None and previous['status'] == 'failed' \
+                    and (previous['size'], previous['mtime']) == (size, mtime):
+                attempts = previous.get('attempts', 1) + 1
+            self.files[path] = {'size': size, 'mtime': mtime, 'hash': content_hash, 'status': status,
+                                'message': message, 'processed_at': time.time(), 'attempts': attempts}
+            tmp_path = self.state_path + '.tmp'
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.files, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+
+
+class IngestDaemon:
+    def __init__(self, watch_dirs, state_path='cache/ingest_state.json', poll_interval=2.0,
+                 settle_seconds=5.0, queue_size=64, workers=2, on_result=None, max_attempts=5,
+                 retry_backoff=60.0, results_store=None):
+        """Long-running ingestion that watches folders and reviews new files incrementally.
+        Uses inotify through the optional 'watchdog' package when installed, otherwise polling.
+        Args:
+            watch_dirs (list of str): Directories to watch (recursively).
+            state_path (str): JSON file with per-file state.
+            poll_interval (float): Seconds between directory scans.
+            settle_seconds (float): A file must keep the same size and mtime this long before it
+                                    is considered completely written.
+            queue_size (int): Capacity of the work queue. When full, the scanner blocks (backpressure).
+            workers (int): Number of worker threads.
+            on_result (callable, optional): Called with (path, result dict) after each file.
+            max_attempts (int): Attempts of a failing file before it waits for the file to change.
+            retry_backoff (float): Seconds before the first retry of a failed file; doubles per attempt.
+            results_store (ResultsStore, optional): Where each file's reports and rule violations are
+                                                    saved, under one review run per daemon.
+        """
+        self.watch_dirs = [os.path.abspath(d) for d in watch_dirs]
+        self.state = IngestState(state_path, max_attempts=max_attempts, retry_backoff=retry_backoff)
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.work_queue = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.on_result = on_result
+        self.results_store = results_store
+        self.review_id = None
+        self._store_lock = threading.Lock()
+        self._pending = {}   # path -> (size, mtime, first_seen_stable)
+        self._queued = set()
+        self._inflight_hashes = set()
+        self._queued_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._observer = None
+
+        self._data_loader = None
+        self._ocr_processor = None
+        self._data_cleaner = None
+        self._rule_engine = None
+
+    def _engines(self):
+        """Creates the processing modules on first use (heavy imports)."""
+        if self._data_loader is None:
+            from data_processing.data_loader import DataLoader
+            from data_processing.ocr_processor import OCRProcessor
+            from data_processing.data_cleaner import DataCleaner
+            from review_engine.rule_engine import RuleEngine
+            self._data_loader = DataLoader()
+            self._ocr_processor = OCRProcessor()
+            self._data_cleaner = DataCleaner()
+            self._rule_engine = RuleEngine()
+        return self._data_loader, self._ocr_processor, self._data_cleaner, self._rule_engine
+
+    @staticmethod
+    def _is_candidate(path):
+        lower = path.lower()
+        if os.path.basename(lower).startswith(('.', '~$')) or lower.endswith(TEMPORARY_SUFFIXES):
+            return False
+        return lower.endswith(STRUCTURED_EXTENSIONS + DOCUMENT_EXTENSIONS + IMAGE_EXTENSIONS)
+
+    def _scan(self):
+        """Finds files that are new or changed and have stopped growing; queues them."""
+        now = time.monotonic()
+        for watch_dir in self.watch_dirs:
+            for root, _, names in os.walk(watch_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    if not self._is_candidate(path):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if self.state.is_done(path, stat.st_size, stat.st_mtime):
+                        continue
+                    with self._queued_lock:
+                        if path in self._queued:
+                            continue
+                    # 去抖：大小与修改时间在 settle_seconds 内保持不变才视为写入完成
+                    previous = self._pending.get(path)
+                    if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+                        self._pending[path] = (stat.st_size, stat.st_mtime, now)
+                        continue
+                    if now - previous[2] < self.settle_seconds:
+                        continue
+                    del self._pending[path]
+                    with self._queued_lock:
+                        self._queued.add(path)
+                    # 队列已满时阻塞扫描线程，形成背压
+                    while not self._stop.is_set():
+                        try:
+                            self.work_queue.put((path, stat.st_size, stat.st_mtime), timeout=1.0)
+                            break
+                        except queue.Full:
+                            continue
+
+    def process_file(self, path):
+        """Sends one file through DataLoader / OCRProcessor / DataCleaner / RuleEngine.
+        Returns:
+            dict: {'kind', 'records', 'violations'} summary of the outcome.
+        """
+        data_loader, ocr_processor, data_cleaner, rule_engine = self._engines()
+        lower = path.lower()
+        if lower.endswith(STRUCTURED_EXTENSIONS):
+            records_df = data_loader.load_structured_data(path)
+            if records_df is None:
+                raise ValueError("structured data could not be loaded")
+            kind = 'structured'
+        else:
+            if lower.endswith(DOCUMENT_EXTENSIONS):
+                text = data_loader.load_document_data(path)
+                kind = 'document'
+            else:
+                text = ocr_processor.process_image(data_loader.load_image_data(path))
+                kind = 'image'
+            if text is None:
+                raise ValueError("no text could be extracted")
+            fields = ocr_processor.extract_key_fields(data_cleaner.clean_ocr_text(str(text)))
+            fields['source_file'] = path
+            records_df = data_cleaner.integrate_data(None, [fields])
+        violation_table = rule_engine.apply_rules_compact(records_df)
+        if self.results_store is not None:
+            self._store_result(path, records_df, violation_table)
+        return {'kind': kind, 'records': len(records_df), 'violations': len(violation_table),
+                'violation_table': violation_table, 'review_id': self.review_id}
+
+    def _store_result(self, path, records_df, violation_table):
+        """Saves the reports and rule violations of one file to the results store."""
+        import pandas as pd
+
+        id_column = next((c for c in REPORT_ID_COLUMNS if c in records_df.columns), None)
+        if id_column is not None:
+            report_ids = records_df[id_column].astype(str).tolist()
+        else:
+            # 附件没有报告编号时以文件名标识
+            name = os.path.basename(path)
+            report_ids = [name] if len(records_df) == 1 else [f"{name}#{i}" for i in range(len(records_df))]
+        reports = pd.DataFrame({'report_id': report_ids,
+                                'compliant': (violation_table.counts_per_row() == 0).tolist()})
+        for column, candidates in (('entity', ENTITY_COLUMNS), ('period', PERIOD_COLUMNS)):
+            source = next((c for c in candidates if c in records_df.columns), None)
+            if source is not None:
+                reports[column] = records_df[source].astype(str).tolist()
+        # 多个工作线程共用一个 SQLite 连接，写入需串行
+        with self._store_lock:
+            if self.review_id is None:
+                self.review_id = self.results_store.start_review(source='ingest')
+            self.results_store.insert_batch(self.review_id, reports, violation_table)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                path, size, mtime = self.work_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            content_hash = None
+            claimed = False
+            try:
+                content_hash = file_fingerprint(path)
+                with self._queued_lock:
+                    duplicate = content_hash in self._inflight_hashes or self.state.seen_hash(content_hash)
+                    if not duplicate:
+                        self._inflight_hashes.add(content_hash)
+                        claimed = True
+                if duplicate:
+                    # 同一内容以新文件名再次落地，只记录不重复处理
+                    self.state.mark(path, size, mtime, content_hash, 'done', 'duplicate content')
+                    print(f"跳过重复内容文件: {path}")
+                else:
+                    result = self.process_file(path)
+                    self.state.mark(path, size, mtime, content_hash, 'done',
+                                    f"{result['records']} records, {result['violations']} violations")
+                    print(f"已处理: {path} ({result['records']} 条记录, {result['violations']} 条违规)")
+                    if self.on_result:
+                        self.on_result(path, result)
+            except Exception as e:
+                print(f"处理文件失败: {path} - {e}")
+                self.state.mark(path, size, mtime, content_hash, 'failed', str(e))
+            finally:
+                with self._queued_lock:
+                    self._queued.discard(path)
+                    if claimed:
+                        self._inflight_hashes.discard(content_hash)
+                self.work_queue.task_done()
+
+    def _start_observer(self):
+        """Starts an inotify/FSEvents observer when watchdog is available; scans are then event-driven."""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        daemon = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                daemon._wakeup.set()
+
+        self._observer = Observer()
+        for watch_dir in self.watch_dirs:
+            self._observer.schedule(_Handler(), watch_dir, recursive=True)
+        self._observer.start()
+        return True
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        event_driven = self._start_observer()
+        print(f"Watching {', '.join(self.watch_dirs)} ({'inotify' if event_driven else 'polling'}, "
+              f"queue={self.work_queue.maxsize}, workers={self.workers})")
+
+    def run_forever(self):
+        """Scans until stop() is called or the process is interrupted."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self._scan()
+                # 有文件事件时提前唤醒；仍需按 poll_interval 复查未稳定的文件
+                wait = self.poll_interval if not self._pending else min(self.poll_interval, self.settle_seconds)
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+        except KeyboardInterrupt:
+            print("Stopping ingestion...")
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="监控共享目录，持续复核新落地的凭证与附件")
+    parser.add_argument('watch_dirs', nargs='+')
+    parser.add_argument('--state', default='cache/ingest_state.json')
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--settle-seconds', type=float, default=5.0)
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--db', default='audit_reports.db', help="结果库（SQLite）路径")
+    args = parser.parse_args()
+
+    from database.results_store import ResultsStore
+    IngestDaemon(args.watch_dirs, state_path=args.state, poll_interval=args.poll_interval,
+                 settle_seconds=args.settle_seconds, queue_size=args.queue_size,
+                 workers=args.workers, results_store=ResultsStore(args.db)).run_forever()
@@ -0,0 +1,107 @@
+# review_engine/llm_load_test.py
+import argparse
+import contextlib
+import io
+import math
+import time
+
+from review_engine.llm_module import LLMModule
+from review_engine.llm_stub_server import StubLLMServer
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def load_reports(csv_path=None, n_reports=200):
+    """Reports to send: rows of csv_path (repeated up to n_reports) or synthetic ones."""
+    if csv_path:
+        import pandas as pd
+
+        rows = pd.read_csv(csv_path).to_dict(orient='records')
+        if rows:
+            return [dict(rows[i % len(rows)], report_id=f"LT-{i:05d}") for i in range(n_reports)]
+    return [{'report_id': f"LT-{i:05d}", 'reported_revenue': 1000000 + i * 137,
+             'ledger_revenue': 1000000 + i * 131, 'audit_opinion': '标准无保留意见'} for i in range(n_reports)]
+
+
+def run_load_test(base_url, reports, max_workers=8, max_retries=3, retry_backoff=0.2, request_timeout=5.0):
+    """Drives LLMModule.batch_analyze_reports against base_url.
+    Returns:
+        dict: reports, workers, seconds, throughput_rps, errors, retries, p50_s/p95_s/p99_s
+              (per-report latency including retries, over all reports; a failed report counts with
+              the time until its final failure) and error_p50_s/error_p95_s/error_p99_s (failed
+              reports only).
+    """
+    llm = LLMModule(model_name='stub', base_url=base_url, request_timeout=request_timeout,
+                    max_retries=max_retries, retry_backoff=retry_backoff)
+    start = time.perf_counter()
+    # 逐条打印的提示词与回复会主导耗时，压测时丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = llm.batch_analyze_reports(reports, max_workers=max_workers)
+    elapsed = time.perf_counter() - start
+    latencies = [r['latency_s'] for r in results]
+    error_latencies = [r['latency_s'] for r in results if r['assessment'] == 'Error']
+    return {
+        'reports': len(reports),
+        'workers': max_workers,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(reports) / elapsed, 2) if elapsed > 0 else None,
+        'errors': sum(r['assessment'] == 'Error' for r in results),
+        'retries': sum(r.get('attempts', 1) - 1 for r in results),
+        'p50_s': _percentile(latencies, 50),
+        'p95_s': _percentile(latencies, 95),
+        'p99_s': _percentile(latencies, 99),
+        'error_p50_s': _percentile(error_latencies, 50),
+        'error_p95_s': _percentile(error_latencies, 95),
+        'error_p99_s': _percentile(error_latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of LLMModule against the local stub LLM server.")
+    parser.add_argument('--reports', type=int, default=200, help="number of reports per run")
+    parser.add_argument('--csv', help="take report fields from this CSV (rows are repeated)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16], help="concurrency levels to run")
+    parser.add_argument('--base-url', help="test an already running server instead of starting the stub")
+    parser.add_argument('--latency', default='lognormal:0.05,0.5')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.02)
+    parser.add_argument('--max-rps', type=float, default=None)
+    parser.add_argument('--timeout-rate', type=float, default=0.005)
+    parser.add_argument('--malformed-rate', type=float, default=0.01)
+    parser.add_argument('--replay', help="JSONL file of recorded responses for the stub")
+    parser.add_argument('--request-timeout', type=float, default=2.0)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = StubLLMServer(latency=args.latency, rate_limit_rate=args.rate_limit_rate, max_rps=args.max_rps,
+                               timeout_rate=args.timeout_rate, hang_seconds=args.request_timeout * 2,
+                               malformed_rate=args.malformed_rate, replay_path=args.replay, seed=args.seed).start()
+        base_url = server.url
+    reports = load_reports(args.csv, args.reports)
+    print(f"Load testing {base_url} with {len(reports)} reports per run")
+    print(f"{'workers':>8} {'seconds':>8} {'rps':>8} {'errors':>7} {'retries':>8} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'err p50':>8} {'err p99':>8}")
+    try:
+        for workers in args.workers:
+            result = run_load_test(base_url, reports, max_workers=workers, max_retries=args.max_retries,
+                                   request_timeout=args.request_timeout)
+            print(f"{result['workers']:>8} {result['seconds']:>8.2f} {result['throughput_rps']:>8.1f} "
+                  f"{result['errors']:>7} {result['retries']:>8} {result['p50_s'] or 0:>7.3f} "
+                  f"{result['p95_s'] or 0:>7.3f} {result['p99_s'] or 0:>7.3f} "
+                  f"{result['error_p50_s'] or 0:>8.3f} {result['error_p99_s'] or 0:>8.3f}")
+    finally:
+        if server is not None:
+            print(f"Server stats: {server.stats}")
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
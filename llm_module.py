@@ -4,89 +4,376 @@
 # In a real application, you would use libraries like OpenAI's API client,
 # Hugging Face Transformers, or other LLM SDKs.
 
+import random
+import re
+import socket
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+PROMPT_HEADER = (
+    "You are an expert financial auditor. Review the following audit report information and assess its compliance, reasonableness, and identify any potential risks or anomalies.\n\n"
+    "Audit Report Information:"
+)
+PROMPT_KNOWLEDGE_HEADER = "\nRelevant Audit Knowledge (Policies, Regulations, Past Issues):"
+PROMPT_FOOTER = (
+    "\nBased on the above, please provide:\n"
+    "1. Overall Assessment (e.g., Compliant, Non-Compliant, Suspicious, Reasonable, Unreasonable).\n"
+    "2. Detailed Analysis: Explain your reasoning. Identify specific elements from the report that support your assessment. Mention any inconsistencies, missing information, or unusual patterns.\n"
+    "3. Risk Identification: List any potential risks (e.g., fraud, error, non-compliance with policy XYZ, operational inefficiency).\n"
+    "4. Suggested Actions (if any): Recommend further steps if issues are found (e.g., request additional documentation, verify with manager, flag for manual review).\n"
+    "\nYour Response:"
+)
+
+# 报告全文字段：有证据摘要时以摘要代替全文送入模型
+FULL_TEXT_FIELDS = ('审计报告全文', 'pdf_text')
+EVIDENCE_FIELD = '证据摘要'
+
+# 未接入真实模型时返回的模拟回复
+SIMULATED_RESPONSE = (
+    "1. Overall Assessment: Suspicious\n"
+    "2. Detailed Analysis: The summary 'Urgent Business Travel' lacks specificity. The attached invoice is for a luxury restaurant, which seems inconsistent with typical urgent business travel expenses for this department based on past patterns. The amount is also slightly above the average for similar claims.\n"
+    "3. Risk Identification: Potential misuse of funds, non-compliance with travel and expense policy (regarding meal types for urgent travel), possible miscategorization of expense.\n"
+    "4. Suggested Actions: Request detailed travel purpose, cross-verify with manager's approval for this specific meal, flag for manual review by senior auditor."
+)
+# 回复中四个编号段落的标题
+_RESPONSE_SECTIONS = {
+    'assessment': re.compile(r'^\s*1\.\s*Overall Assessment\s*[:：]\s*(.*)$', re.M | re.I),
+    'analysis_details': re.compile(r'^\s*2\.\s*Detailed Analysis\s*[:：]\s*(.*)$', re.M | re.I),
+    'identified_risks': re.compile(r'^\s*3\.\s*Risk Identification\s*[:：]\s*(.*)$', re.M | re.I),
+    'suggested_actions': re.compile(r'^\s*4\.\s*Suggested Actions(?:\s*\(if any\))?\s*[:：]\s*(.*)$', re.M | re.I),
+}
+
+
+class LLMResponseError(ValueError):
+    """Raised when a model response does not follow the numbered answer format."""
+
+
+def _retry_after(error):
+    """Seconds to wait before retrying after error, or None if the error is not transient."""
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code != 429 and error.code < 500:
+            return None
+        try:
+            return float(error.headers.get('Retry-After')) if error.headers is not None else 0.0
+        except (TypeError, ValueError):
+            return 0.0
+    if isinstance(error, (LLMResponseError, urllib.error.URLError, socket.timeout, ConnectionError)):
+        return 0.0
+    return None
+
+
+def _split_items(text):
+    """Splits a comma-separated answer line, ignoring commas inside parentheses."""
+    items, depth, current = [], 0, []
+    for char in text.strip().rstrip('.'):
+        depth += char in '(（'
+        depth -= char in ')）'
+        if char in ',，;；' and depth <= 0:
+            items.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    items.append(''.join(current).strip())
+    return [item for item in items if item]
+
+
+def parse_llm_response(response_text):
+    """Parses the numbered answer format requested by PROMPT_FOOTER.
+    Returns:
+        dict: {'assessment', 'analysis_details', 'identified_risks', 'suggested_actions'}
+    """
+    if not isinstance(response_text, str):
+        raise LLMResponseError(f"Expected response text, got {type(response_text).__name__}")
+    sections = {name: pattern.search(response_text) for name, pattern in _RESPONSE_SECTIONS.items()}
+    if sections['assessment'] is None or not sections['assessment'].group(1).strip():
+        raise LLMResponseError(f"No overall assessment in response: {response_text[:120]!r}")
+    text = {name: match.group(1).strip() if match else '' for name, match in sections.items()}
+    return {
+        'assessment': text['assessment'].rstrip('.'),
+        'analysis_details': text['analysis_details'],
+        'identified_risks': _split_items(text['identified_risks']),
+        'suggested_actions': _split_items(text['suggested_actions']),
+    }
+
+
+# 未安装 tiktoken 时的本地近似分词：每个汉字、每段字母/数字、每个标点各计一个 token
+_FALLBACK_TOKEN_PATTERN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]|[A-Za-z]+|\d+|[^\sA-Za-z\d\u3400-\u9fff\uf900-\ufaff]')
+
+
+class TokenBudgeter:
+    def __init__(self, max_prompt_tokens=3000,
+                 long_fields=('management_discussion', 'pdf_text', '审计报告全文', EVIDENCE_FIELD),
+                 long_field_threshold=300, encoding_name='cl100k_base'):
+        """Counts prompt tokens locally and shrinks long fields to fit a token budget.
+        Args:
+            max_prompt_tokens (int): Target size of the whole prompt.
+            long_fields (tuple of str): Fields that are always eligible for truncation.
+            long_field_threshold (int): Any other field longer than this many tokens is also eligible.
+            encoding_name (str): tiktoken encoding to use when tiktoken is installed.
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.long_fields = set(long_fields)
+        self.long_field_threshold = long_field_threshold
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except ImportError:
+            self._encoding = None
+
+    def count_tokens(self, text):
+        """Returns the number of tokens in text."""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(_FALLBACK_TOKEN_PATTERN.findall(text))
+
+    def truncate(self, text, max_tokens):
+        """Keeps the head and tail of text so that it fits max_tokens, marking what was dropped."""
+        total = self.count_tokens(text)
+        if total <= max_tokens:
+            return text
+        keep = max(max_tokens - 16, 0)  # 预留截断标记占用的 token
+        head, tail = (keep * 2) // 3, keep - (keep * 2) // 3
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            head_text = self._encoding.decode(tokens[:head])
+            tail_text = self._encoding.decode(tokens[len(tokens) - tail:]) if tail else ''
+        else:
+            spans = [m.end() for m in _FALLBACK_TOKEN_PATTERN.finditer(text)]
+            head_text = text[:spans[head - 1]] if head else ''
+            tail_text = text[spans[len(spans) - tail - 1]:] if tail else ''
+        return f"{head_text} ...[已截断 {total - head - tail} tokens]... {tail_text}"
+
+    def fit_fields(self, field_texts, fixed_tokens):
+        """Shrinks long fields so that fixed_tokens plus all fields fit the budget.
+        Args:
+            field_texts (dict): Field name -> rendered value text.
+            fixed_tokens (int): Tokens used by instructions, labels and knowledge base.
+        Returns:
+            tuple: (field_texts with long fields truncated, list of truncated field names)
+        """
+        counts = {key: self.count_tokens(text) for key, text in field_texts.items()}
+        if fixed_tokens + sum(counts.values()) <= self.max_prompt_tokens:
+            return field_texts, []
+
+        shrinkable = [key for key in field_texts
+                      if key in self.long_fields or counts[key] > self.long_field_threshold]
+        available = self.max_prompt_tokens - fixed_tokens - sum(
+            count for key, count in counts.items() if key not in shrinkable)
+        available = max(available, 0)
+
+        # 均分剩余预算，较短字段用不完的份额留给更长的字段
+        fitted = dict(field_texts)
+        truncated = []
+        for position, key in enumerate(sorted(shrinkable, key=counts.get)):
+            share = available // (len(shrinkable) - position)
+            if counts[key] > share:
+                fitted[key] = self.truncate(field_texts[key], share)
+                truncated.append(key)
+                available -= share
+            else:
+                available -= counts[key]
+        return fitted, truncated
+
+
+class CompiledPromptTemplate:
+    def __init__(self, field_names):
+        """Precomputes the display label of every field of one report schema."""
+        self.field_names = tuple(field_names)
+        self.labels = {key: f"- {str(key).replace('_', ' ').title()}: " for key in self.field_names}
+
+    def render(self, field_texts, audit_knowledge_base=None):
+        """Assembles the prompt with a single join."""
+        parts = [PROMPT_HEADER]
+        parts.extend(self.labels[key] + field_texts[key] for key in self.field_names)
+        if audit_knowledge_base:
+            parts.append(PROMPT_KNOWLEDGE_HEADER)
+            parts.extend(f"- {item}" for item in audit_knowledge_base)
+        parts.append(PROMPT_FOOTER)
+        return '\n'.join(parts)
+
+
 class LLMModule:
-    def __init__(self, api_key=None, model_name="text-davinci-003_placeholder"):
+    def __init__(self, api_key=None, model_name="text-davinci-003_placeholder", max_prompt_tokens=3000,
+                 router=None, base_url=None, request_timeout=60.0, max_retries=3, retry_backoff=0.5,
+                 evidence_summarizer=None):
         """Initializes the LLM module.
         Args:
             api_key (str, optional): API key for the LLM service. Defaults to None.
             model_name (str, optional): Name of the LLM model to use. Defaults to a placeholder.
+            max_prompt_tokens (int, optional): Token budget for each prompt. Long fields are
+                                               truncated to fit. Defaults to 3000.
+            router (LLMRouter, optional): Chooses among several model backends per request.
+            base_url (str, optional): OpenAI-compatible endpoint (e.g. the local stub server) used when
+                                      no router is given. Without either, every report gets the
+                                      simulated response.
+            request_timeout (float, optional): Seconds before a request to base_url is abandoned.
+            max_retries (int, optional): Retries of a report after a 429, 5xx, timeout or malformed
+                                         response, with exponential backoff (Retry-After is honoured).
+            retry_backoff (float, optional): First backoff in seconds; doubles on every retry.
+            evidence_summarizer (EvidenceSummarizer, optional): Builds the evidence pack of a report's
+                                                                full-text field (FULL_TEXT_FIELDS) when
+                                                                analyze_report gets no evidence.
         """
         self.api_key = api_key
         self.model_name = model_name
+        self.router = router
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.evidence_summarizer = evidence_summarizer
+        self.client = None
+        if base_url and router is None:
+            from review_engine.llm_router import OpenAICompatibleBackend
+            self.client = OpenAICompatibleBackend(model_name, base_url, model_name, api_key=api_key,
+                                                  timeout=request_timeout)
+        self.token_budgeter = TokenBudgeter(max_prompt_tokens=max_prompt_tokens)
+        if router is not None and router.token_counter is None:
+            router.token_counter = self.token_budgeter.count_tokens
+        self._template_cache = {}
         # Initialize LLM client here if using an API
         # Example: from openai import OpenAI; self.client = OpenAI(api_key=self.api_key)
-        print(f"LLMModule initialized with model: {self.model_name}. (Simulation)")
+        print(f"LLMModule initialized with {self._mode_label()}.")
 
-    def _prepare_prompt(self, voucher_info_package, audit_knowledge_base=None):
-        """Prepares a detailed prompt for the LLM based on voucher data and knowledge base."""
-        prompt = "You are an expert financial auditor. Review the following audit report information and assess its compliance, reasonableness, and identify any potential risks or anomalies.\n\n"
-        prompt += "Audit Report Information:\n"
-        for key, value in voucher_info_package.items():
-            prompt += f"- {key.replace('_', ' ').title()}: {value}\n"
+    def _mode_label(self):
+        """Describes where prompts go, for log messages."""
+        if self.router is not None:
+            return f"router over {', '.join(self.router.backends)}"
+        if self.client is not None:
+            return f"model {self.model_name} at {self.client.base_url}"
+        return f"model {self.model_name} (Simulation)"
 
-        if audit_knowledge_base:
-            prompt += "\nRelevant Audit Knowledge (Policies, Regulations, Past Issues):\n"
-            for item in audit_knowledge_base:
-                prompt += f"- {item}\n"
-
-        prompt += "\nBased on the above, please provide:\n"
-        prompt += "1. Overall Assessment (e.g., Compliant, Non-Compliant, Suspicious, Reasonable, Unreasonable).\n"
-        prompt += "2. Detailed Analysis: Explain your reasoning. Identify specific elements from the report that support your assessment. Mention any inconsistencies, missing information, or unusual patterns.\n"
-        prompt += "3. Risk Identification: List any potential risks (e.g., fraud, error, non-compliance with policy XYZ, operational inefficiency).\n"
-        prompt += "4. Suggested Actions (if any): Recommend further steps if issues are found (e.g., request additional documentation, verify with manager, flag for manual review).\n"
-        prompt += "\nYour Response:"
-        return prompt
-
-    def analyze_report(self, voucher_info_package, audit_knowledge_base=None):
+    def _get_template(self, field_names):
+        """Returns the compiled template for a report schema, compiling it on first use."""
+        key = tuple(field_names)
+        template = self._template_cache.get(key)
+        if template is None:
+            template = CompiledPromptTemplate(key)
+            self._template_cache[key] = template
+        return template
+
+    def _prepare_prompt(self, voucher_info_package, audit_knowledge_base=None, evidence=None):
+        """Prepares a detailed prompt for the LLM based on voucher data and knowledge base.
+        With an evidence pack, full-text fields are left out and the pack is sent in their place.
+        Returns:
+            tuple: (prompt, prompt_tokens, truncated_fields)
+        """
+        if evidence is None and self.evidence_summarizer is not None:
+            full_text = next((voucher_info_package[key] for key in FULL_TEXT_FIELDS
+                              if isinstance(voucher_info_package.get(key), str) and voucher_info_package[key]), None)
+            if full_text is not None:
+                evidence = self.evidence_summarizer.summarize(full_text)
+        if evidence is not None:
+            evidence_text = evidence['evidence_text'] if isinstance(evidence, dict) else str(evidence)
+            voucher_info_package = {key: value for key, value in voucher_info_package.items()
+                                    if key not in FULL_TEXT_FIELDS}
+            voucher_info_package[EVIDENCE_FIELD] = evidence_text
+        template = self._get_template(voucher_info_package.keys())
+        field_texts = {key: str(value) for key, value in voucher_info_package.items()}
+
+        empty_fields = dict.fromkeys(field_texts, '')
+        fixed_tokens = self.token_budgeter.count_tokens(template.render(empty_fields, audit_knowledge_base))
+        field_texts, truncated_fields = self.token_budgeter.fit_fields(field_texts, fixed_tokens)
+
+        prompt = template.render(field_texts, audit_knowledge_base)
+        return prompt, self.token_budgeter.count_tokens(prompt), truncated_fields
+
+    def _complete(self, prompt, prompt_tokens, routing_hints=None):
+        """Sends the prompt to the model and returns (response text, backend name)."""
+        if self.router is not None:
+            hints = routing_hints or {}
+            return self.router.complete(prompt, prompt_tokens, risk=hints.get('risk'), severity=hints.get('severity'))
+        if self.client is not None:
+            return self.client.complete(prompt), self.client.name
+        # In a real scenario: response = self.client.completions.create(model=self.model_name, prompt=prompt, max_tokens=500)
+        return SIMULATED_RESPONSE, self.model_name
+
+    def analyze_report(self, voucher_info_package, audit_knowledge_base=None, routing_hints=None, evidence=None):
         """Analyzes a single voucher using the LLM.
         Args:
             voucher_info_package (dict): A dictionary containing the complete, integrated voucher information.
             audit_knowledge_base (list of str, optional): Relevant snippets from an audit knowledge base.
+            routing_hints (dict, optional): 'risk' and/or 'severity' of the report, used by the router
+                                            to pick a backend.
+            evidence (dict or str, optional): Evidence pack of the report (EvidenceSummarizer.summarize
+                                              output or its text), sent instead of the full text.
         Returns:
             dict: A dictionary containing the LLM's analysis, including:
-                  {'assessment', 'analysis_details', 'identified_risks', 'suggested_actions', 'raw_llm_response'}
+                  {'assessment', 'analysis_details', 'identified_risks', 'suggested_actions', 'raw_llm_response',
+                   'prompt_tokens', 'truncated_fields', 'backend', 'attempts', 'latency_s'}
         """
-        print(f"\nAnalyzing audit report {voucher_info_package.get('report_id', 'N/A')} with LLM (Simulation)...")
+        print(f"\nAnalyzing audit report {voucher_info_package.get('report_id', 'N/A')} with {self._mode_label()}...")
 
-        prompt = self._prepare_prompt(voucher_info_package, audit_knowledge_base)
-        print(f"--- LLM Prompt (first 200 chars) ---\n{prompt[:200]}...\n----------------------------------")
+        prompt, prompt_tokens, truncated_fields = self._prepare_prompt(voucher_info_package, audit_knowledge_base,
+                                                                       evidence)
+        print(f"--- LLM Prompt ({prompt_tokens} tokens, first 200 chars) ---\n{prompt[:200]}...\n----------------------------------")
+        if truncated_fields:
+            print(f"Fields truncated to fit {self.token_budgeter.max_prompt_tokens} tokens: {', '.join(truncated_fields)}")
 
-        # Simulate LLM API call
-        # In a real scenario: response = self.client.completions.create(model=self.model_name, prompt=prompt, max_tokens=500)
-        # simulated_response_text = response.choices[0].text.strip()
-        simulated_response_text = (
-            "1. Overall Assessment: Suspicious\n"
-            "2. Detailed Analysis: The summary 'Urgent Business Travel' lacks specificity. The attached invoice is for a luxury restaurant, which seems inconsistent with typical urgent business travel expenses for this department based on past patterns. The amount is also slightly above the average for similar claims.\n"
-            "3. Risk Identification: Potential misuse of funds, non-compliance with travel and expense policy (regarding meal types for urgent travel), possible miscategorization of expense.\n"
-            "4. Suggested Actions: Request detailed travel purpose, cross-verify with manager's approval for this specific meal, flag for manual review by senior auditor."
-        )
-        print(f"--- Simulated LLM Response ---\n{simulated_response_text}\n------------------------------")
-
-        # Parse the LLM's response (this would need robust parsing)
-        # For simulation, we'll manually structure it.
-        analysis_result = {
-            'assessment': 'Suspicious', # Extracted from '1. Overall Assessment: ...'
-            'analysis_details': "The summary 'Urgent Business Travel' lacks specificity. The attached invoice is for a luxury restaurant, which seems inconsistent with typical urgent business travel expenses for this department based on past patterns. The amount is also slightly above the average for similar claims.",
-            'identified_risks': ["Potential misuse of funds", "non-compliance with travel and expense policy", "possible miscategorization of expense"],
-            'suggested_actions': ["Request detailed travel purpose", "cross-verify with manager's approval", "flag for manual review"],
-            'raw_llm_response': simulated_response_text
-        }
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response_text, backend = self._complete(prompt, prompt_tokens, routing_hints)
+                analysis_result = parse_llm_response(response_text)
+                break
+            except Exception as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    e.attempts = attempt + 1
+                    raise
+                # 指数退避加随机抖动，服务端给出 Retry-After 时至少等待该时长
+                delay = max(retry_after, self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                print(f"LLM call failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+        print(f"--- LLM Response ({backend}) ---\n{response_text}\n------------------------------")
+
+        analysis_result.update({
+            'raw_llm_response': response_text,
+            'prompt_tokens': prompt_tokens,
+            'truncated_fields': truncated_fields,
+            'backend': backend,
+            'attempts': attempt + 1,
+            'latency_s': time.perf_counter() - start,
+        })
 
         return analysis_result
 
-    def batch_analyze_reports(self, vouchers_data_list, audit_knowledge_base=None):
+    def _analyze_or_error(self, voucher_data, audit_knowledge_base=None):
+        """analyze_report, with a failure after all retries turned into an 'Error' assessment.
+        The error result keeps 'attempts' and 'latency_s' (time until the final failure), so that
+        failed and timed-out reports count in latency statistics.
+        """
+        start = time.perf_counter()
+        try:
+            return self.analyze_report(voucher_data, audit_knowledge_base)
+        except Exception as e:
+            print(f"LLM analysis of {voucher_data.get('report_id', 'N/A')} failed: {e}")
+            return {'assessment': 'Error', 'analysis_details': str(e) or type(e).__name__,
+                    'identified_risks': [], 'suggested_actions': [], 'prompt_tokens': None,
+                    'truncated_fields': [], 'attempts': getattr(e, 'attempts', 1),
+                    'latency_s': time.perf_counter() - start}
+
+    def batch_analyze_reports(self, vouchers_data_list, audit_knowledge_base=None, clusterer=None, max_workers=1):
         """Analyzes a batch of vouchers using the LLM.
         Args:
             vouchers_data_list (list of dict): A list of voucher_info_package dictionaries.
             audit_knowledge_base (list of str, optional): Relevant audit knowledge.
+            clusterer (ReportClusterer, optional): Analyzes one representative per cluster of
+                                                   near-identical reports and reuses its result.
+            max_workers (int, optional): Requests in flight at once. Defaults to 1 (sequential).
         Returns:
-            list: A list of LLM analysis result dictionaries.
+            list: A list of LLM analysis result dictionaries, in input order. Reports that still
+                  failed after the retries get {'assessment': 'Error', 'analysis_details': reason}.
         """
-        results = []
-        for voucher_data in vouchers_data_list:
-            result = self.analyze_report(voucher_data, audit_knowledge_base)
-            results.append(result)
-        return results
+        def analyze_positions(positions):
+            if max_workers <= 1 or len(positions) <= 1:
+                return [self._analyze_or_error(vouchers_data_list[pos], audit_knowledge_base) for pos in positions]
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(positions))) as executor:
+                return list(executor.map(
+                    lambda pos: self._analyze_or_error(vouchers_data_list[pos], audit_knowledge_base), positions))
+
+        if clusterer is not None:
+            return clusterer.analyze(vouchers_data_list, analyze_positions)
+        return analyze_positions(list(range(len(vouchers_data_list))))
 
 if __name__ == '__main__':
     # This would require an API key for a real LLM service
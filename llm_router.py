@@ -0,0 +1,289 @@
+# review_engine/llm_router.py
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+from review_engine.llm_module import SIMULATED_RESPONSE, LLMResponseError
+
+# 需要更强模型的严重程度
+HIGH_RISK_SEVERITIES = ('High', 'Critical')
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised when every candidate backend failed for a request."""
+
+
+class LLMBackend:
+    def __init__(self, name, tier=0, max_prompt_tokens=8000, prompt_cost_per_1k=0.0, completion_cost_per_1k=0.0):
+        """A model client the router can send prompts to.
+        Args:
+            name (str): Unique backend name used in stats.
+            tier (int): Capability level; 0 is the cheapest/smallest model, higher tiers handle
+                        longer and riskier reports.
+            max_prompt_tokens (int): Context the model accepts.
+            prompt_cost_per_1k (float): Price per 1000 prompt tokens.
+            completion_cost_per_1k (float): Price per 1000 completion tokens.
+        """
+        self.name = name
+        self.tier = tier
+        self.max_prompt_tokens = max_prompt_tokens
+        self.prompt_cost_per_1k = prompt_cost_per_1k
+        self.completion_cost_per_1k = completion_cost_per_1k
+
+    def complete(self, prompt):
+        raise NotImplementedError
+
+    def estimate_cost(self, prompt_tokens, completion_tokens=300):
+        return (prompt_tokens * self.prompt_cost_per_1k + completion_tokens * self.completion_cost_per_1k) / 1000
+
+
+class LocalStubBackend(LLMBackend):
+    def __init__(self, name='local-stub', tier=0, max_prompt_tokens=100000, latency=(0.0, 0.0), error_rate=0.0):
+        """In-process stand-in for a model, returning the simulated response.
+        Args:
+            latency (tuple): (min, max) seconds of simulated latency.
+            error_rate (float): Fraction of calls that raise, for failover testing.
+        """
+        super().__init__(name, tier=tier, max_prompt_tokens=max_prompt_tokens)
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def complete(self, prompt):
+        if self.latency[1] > 0:
+            time.sleep(random.uniform(*self.latency))
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated failure")
+        return SIMULATED_RESPONSE
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    def __init__(self, name, base_url, model, api_key=None, timeout=60.0, max_tokens=500, **kwargs):
+        """Client for any OpenAI-compatible /chat/completions endpoint (hosted API, vLLM, local stub server).
+        Args:
+            base_url (str): e.g. 'https://api.example.com/v1'.
+            model (str): Model name sent in the request.
+            api_key (str, optional): Bearer token.
+            timeout (float): Seconds before the request is abandoned.
+            max_tokens (int): Completion length limit.
+            **kwargs: tier, max_prompt_tokens and prices, see LLMBackend.
+        """
+        super().__init__(name, **kwargs)
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+
+    def complete(self, prompt):
+        body = json.dumps({
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': self.max_tokens,
+        }).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(f"{self.base_url}/chat/completions", data=body, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = response.read().decode('utf-8')
+        try:
+            return json.loads(body)['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise LLMResponseError(f"{self.name}: unexpected response {body[:200]}")
+
+
+class BackendStats:
+    def __init__(self, window=200):
+        """Rolling latency/error statistics and cumulative spend of one backend."""
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True 表示成功
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.spend = 0.0
+        self.open_until = 0.0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class LLMRouter:
+    def __init__(self, backends, token_counter=None, long_prompt_tokens=2000, high_risk=0.7,
+                 latency_weight=0.001, max_error_rate=0.5, failure_threshold=3, cooldown=30.0, window=200,
+                 min_samples=10):
+        """Routes each prompt to a backend and fails over to the next one on errors.
+        The required tier of a request is 0, plus 1 for a prompt longer than long_prompt_tokens,
+        plus 1 for a risk score >= high_risk or a High/Critical severity. The cheapest backend of
+        at least that tier is tried first, where cheapest means estimated cost plus latency_weight
+        times its recent p50 latency. Lower tiers are only used when no adequate backend is healthy.
+        A backend with failure_threshold consecutive errors, or an error rate above max_error_rate
+        over at least min_samples recent calls, is skipped for cooldown seconds (used only as a
+        last resort).
+        Args:
+            backends (list of LLMBackend): Available model clients.
+            token_counter (callable, optional): Counts completion tokens for spend accounting.
+                                                LLMModule sets its TokenBudgeter here.
+        """
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend.")
+        self.backends = {backend.name: backend for backend in backends}
+        self.token_counter = token_counter
+        self.long_prompt_tokens = long_prompt_tokens
+        self.high_risk = high_risk
+        self.latency_weight = latency_weight
+        self.max_error_rate = max_error_rate
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.stats = {name: BackendStats(window) for name in self.backends}
+        self._lock = threading.Lock()
+
+    def required_tier(self, prompt_tokens, risk=None, severity=None):
+        tier = 0
+        if prompt_tokens > self.long_prompt_tokens:
+            tier += 1
+        if (risk is not None and risk >= self.high_risk) or severity in HIGH_RISK_SEVERITIES:
+            tier += 1
+        return tier
+
+    def candidates(self, prompt_tokens, risk=None, severity=None):
+        """Backends to try for a request, in order."""
+        required = self.required_tier(prompt_tokens, risk, severity)
+        now = time.time()
+
+        def rank(backend):
+            stats = self.stats[backend.name]
+            healthy = stats.open_until <= now
+            adequate = backend.tier >= required
+            p50 = stats.percentile(50) or 0.0
+            score = backend.estimate_cost(prompt_tokens) + self.latency_weight * p50
+            # 优先：健康 > 能力足够（取最低够用档）> 综合成本低
+            return (not healthy, not adequate, backend.tier if adequate else -backend.tier, score)
+
+        fitting = [b for b in self.backends.values() if b.max_prompt_tokens >= prompt_tokens]
+        return sorted(fitting, key=rank)
+
+    def _record(self, backend, elapsed, ok, prompt_tokens=0, completion_text=''):
+        with self._lock:
+            stats = self.stats[backend.name]
+            stats.requests += 1
+            stats.outcomes.append(ok)
+            if ok:
+                stats.latencies.append(elapsed)
+                stats.consecutive_errors = 0
+                completion_tokens = self.token_counter(completion_text) if self.token_counter else len(completion_text) // 4
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+                stats.spend += backend.estimate_cost(prompt_tokens, completion_tokens)
+            else:
+                stats.errors += 1
+                stats.consecutive_errors += 1
+                # 熔断：冷却期后再次失败（连续失败数仍超限）会立即重新熔断
+                if stats.consecutive_errors >= self.failure_threshold or \
+                        (len(stats.outcomes) >= self.min_samples and stats.error_rate() > self.max_error_rate):
+                    stats.open_until = time.time() + self.cooldown
+
+    def complete(self, prompt, prompt_tokens, risk=None, severity=None):
+        """Sends the prompt, failing over through the candidate backends.
+        Returns:
+            tuple: (response text, backend name)
+        """
+        candidates = self.candidates(prompt_tokens, risk, severity)
+        if not candidates:
+            raise BackendUnavailable(f"No backend accepts a {prompt_tokens}-token prompt.")
+        errors = []
+        for backend in candidates:
+            start = time.perf_counter()
+            try:
+                text = backend.complete(prompt)
+            except (urllib.error.URLError, OSError, RuntimeError, ValueError) as e:
+                self._record(backend, time.perf_counter() - start, ok=False)
+                errors.append(f"{backend.name}: {e}")
+                print(f"LLM backend {backend.name} failed ({e}), failing over...")
+                continue
+            self._record(backend, time.perf_counter() - start, ok=True, prompt_tokens=prompt_tokens,
+                         completion_text=text)
+            return text, backend.name
+        raise BackendUnavailable("All LLM backends failed: " + '; '.join(errors))
+
+    def report(self):
+        """Per-backend requests, error rate, p50/p95 latency, tokens and spend."""
+        import pandas as pd
+
+        rows = []
+        with self._lock:
+            for name, stats in self.stats.items():
+                p50, p95 = stats.percentile(50), stats.percentile(95)
+                rows.append({
+                    'backend': name,
+                    'tier': self.backends[name].tier,
+                    'requests': stats.requests,
+                    'errors': stats.errors,
+                    'error_rate': round(stats.error_rate(), 4),
+                    'p50_latency_s': round(p50, 3) if p50 is not None else None,
+                    'p95_latency_s': round(p95, 3) if p95 is not None else None,
+                    'prompt_tokens': stats.prompt_tokens,
+                    'completion_tokens': stats.completion_tokens,
+                    'spend': round(stats.spend, 4),
+                })
+        return pd.DataFrame(rows)
+
+
+def load_router_config(config_path):
+    """Builds an LLMRouter from a JSON list of backend definitions, or returns None if the file is missing.
+    Each entry has 'type' ('openai' or 'stub'), 'name' and optionally 'tier', 'max_prompt_tokens',
+    'prompt_cost_per_1k', 'completion_cost_per_1k'; 'openai' entries also need 'base_url' and 'model'
+    and may name an environment variable holding the key in 'api_key_env'.
+    """
+    import os
+
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    backends = []
+    for entry in entries:
+        common = {key: entry[key] for key in ('tier', 'max_prompt_tokens', 'prompt_cost_per_1k',
+                                              'completion_cost_per_1k') if key in entry}
+        if entry['type'] == 'openai':
+            api_key = os.environ.get(entry['api_key_env']) if entry.get('api_key_env') else None
+            backends.append(OpenAICompatibleBackend(entry['name'], entry['base_url'], entry['model'], api_key=api_key,
+                                                    timeout=entry.get('timeout', 60.0), **common))
+        elif entry['type'] == 'stub':
+            backends.append(LocalStubBackend(entry['name'], tier=common.get('tier', 0),
+                                             max_prompt_tokens=common.get('max_prompt_tokens', 100000)))
+        else:
+            raise ValueError(f"Unknown LLM backend type: {entry['type']}")
+    return LLMRouter(backends)
+
+
+if __name__ == '__main__':
+    from review_engine.llm_module import LLMModule
+
+    router = LLMRouter([
+        LocalStubBackend('small-model', tier=0, max_prompt_tokens=4000, latency=(0.01, 0.03), error_rate=0.2),
+        LocalStubBackend('large-model', tier=1, max_prompt_tokens=32000, latency=(0.03, 0.08)),
+        LocalStubBackend('local-fallback', tier=0, latency=(0.0, 0.01)),
+    ], long_prompt_tokens=200)
+    llm = LLMModule(router=router)
+    short_report = {'report_id': 'AR-1', '审计意见': '标准无保留意见'}
+    long_report = {'report_id': 'AR-2', '审计报告全文': '收入确认 关键审计事项 ' * 300}
+    for i in range(20):
+        llm.analyze_report(short_report, routing_hints={'risk': 0.1})
+        llm.analyze_report(long_report, routing_hints={'severity': 'High'})
+    print(router.report().to_string(index=False))
@@ -0,0 +1,311 @@
+# review_engine/llm_scheduler.py
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+
+from review_engine.violation_table import SEVERITY_CODES, SEVERITY_LEVELS
+
+# 用于衡量“涉及金额”的候选列，按顺序取第一个存在的列
+PRIORITY_AMOUNT_COLUMNS = ['amount', '金额', 'total_amount', 'reported_revenue', '营业收入']
+
+
+class DeadlineExceeded(Exception):
+    """Raised on a request's future when its deadline passed before it could be sent."""
+
+
+def priority_inputs(records_df, violation_table, positions=None):
+    """Severity and amount at stake per report, as passed to LLMScheduler.submit.
+    Args:
+        records_df (pd.DataFrame): Reviewed batch.
+        violation_table (ViolationTable): Rule violations of the batch.
+        positions (list of int, optional): Rows to return; defaults to all rows.
+    Returns:
+        tuple: (list of severity names or None, list of float amounts)
+    """
+    import pandas as pd
+
+    codes = violation_table.max_severity_per_row()
+    amount_col = next((c for c in PRIORITY_AMOUNT_COLUMNS if c in records_df.columns), None)
+    if amount_col is not None:
+        amounts = pd.to_numeric(records_df[amount_col], errors='coerce').fillna(0).abs().tolist()
+    else:
+        amounts = [0.0] * len(records_df)
+    positions = range(len(records_df)) if positions is None else positions
+    return ([SEVERITY_LEVELS[codes[pos]] if codes[pos] >= 0 else None for pos in positions],
+            [amounts[pos] for pos in positions])
+
+
+class _Request:
+    __slots__ = ('request_key', 'report_id', 'report', 'knowledge_base', 'severity', 'amount', 'pinned',
+                 'deadline', 'risk', 'future', 'seq', 'stale')
+
+    def key(self):
+        # 置顶优先，其次严重程度高、截止时间早、涉及金额大，最后按提交顺序
+        return (not self.pinned, -self.severity, self.deadline if self.deadline is not None else math.inf,
+                -self.amount, self.seq)
+
+
+class LLMScheduler:
+    def __init__(self, llm_module, max_concurrency=8, min_concurrency=1, initial_concurrency=2,
+                 target_latency=10.0, latency_smoothing=0.3):
+        """Priority queue in front of LLMModule.analyze_report.
+        Requests are sent pinned first, then by rule severity, deadline and amount at stake.
+        Every submission is a separate request, even with a report ID already queued (reports of
+        different batches may share IDs). Requests that have not been sent yet can be re-prioritized,
+        pinned or cancelled by report ID at any time through reprioritize/pin/cancel.
+        Concurrency follows AIMD on observed latency: +1 per window of completions below
+        target_latency, halved on a slow call or an error.
+        Args:
+            llm_module (LLMModule): Client whose analyze_report is called.
+            max_concurrency (int): Upper bound of requests in flight.
+            min_concurrency (int): Lower bound of requests in flight.
+            initial_concurrency (int): Requests in flight at start.
+            target_latency (float): Seconds per call considered healthy.
+            latency_smoothing (float): EWMA weight of the newest latency sample.
+        """
+        self.llm_module = llm_module
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.target_latency = target_latency
+        self.latency_smoothing = latency_smoothing
+        self.latency_ewma = None
+        self.stats = {'sent': 0, 'completed': 0, 'failed': 0, 'expired': 0, 'cancelled': 0}
+
+        self._heap = []
+        self._pending = {}  # 请求键 -> 当前有效的 _Request
+        self._seq = itertools.count()
+        self._request_ids = itertools.count()
+        self._batch_ids = itertools.count()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._workers = []
+
+    # --- submission and preemption -----------------------------------------
+    def submit(self, report_id, report, severity=None, amount=0.0, pinned=False, deadline=None,
+               knowledge_base=None, risk=None, request_key=None):
+        """Queues one report as a new request; a report ID that is already queued is not merged.
+        Args:
+            report_id: Identifier used for pin/reprioritize/cancel.
+            report (dict): voucher_info_package passed to analyze_report.
+            severity (str, optional): Highest rule severity of the report ('Low' ... 'Critical').
+            amount (float): Amount at stake; larger goes first among equal severity.
+            pinned (bool): Manually pinned by an auditor; goes before everything else.
+            deadline (float, optional): time.time() by which the request must be sent.
+            risk (float, optional): Local risk score, passed on to the LLM router.
+            request_key (optional): Unique key of this submission (run_batch uses batch id and position).
+                                    Generated when omitted.
+        Returns:
+            concurrent.futures.Future: Resolves to the analyze_report result.
+        Raises:
+            ValueError: If request_key is already queued.
+        """
+        request = _Request()
+        request.request_key = request_key if request_key is not None else f"req-{next(self._request_ids)}"
+        request.report_id = report_id
+        request.report = report
+        request.knowledge_base = knowledge_base
+        request.severity = SEVERITY_CODES.get(severity, -1)
+        request.amount = float(amount) if amount == amount and amount is not None else 0.0
+        request.pinned = pinned
+        request.deadline = deadline
+        request.risk = risk
+        request.future = Future()
+        request.stale = False
+        with self._cond:
+            if request.request_key in self._pending:
+                raise ValueError(f"request {request.request_key} is already queued; use reprioritize()")
+            self._push(request)
+        return request.future
+
+    def _push(self, request):
+        request.seq = next(self._seq)
+        self._pending[request.request_key] = request
+        heapq.heappush(self._heap, (request.key(), request.seq, request))
+        self._cond.notify()
+
+    def _queued_requests(self, report_id):
+        return [request for request in self._pending.values() if str(request.report_id) == str(report_id)]
+
+    def reprioritize(self, report_id, **changes):
+        """Changes severity/amount/pinned/deadline of every not-yet-sent request of a report.
+        Returns:
+            bool: False if no request of the report is waiting to be sent.
+        """
+        with self._cond:
+            requests = self._queued_requests(report_id)
+            for request in requests:
+                request.stale = True
+                updated = _Request()
+                for slot in _Request.__slots__:
+                    setattr(updated, slot, getattr(request, slot))
+                if 'severity' in changes:
+                    updated.severity = SEVERITY_CODES.get(changes['severity'], -1)
+                for name in ('amount', 'pinned', 'deadline'):
+                    if name in changes:
+                        setattr(updated, name, changes[name])
+                updated.stale = False
+                self._push(updated)
+            return bool(requests)
+
+    def pin(self, report_id):
+        """Moves a not-yet-sent request to the front of the queue."""
+        return self.reprioritize(report_id, pinned=True)
+
+    def cancel(self, report_id):
+        """Cancels every not-yet-sent request of a report."""
+        with self._cond:
+            requests = self._queued_requests(report_id)
+            for request in requests:
+                del self._pending[request.request_key]
+                request.stale = True
+                request.future.cancel()
+                self.stats['cancelled'] += 1
+            return bool(requests)
+
+    def queued(self):
+        """Report IDs waiting to be sent, in dispatch order."""
+        with self._cond:
+            return [request.report_id for _, _, request in sorted(self._heap) if not request.stale]
+
+    # --- dispatch ------------------------------------------------------------
+    def _next_request(self):
+        """Blocks until a request may be sent; returns None when stopping."""
+        with self._cond:
+            while True:
+                if self._stop:
+                    return None
+                while self._heap and self._heap[0][2].stale:
+                    heapq.heappop(self._heap)
+                if self._heap and self._in_flight < int(self.concurrency):
+                    _, _, request = heapq.heappop(self._heap)
+                    del self._pending[request.request_key]
+                    if request.deadline is not None and time.time() > request.deadline:
+                        self.stats['expired'] += 1
+                        if request.future.set_running_or_notify_cancel():
+                            request.future.set_exception(DeadlineExceeded(
+                                f"report {request.report_id} not sent before its deadline"))
+                        continue
+                    if not request.future.set_running_or_notify_cancel():
+                        continue
+                    self._in_flight += 1
+                    self.stats['sent'] += 1
+                    return request
+                self._cond.wait(timeout=0.5)
+
+    def _record_latency(self, elapsed, failed):
+        with self._cond:
+            self._in_flight -= 1
+            # 计数与并发度在同一把锁下更新，stats_snapshot() 读到的 sent/completed/failed 相互一致
+            self.stats['failed' if failed else 'completed'] += 1
+            if self.latency_ewma is None:
+                self.latency_ewma = elapsed
+            else:
+                self.latency_ewma += self.latency_smoothing * (elapsed - self.latency_ewma)
+            if failed or elapsed > self.target_latency:
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / max(self.concurrency, 1.0))
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            start = time.perf_counter()
+            try:
+                hints = {'severity': SEVERITY_LEVELS[request.severity] if request.severity >= 0 else None,
+                         'risk': request.risk}
+                result = self.llm_module.analyze_report(request.report, request.knowledge_base, routing_hints=hints)
+            except Exception as e:
+                self._record_latency(time.perf_counter() - start, failed=True)
+                request.future.set_exception(e)
+            else:
+                self._record_latency(time.perf_counter() - start, failed=False)
+                request.future.set_result(result)
+
+    def stats_snapshot(self):
+        """Consistent copy of the counters with the current concurrency, latency and queue state."""
+        with self._cond:
+            return dict(self.stats, in_flight=self._in_flight, queued=len(self._pending),
+                        concurrency=self.concurrency, latency_ewma=self.latency_ewma)
+
+    def start(self):
+        if not self._workers:
+            self._stop = False
+            for i in range(self.max_concurrency):
+                worker = threading.Thread(target=self._worker, name=f"llm-scheduler-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        return self
+
+    def stop(self):
+        """Stops the workers after the calls in flight; queued requests are cancelled."""
+        with self._cond:
+            self._stop = True
+            for request in self._pending.values():
+                request.future.cancel()
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def run_batch(self, reports, report_ids, severities=None, amounts=None, pinned=(), deadline=None,
+                  knowledge_base=None, risks=None):
+        """Schedules a batch and waits for it. Results are returned in input order;
+        a request that expired or failed yields {'assessment': 'Error', 'analysis_details': reason}.
+        """
+        self.start()
+        pinned = {str(report_id) for report_id in pinned}
+        # 请求键 = 批次号 + 批内位置：不同批次（或同一批内）编号相同的报告各自独立发送
+        batch_id = next(self._batch_ids)
+        futures = [
+            self.submit(report_id, report,
+                        severity=severities[i] if severities is not None else None,
+                        amount=amounts[i] if amounts is not None else 0.0,
+                        pinned=str(report_id) in pinned, deadline=deadline, knowledge_base=knowledge_base,
+                        risk=risks[i] if risks is not None else None, request_key=f"batch-{batch_id}:{i}")
+            for i, (report_id, report) in enumerate(zip(report_ids, reports))
+        ]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({'assessment': 'Error', 'analysis_details': str(e) or type(e).__name__,
+                                'identified_risks': [], 'suggested_actions': [], 'prompt_tokens': None,
+                                'truncated_fields': []})
+        return results
+
+
+if __name__ == '__main__':
+    import random
+
+    class _SlowLLM:
+        def analyze_report(self, report, knowledge_base=None, routing_hints=None):
+            time.sleep(random.uniform(0.05, 0.2))
+            return {'assessment': 'Normal', 'analysis_details': f"report {report['report_id']}"}
+
+    scheduler = LLMScheduler(_SlowLLM(), max_concurrency=6, target_latency=0.15).start()
+    order = []
+    futures = {}
+    for i in range(30):
+        severity = random.choice(['Low', 'Medium', 'High', 'Critical'])
+        futures[i] = scheduler.submit(i, {'report_id': i}, severity=severity, amount=random.uniform(0, 1e6))
+        futures[i].add_done_callback(lambda f, i=i: order.append(i))
+    scheduler.pin(29)
+    for future in futures.values():
+        try:
+            future.result()
+        except Exception:
+            pass
+    print(f"Completion order: {order}")
+    print(f"Stats: {scheduler.stats_snapshot()}")
+    scheduler.stop()
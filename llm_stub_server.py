@@ -0,0 +1,281 @@
+# review_engine/llm_stub_server.py
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from review_engine.llm_module import SIMULATED_RESPONSE
+
+# 注入的畸形回复：缺少编号段落的文本、截断的 JSON、缺少 choices 的 JSON
+MALFORMED_CONTENT = "I am unable to assess this report right now."
+MALFORMED_BODIES = ('{"choices": [{"message": {"content": "1. Overall', '{"object": "error"}')
+
+
+def prompt_key(prompt):
+    """Key under which a prompt's response is recorded and replayed."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def parse_latency(spec):
+    """Parses a latency distribution, e.g. 'fixed:0.2', 'uniform:0.1,0.5', 'lognormal:0.3,0.6'
+    (median seconds, sigma) or 'exponential:0.2' (mean seconds).
+    Returns:
+        callable: Takes a random.Random and returns seconds.
+    """
+    kind, _, args = (spec or 'fixed:0').partition(':')
+    params = [float(x) for x in args.split(',') if x.strip()] if args else []
+    if kind == 'fixed':
+        return lambda rng: params[0] if params else 0.0
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1 / params[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubLLMServer:
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:0', rate_limit_rate=0.0, max_rps=None,
+                 timeout_rate=0.0, hang_seconds=30.0, malformed_rate=0.0, replay_path=None, strict_replay=False,
+                 record_path=None, upstream=None, seed=None):
+        """Local OpenAI-compatible /chat/completions server for testing and load testing LLM clients
+        without a paid API.
+        Responses come from a replay file (JSONL of {'key', 'response'} as written in record mode), or
+        are the simulated response. Faults are injected per request in this order: 429 (randomly with
+        rate_limit_rate, or when max_rps is exceeded), hang for hang_seconds (timeout_rate), malformed
+        output (malformed_rate); otherwise the response is sent after a latency drawn from `latency`.
+        Args:
+            port (int): 0 picks a free port; see self.url.
+            latency (str): Latency distribution, see parse_latency.
+            rate_limit_rate (float): Fraction of requests answered with 429 and a Retry-After header.
+            max_rps (float, optional): Token-bucket limit; requests above it get 429.
+            timeout_rate (float): Fraction of requests that hang so the client times out.
+            hang_seconds (float): How long a hanging request stalls before being answered.
+            malformed_rate (float): Fraction of requests answered with unparseable output.
+            replay_path (str, optional): JSONL file of recorded responses.
+            strict_replay (bool): Answer 404 for prompts missing from the replay file instead of
+                                  falling back to the simulated response.
+            record_path (str, optional): Forward requests to `upstream` and append its answers here.
+            upstream (LLMBackend, optional): Real backend used in record mode.
+            seed (int, optional): Seed of the fault/latency generator.
+        """
+        if record_path and upstream is None:
+            raise ValueError("Record mode needs an upstream backend.")
+        self.latency = parse_latency(latency)
+        self.rate_limit_rate = rate_limit_rate
+        self.max_rps = max_rps
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.malformed_rate = malformed_rate
+        self.strict_replay = strict_replay
+        self.record_path = record_path
+        self.upstream = upstream
+        self.replay = self._load_replay(replay_path) if replay_path else {}
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'hung': 0, 'malformed': 0,
+                      'replayed': 0, 'replay_misses': 0, 'recorded': 0}
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._replay_cursor = {}
+        self._tokens = float(max_rps or 0)
+        self._last_refill = time.monotonic()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @staticmethod
+    def _load_replay(replay_path):
+        replay = {}
+        with open(replay_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    replay.setdefault(entry['key'], []).append(entry['response'])
+        return replay
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    # --- fault injection -----------------------------------------------------
+    def _take_token(self):
+        """Token bucket of max_rps requests per second (burst of one second)."""
+        now = time.monotonic()
+        self._tokens = min(self.max_rps, self._tokens + (now - self._last_refill) * self.max_rps)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _decide(self):
+        """Returns (outcome, latency seconds) for the next request."""
+        with self._lock:
+            self.stats['requests'] += 1
+            if (self.max_rps and not self._take_token()) or self._rng.random() < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 'rate_limited', 0.0
+            if self._rng.random() < self.timeout_rate:
+                self.stats['hung'] += 1
+                return 'hang', self.hang_seconds
+            if self._rng.random() < self.malformed_rate:
+                self.stats['malformed'] += 1
+                return 'malformed', max(self.latency(self._rng), 0.0)
+            return 'ok', max(self.latency(self._rng), 0.0)
+
+    def _response_for(self, prompt):
+        """Replayed, recorded or simulated response text; None for a strict replay miss."""
+        key = prompt_key(prompt)
+        if self.record_path:
+            text = self.upstream.complete(prompt)
+            with self._lock:
+                with open(self.record_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'key': key, 'prompt': prompt, 'response': text}, ensure_ascii=False) + '\n')
+                self.stats['recorded'] += 1
+            return text
+        with self._lock:
+            responses = self.replay.get(key)
+            if responses:
+                # 同一提示词录制了多次时依次循环回放
+                cursor = self._replay_cursor.get(key, 0)
+                self._replay_cursor[key] = cursor + 1
+                self.stats['replayed'] += 1
+                return responses[cursor % len(responses)]
+            if self.replay:
+                self.stats['replay_misses'] += 1
+                if self.strict_replay:
+                    return None
+        return SIMULATED_RESPONSE
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    for name, value in (headers or {}).items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端已超时断开
+
+            def do_GET(self):
+                if self.path.rstrip('/').endswith('/stats'):
+                    with server._lock:
+                        self._send(200, dict(server.stats))
+                else:
+                    self._send(200, {'status': 'ok'})
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': f"unknown path {self.path}"}})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    prompt = request['messages'][-1]['content']
+                except (ValueError, KeyError, IndexError, TypeError):
+                    self._send(400, {'error': {'message': 'expected {"messages": [{"content": ...}]}'}})
+                    return
+
+                outcome, delay = server._decide()
+                if outcome == 'rate_limited':
+                    self._send(429, {'error': {'message': 'rate limit exceeded', 'type': 'rate_limit'}},
+                               headers={'Retry-After': '1'})
+                    return
+                time.sleep(delay)
+                if outcome == 'malformed':
+                    with server._lock:
+                        choice = server._rng.randrange(len(MALFORMED_BODIES) + 1)
+                    if choice < len(MALFORMED_BODIES):
+                        self._send(200, MALFORMED_BODIES[choice].encode('utf-8'))
+                        return
+                    text = MALFORMED_CONTENT
+                else:
+                    try:
+                        text = server._response_for(prompt)
+                    except Exception as e:
+                        self._send(502, {'error': {'message': f"upstream failed: {e}"}})
+                        return
+                    if text is None:
+                        self._send(404, {'error': {'message': 'prompt not in replay file'}})
+                        return
+                with server._lock:
+                    server.stats['ok'] += outcome == 'ok'
+                self._send(200, {
+                    'object': 'chat.completion',
+                    'model': request.get('model', 'stub'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                 'finish_reason': 'stop'}],
+                })
+
+        return Handler
+
+    # --- control ---------------------------------------------------------------
+    def start(self):
+        """Serves in a background thread; returns self."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='llm-stub-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub LLM server with fault injection.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0', help="fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA | exponential:MEAN")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--max-rps', type=float, default=None)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--replay', help="JSONL file of recorded responses")
+    parser.add_argument('--strict-replay', action='store_true')
+    parser.add_argument('--record', help="append upstream responses to this JSONL file")
+    parser.add_argument('--upstream-url', help="OpenAI-compatible base URL to record from")
+    parser.add_argument('--upstream-model', default='gpt-4o-mini')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    upstream = None
+    if args.record:
+        from review_engine.llm_router import OpenAICompatibleBackend
+        upstream = OpenAICompatibleBackend('upstream', args.upstream_url, args.upstream_model,
+                                           api_key=os.environ.get('LLM_API_KEY'))
+    server = StubLLMServer(args.host, args.port, latency=args.latency, rate_limit_rate=args.rate_limit_rate,
+                           max_rps=args.max_rps, timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds,
+                           malformed_rate=args.malformed_rate, replay_path=args.replay,
+                           strict_replay=args.strict_replay, record_path=args.record, upstream=upstream,
+                           seed=args.seed)
+    print(f"Stub LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
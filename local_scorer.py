@@ -0,0 +1,189 @@
+# review_engine/local_scorer.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# 不参与打分的列（规则引擎/分流阶段产生的中间结果）
+EXCLUDED_COLUMNS = ('rule_violations', 'triage_route', 'triage_reason', 'local_risk_score')
+# 标识列：每份报告取值唯一，作为特征只会让模型记住训练集中的编号
+ID_COLUMNS = ('报告ID', '报告编号', 'report_id', 'source_file', '文件名', '文件路径')
+
+
+class LocalRiskScorer:
+    def __init__(self, ngram_range=(2, 3), n_features=2 ** 16, text_columns=None):
+        """CPU-only risk scorer: hashed character n-gram TF-IDF features + logistic regression.
+        Args:
+            ngram_range (tuple): Min and max character n-gram length.
+            n_features (int): Size of the hashed feature space (must be a power of two).
+            text_columns (list of str, optional): Columns to score. Defaults to every
+                                                  non-numeric column seen during fit. Identifier
+                                                  columns (ID_COLUMNS) are never scored.
+        """
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two.")
+        self.ngram_range = tuple(ngram_range)
+        self.n_features = n_features
+        self.text_columns = [col for col in text_columns if col not in ID_COLUMNS] if text_columns else None
+        self.idf = None
+        self.weights = None
+        self.bias = 0.0
+
+    def _report_texts(self, reports_df):
+        """Concatenates 'column=value' pairs of every scored column into one string per report."""
+        if self.text_columns is None:
+            self.text_columns = [col for col in reports_df.columns
+                                 if col not in EXCLUDED_COLUMNS and col not in ID_COLUMNS
+                                 and (pd.api.types.is_bool_dtype(reports_df[col])
+                                      or not pd.api.types.is_numeric_dtype(reports_df[col]))]
+        texts = pd.Series('', index=reports_df.index)
+        for col in self.text_columns:
+            if col in reports_df.columns:
+                texts = texts + f"|{col}=" + reports_df[col].astype(str)
+        return texts.tolist()
+
+    def _hash_ngrams(self, texts):
+        """Hashes every character n-gram of every text in one vectorized pass.
+        Returns:
+            tuple: (doc_idx, feature_idx, tfidf_value) arrays, rows L2-normalized.
+        """
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        doc_of_char = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        mask = np.uint64(self.n_features - 1)
+
+        doc_parts = []
+        feature_parts = []
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            if len(codes) < n:
+                continue
+            windows = len(codes) - n + 1
+            h = np.full(windows, 2166136261 + n, dtype=np.uint64)
+            for offset in range(n):
+                h = (h * np.uint64(16777619) + codes[offset:offset + windows]) & np.uint64(0xFFFFFFFFFFFF)
+            # n-gram 不能跨越两份报告的边界
+            valid = doc_of_char[:windows] == doc_of_char[n - 1:]
+            doc_parts.append(doc_of_char[:windows][valid])
+            feature_parts.append((h[valid] & mask).astype(np.int64))
+
+        if not doc_parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        keys = np.concatenate(doc_parts) * self.n_features + np.concatenate(feature_parts)
+        keys, tf = np.unique(keys, return_counts=True)
+        doc_idx = keys // self.n_features
+        feature_idx = keys % self.n_features
+        values = 1.0 + np.log(tf)
+        if self.idf is not None:
+            values = values * self.idf[feature_idx]
+        norms = np.sqrt(np.bincount(doc_idx, weights=values ** 2, minlength=len(texts)))
+        values = values / (norms[doc_idx] + 1e-12)
+        return doc_idx, feature_idx, values
+
+    def _decision(self, doc_idx, feature_idx, values, n_docs):
+        return np.bincount(doc_idx, weights=self.weights[feature_idx] * values, minlength=n_docs) + self.bias
+
+    def fit(self, reports_df, labels, epochs=200, learning_rate=1.0, l2=1e-4):
+        """Trains the scorer on past review outcomes.
+        Args:
+            reports_df (pd.DataFrame): Historical reports.
+            labels (array-like): 1/True for reports that turned out to be risky, 0/False otherwise.
+            epochs (int): Full-batch gradient descent iterations.
+            learning_rate (float): Step size.
+            l2 (float): L2 regularization strength.
+        Returns:
+            LocalRiskScorer: self
+        """
+        y = np.asarray(labels, dtype=np.float64)
+        if len(y) != len(reports_df):
+            raise ValueError("labels must have one entry per report.")
+        texts = self._report_texts(reports_df)
+        n_docs = len(texts)
+
+        self.idf = None
+        doc_idx, feature_idx, _ = self._hash_ngrams(texts)
+        df_counts = np.bincount(feature_idx, minlength=self.n_features)
+        self.idf = np.log((1.0 + n_docs) / (1.0 + df_counts)) + 1.0
+        doc_idx, feature_idx, values = self._hash_ngrams(texts)
+
+        # 类别不平衡时按频率加权
+        positives = max(y.sum(), 1.0)
+        negatives = max(n_docs - y.sum(), 1.0)
+        sample_weight = np.where(y > 0, n_docs / (2 * positives), n_docs / (2 * negatives))
+
+        self.weights = np.zeros(self.n_features)
+        self.bias = 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-self._decision(doc_idx, feature_idx, values, n_docs)))
+            residual = (p - y) * sample_weight / n_docs
+            grad_w = np.bincount(feature_idx, weights=residual[doc_idx] * values, minlength=self.n_features)
+            self.weights -= learning_rate * (grad_w + l2 * self.weights)
+            self.bias -= learning_rate * residual.sum()
+        print(f"LocalRiskScorer trained on {n_docs} reports ({int(y.sum())} risky).")
+        return self
+
+    def score(self, reports_df):
+        """Scores all reports in one vectorized pass.
+        Returns:
+            np.ndarray: Risk probability in [0, 1] per report, in DataFrame order.
+        """
+        if self.weights is None:
+            raise RuntimeError("LocalRiskScorer has not been trained or loaded.")
+        texts = self._report_texts(reports_df)
+        doc_idx, feature_idx, values = self._hash_ngrams(texts)
+        return 1.0 / (1.0 + np.exp(-self._decision(doc_idx, feature_idx, values, len(texts))))
+
+    def save(self, model_path):
+        """Saves the trained model to a .npz file."""
+        os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+        meta = {
+            'ngram_range': list(self.ngram_range),
+            'n_features': self.n_features,
+            'text_columns': self.text_columns,
+        }
+        np.savez_compressed(model_path, weights=self.weights, idf=self.idf,
+                            bias=np.array([self.bias]), meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        print(f"LocalRiskScorer saved to: {model_path}")
+
+    @classmethod
+    def load(cls, model_path):
+        """Loads a model written by save()."""
+        with np.load(model_path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            scorer = cls(ngram_range=meta['ngram_range'], n_features=meta['n_features'],
+                         text_columns=meta['text_columns'])
+            scorer.weights = data['weights']
+            scorer.idf = data['idf']
+            scorer.bias = float(data['bias'][0])
+        print(f"LocalRiskScorer loaded from: {model_path}")
+        return scorer
+
+    @classmethod
+    def load_if_exists(cls, model_path):
+        """Returns the saved model, or None when no model has been trained yet."""
+        if model_path and os.path.exists(model_path):
+            return cls.load(model_path)
+        return None
+
+
+if __name__ == '__main__':
+    import time
+
+    from data_processing.dtype_optimizer import optimize_dtypes
+
+    # 与 DataLoader 加载时相同的类型压缩，保证训练与打分时的特征一致
+    history_df = optimize_dtypes(pd.read_csv('audit_report_data.csv'))
+    # 以“风险提示不充分或建议与结论不匹配”作为历史复核中的高风险标签
+    history_labels = (history_df['风险提示是否充分'].isin(['否', False])
+                      | history_df['建议与结论匹配度'].isin(['不匹配', False]))
+
+    scorer = LocalRiskScorer().fit(history_df, history_labels)
+    scorer.save('models/local_risk_scorer.npz')
+
+    reloaded = LocalRiskScorer.load('models/local_risk_scorer.npz')
+    start = time.perf_counter()
+    scores = reloaded.score(history_df)
+    print(f"Scored {len(history_df)} reports in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(pd.DataFrame({'报告编号': history_df['报告编号'], 'risk': scores.round(3),
+                        'label': history_labels}).head(10))
@@ -1,7 +1,15 @@
 # main.py
+import sys
 import tkinter as tk
 from gui.main_window import MainWindow
 
+# 启动时允许导入的最长耗时（毫秒），由 `python main.py --check-import-time` 校验
+IMPORT_TIME_BUDGET_MS = 300
+# 这些模块只应在首次使用时导入，出现在启动导入链中即视为回归
+DEFERRED_MODULES = ('pandas', 'numpy', 'PyPDF2')
+# 分流在样例数据上至少应减少的LLM调用比例，由 `python main.py --check-triage` 校验
+MIN_TRIAGE_REDUCTION = 0.25
+
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -11,6 +19,177 @@ class App(tk.Tk):
 
         self.main_window = MainWindow(self)
 
+def check_import_time(budget_ms=IMPORT_TIME_BUDGET_MS):
+    """Measures the startup import chain with `python -X importtime` and checks it against the budget.
+    Returns:
+        bool: True if the GUI module imports within budget and without any deferred module.
+    """
+    import subprocess
+
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import gui.main_window'],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f"Import failed:\n{completed.stderr}")
+        return False
+
+    cumulative_us = 0
+    imported = set()
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [part.strip() for part in line[len('import time:'):].split('|')]
+        if not parts[1].isdigit():
+            continue
+        name = parts[2].strip()
+        imported.add(name.split('.')[0])
+        if name == 'gui.main_window':
+            cumulative_us = int(parts[1])
+
+    total_ms = cumulative_us / 1000
+    leaked = [module for module in DEFERRED_MODULES if module in imported]
+    print(f"gui.main_window import time: {total_ms:.1f} ms (budget {budget_ms} ms)")
+    if leaked:
+        print(f"Heavy modules imported at startup: {', '.join(leaked)}")
+    return total_ms <= budget_ms and not leaked
+
+def check_engines(timeout=120):
+    """Creates every lazily initialized module of MainWindow from a cold start, in a worker
+    thread so that a deadlock between module factories is reported instead of hanging.
+    Returns:
+        bool: True if every module was created within timeout.
+    """
+    import threading
+
+    window = MainWindow.__new__(MainWindow)
+    window._engines = {}
+    window._engines_lock = threading.RLock()
+    names = [name for name, value in vars(MainWindow).items() if isinstance(value, property)]
+    failures = {}
+
+    def touch_all():
+        for name in names:
+            try:
+                getattr(window, name)
+            except Exception as e:
+                failures[name] = e
+
+    worker = threading.Thread(target=touch_all, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        print(f"Module creation did not finish within {timeout}s (deadlock?); created: {', '.join(window._engines)}")
+        return False
+    for name, error in failures.items():
+        print(f"{name}: {type(error).__name__}: {error}")
+    print(f"Created {len(names) - len(failures)}/{len(names)} modules: {', '.join(window._engines)}")
+    return not failures
+
+def _write_text_pdf(path, pages):
+    """Writes a minimal uncompressed PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(1, pages + 1):
+        content = f"BT /F1 12 Tf 72 720 Td (Audit report page {page}) Tj ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    data += ''.join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def check_ingest(pages=12, timeout=120):
+    """Runs IngestDaemon.process_file on a generated text PDF from a worker thread, as the daemon
+    does, and checks that the text of every page was extracted and reviewed.
+    Returns:
+        bool: True if the PDF was processed off the main thread.
+    """
+    import os
+    import tempfile
+    import threading
+    from data_processing.ingest_daemon import IngestDaemon
+
+    outcome = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, 'sample_report.pdf')
+        _write_text_pdf(pdf_path, pages)
+        from database.results_store import ResultsStore
+        store = ResultsStore(os.path.join(tmp_dir, 'results.db'))
+        daemon = IngestDaemon([tmp_dir], state_path=os.path.join(tmp_dir, 'ingest_state.json'),
+                              results_store=store)
+
+        def run():
+            try:
+                text = daemon._engines()[0].load_document_data(pdf_path)
+                outcome['pages_found'] = sum(f"page {page}" in (text or '') for page in range(1, pages + 1))
+                outcome['result'] = daemon.process_file(pdf_path)
+                outcome['stored'] = len(store.query_reports(review_id=outcome['result']['review_id']))
+            except Exception as e:
+                outcome['error'] = e
+
+        worker = threading.Thread(target=run, name='ingest-check', daemon=True)
+        worker.start()
+        worker.join(timeout)
+        store.close()
+    if worker.is_alive():
+        print(f"Ingest check did not finish within {timeout}s")
+        return False
+    if 'error' in outcome:
+        print(f"process_file failed in a worker thread: {type(outcome['error']).__name__}: {outcome['error']}")
+        return False
+    print(f"Worker thread extracted {outcome['pages_found']}/{pages} pages; "
+          f"review: {outcome['result']['records']} records, {outcome['result']['violations']} violations, "
+          f"{outcome['stored']} reports saved")
+    return outcome['pages_found'] == pages and outcome['stored'] == outcome['result']['records']
+
+def check_triage(data_path=None, min_reduction=MIN_TRIAGE_REDUCTION):
+    """Runs RuleEngine and ReviewTriage on the shipped audit_report_data.csv and checks that
+    triage sends at least min_reduction fewer reports to the LLM than there are reports.
+    Returns:
+        bool: True if the reduction is reached.
+    """
+    import os
+    import pandas as pd
+    from review_engine.rule_engine import RuleEngine
+    from review_engine.triage import ReviewTriage, ROUTE_NEEDS_LLM
+
+    data_path = data_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audit_report_data.csv')
+    reports = pd.read_csv(data_path)
+    triaged = ReviewTriage().triage(reports, RuleEngine().apply_rules_compact(reports))
+    needs_llm = int((triaged['triage_route'] == ROUTE_NEEDS_LLM).sum())
+    reduction = 1 - needs_llm / max(len(reports), 1)
+    print(f"Triage sends {needs_llm}/{len(reports)} reports to the LLM "
+          f"({reduction:.0%} fewer calls, required {min_reduction:.0%})")
+    return reduction >= min_reduction
+
 if __name__ == "__main__":
+    if '--check-import-time' in sys.argv:
+        sys.exit(0 if check_import_time() else 1)
+    if '--check-engines' in sys.argv:
+        sys.exit(0 if check_engines() else 1)
+    if '--check-ingest' in sys.argv:
+        sys.exit(0 if check_ingest() else 1)
+    if '--check-triage' in sys.argv:
+        sys.exit(0 if check_triage() else 1)
+    if '--watch' in sys.argv:
+        # 无界面的持续接入模式：python main.py --watch DIR [DIR ...]，结果写入与界面相同的结果库
+        from data_processing.ingest_daemon import IngestDaemon
+        from database.results_store import ResultsStore
+        watch_dirs = sys.argv[sys.argv.index('--watch') + 1:]
+        if not watch_dirs:
+            sys.exit("Usage: python main.py --watch DIR [DIR ...]")
+        IngestDaemon(watch_dirs, results_store=ResultsStore('audit_reports.db')).run_forever()
+        sys.exit(0)
     app = App()
     app.mainloop()
\ No newline at end of file
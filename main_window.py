@@ -1,15 +1,11 @@
 # -*- coding: utf-8 -*-
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
 import os
+import threading
 
-# Import modules from data_processing and review_engine
-from data_processing.data_loader import DataLoader
-from data_processing.ocr_processor import OCRProcessor
-from data_processing.data_cleaner import DataCleaner
-from review_engine.rule_engine import RuleEngine
-from review_engine.llm_module import LLMModule
+# 处理模块（pandas、PyPDF2 等重量级依赖）在首次使用时才导入，保证窗口快速显示。
+# 对应模块：data_processing.*, review_engine.*, database.results_store, utils.result_exporter
 
 class MainWindow:
     def __init__(self, master):
@@ -37,21 +33,126 @@ class MainWindow:
         # 配置ttk样式
         self.setup_styles()
 
-        # Initialize modules
-        self.data_loader = DataLoader()
-        self.ocr_processor = OCRProcessor()
-        self.data_cleaner = DataCleaner()
-        self.rule_engine = RuleEngine()
-        self.llm_module = LLMModule()
+        # Initialize modules lazily (see the engine properties below)
+        self._engines = {}
+        # 可重入锁：部分模块的工厂函数会访问其他模块（如 llm_scheduler 依赖 llm_module）
+        self._engines_lock = threading.RLock()
 
         # Data storage
         self.loaded_data = None  # For structured data (CSV/Excel)
         self.image_attachment_paths = [] # For image/PDF paths
         self.processed_data = None # Integrated and cleaned data
         self.review_results = None # Final review results
+        self.document_texts = {} # 已提取的审计报告全文，按内容哈希存放
+        self.pinned_reports = set() # 审计员手动置顶、优先交给LLM复核的报告
 
         self.create_widgets()
-    
+
+        # 窗口绘制完成后在后台预热各处理模块，首次点击按钮时无需再等待导入
+        master.after(500, lambda: threading.Thread(target=self._warm_up_engines, daemon=True).start())
+        # 存在上次会话快照时提示恢复
+        master.after(800, self._offer_session_restore)
+
+    def _get_engine(self, name, factory):
+        """返回处理模块实例，首次访问时才导入并创建。"""
+        engine = self._engines.get(name)
+        if engine is None:
+            with self._engines_lock:
+                engine = self._engines.get(name)
+                if engine is None:
+                    engine = factory()
+                    self._engines[name] = engine
+        return engine
+
+    def _warm_up_engines(self):
+        try:
+            for name in ('data_loader', 'rule_engine', 'llm_module', 'review_triage'):
+                getattr(self, name)
+        except Exception as e:
+            print(f"后台预加载模块失败（将在首次使用时重试）: {e}")
+
+    @property
+    def data_loader(self):
+        def factory():
+            from data_processing.data_loader import DataLoader
+            return DataLoader()
+        return self._get_engine('data_loader', factory)
+
+    @property
+    def ocr_processor(self):
+        def factory():
+            from data_processing.ocr_processor import OCRProcessor
+            return OCRProcessor(image_cache=self.data_loader.image_cache)
+        return self._get_engine('ocr_processor', factory)
+
+    @property
+    def data_cleaner(self):
+        def factory():
+            from data_processing.data_cleaner import DataCleaner
+            return DataCleaner()
+        return self._get_engine('data_cleaner', factory)
+
+    @property
+    def evidence_summarizer(self):
+        def factory():
+            from data_processing.text_summarizer import EvidenceSummarizer
+            return EvidenceSummarizer()
+        return self._get_engine('evidence_summarizer', factory)
+
+    @property
+    def rule_engine(self):
+        def factory():
+            from review_engine.rule_engine import RuleEngine
+            from review_engine.rule_profiler import RuleProfiler
+            # 规则耗时与失败率跨会话保存，用于自适应排序
+            engine = RuleEngine(ordering='adaptive', profiler=RuleProfiler('cache/rule_profile.json'))
+            # 已导入历史报告时启用跨期间规则（按需读取分区，不预先加载）
+            if os.path.isdir('data/history'):
+                from database.history_store import HistoryStore
+                engine.attach_history_store(HistoryStore('data/history'))
+            return engine
+        return self._get_engine('rule_engine', factory)
+
+    @property
+    def llm_module(self):
+        def factory():
+            from review_engine.llm_module import LLMModule
+            from review_engine.llm_router import load_router_config
+            # 配置了多个模型后端时按报告长度与风险路由，否则使用单一模型
+            return LLMModule(router=load_router_config('config/llm_backends.json'),
+                             evidence_summarizer=self.evidence_summarizer)
+        return self._get_engine('llm_module', factory)
+
+    @property
+    def llm_scheduler(self):
+        def factory():
+            from review_engine.llm_scheduler import LLMScheduler
+            return LLMScheduler(self.llm_module).start()
+        return self._get_engine('llm_scheduler', factory)
+
+    @property
+    def report_clusterer(self):
+        def factory():
+            from review_engine.report_clustering import ReportClusterer
+            return ReportClusterer()
+        return self._get_engine('report_clusterer', factory)
+
+    @property
+    def review_triage(self):
+        def factory():
+            from review_engine.triage import ReviewTriage
+            from review_engine.local_scorer import LocalRiskScorer
+            # 若已训练本地风险打分模型，则在分流阶段作为LLM前置筛选
+            return ReviewTriage(risk_scorer=LocalRiskScorer.load_if_exists('models/local_risk_scorer.npz'))
+        return self._get_engine('review_triage', factory)
+
+    @property
+    def results_store(self):
+        def factory():
+            from database.results_store import ResultsStore
+            return ResultsStore('audit_reports.db')
+        return self._get_engine('results_store', factory)
+
     def setup_styles(self):
         """设置现代化的ttk样式"""
         style = ttk.Style()
@@ -160,11 +261,27 @@ class MainWindow:
                                    command=self.run_review_engine, style='Accent.TButton')
         btn_run_review.pack(side="left", padx=(0, 10))
 
+        btn_pipelined_review = ttk.Button(button_container, text="⏩ 流水线复核", 
+                                          command=self.run_pipelined_review, style='Accent.TButton')
+        btn_pipelined_review.pack(side="left", padx=(0, 10))
+
+        btn_pin_report = ttk.Button(button_container, text="📍 置顶复核", 
+                                    command=self.pin_selected_report)
+        btn_pin_report.pack(side="left", padx=(0, 10))
+
         # 辅助操作按钮
         btn_export_results = ttk.Button(button_container, text="💾 导出结果", 
                                         command=self.export_review_results)
         btn_export_results.pack(side="left", padx=(0, 10))
 
+        btn_save_session = ttk.Button(button_container, text="📌 保存会话", 
+                                      command=self.save_session)
+        btn_save_session.pack(side="left", padx=(0, 10))
+
+        btn_restore_session = ttk.Button(button_container, text="⏪ 恢复会话", 
+                                         command=self.restore_session)
+        btn_restore_session.pack(side="left", padx=(0, 10))
+
         btn_reset = ttk.Button(button_container, text="🔄 重置系统", 
                               command=self.reset_system)
         btn_reset.pack(side="left", padx=(0, 10))
@@ -405,24 +522,39 @@ class MainWindow:
                 self.update_status("正在识别审计报告内容...", "processing")
                 self.master.update()
                 
-                # 使用data_loader处理PDF
-                pdf_content = self.data_loader.load_document_data(file_path)
+                # 使用data_loader处理PDF；较大的报告按页并行提取，各进程共享文件的内存映射
+                workers = (os.cpu_count() or 1) if file_size > 5 else 1
+                pdf_content = self.data_loader.load_document_data(file_path, workers=workers)
                 
                 if pdf_content and pdf_content.strip():
                     # 存储审计报告内容
                     if not hasattr(self, 'audit_reports'):
                         self.audit_reports = []
                     
+                    # 本地抽取式摘要，按文档哈希缓存，供LLM复核使用
+                    evidence = self.evidence_summarizer.summarize(
+                        pdf_content, self.data_loader.get_section_index(pdf_content))
+                    # 以证据摘要代替全文送入LLM复核
+                    try:
+                        llm_result = self.llm_module.analyze_report(
+                            {'report_id': os.path.basename(file_path)}, evidence=evidence)
+                    except Exception as e:
+                        llm_result = {'assessment': 'Error', 'analysis_details': str(e)}
+                    
                     report_info = {
                         '文件名': os.path.basename(file_path),
                         '文件路径': file_path,
                         '文件大小': f"{file_size:.1f}MB",
                         '识别状态': '成功',
                         '内容长度': len(pdf_content),
+                        '内容哈希': evidence['doc_hash'],
+                        '证据摘要长度': evidence['evidence_chars'],
+                        'LLM评估': llm_result['assessment'],
                         '内容预览': pdf_content[:200] + "..." if len(pdf_content) > 200 else pdf_content
                     }
                     
                     self.audit_reports.append(report_info)
+                    self.document_texts[evidence['doc_hash']] = pdf_content
                     
                     # 将审计报告信息转换为DataFrame并显示
                     import pandas as pd
@@ -436,7 +568,12 @@ class MainWindow:
                     display_content = f"📄 审计报告识别结果\n\n"
                     display_content += f"文件名: {report_info['文件名']}\n"
                     display_content += f"文件大小: {report_info['文件大小']}\n"
-                    display_content += f"内容长度: {report_info['内容长度']} 字符\n\n"
+                    display_content += f"内容长度: {report_info['内容长度']} 字符\n"
+                    display_content += f"证据摘要: {evidence['evidence_chars']} 字符（涉及章节: {'、'.join(evidence['sections']) or '无'}）\n\n"
+                    if evidence['evidence_text']:
+                        display_content += f"证据摘要内容:\n{'-'*50}\n{evidence['evidence_text']}\n\n"
+                    display_content += f"LLM评估（基于证据摘要）: {llm_result['assessment']}\n"
+                    display_content += f"{llm_result['analysis_details']}\n\n"
                     display_content += f"识别内容预览:\n{'-'*50}\n"
                     display_content += pdf_content[:1000]
                     if len(pdf_content) > 1000:
@@ -524,7 +661,8 @@ class MainWindow:
                         except Exception as pdf_error:
                             failed_files.append(f"{os.path.basename(file_path)} (PDF错误: {str(pdf_error)[:50]})")
                     else:
-                        # 处理图片文件
+                        # 处理图片文件：解码一次，缓存OCR输入与缩略图，后续OCR与预览直接复用
+                        self.data_loader.load_image_data(file_path)
                         self.image_attachment_paths.append(file_path)
                         processed_files += 1
                         self.update_status(f"已处理 {processed_files}/{len(file_paths)} 个文件", "processing")
@@ -579,57 +717,50 @@ class MainWindow:
         messagebox.showinfo("信息", "数据加载、处理和集成完成！")
 
     def run_review_engine(self):
-        """运行规则引擎和LLM模块进行复核。"""
+        """运行规则引擎，经分流后仅将需要判断的报告交给LLM模块复核。"""
+        import pandas as pd
+        from review_engine.triage import ROUTE_NEEDS_LLM
+
         if not hasattr(self, 'processed_data') or self.processed_data.empty:
             messagebox.showwarning("警告", "请先加载并处理数据！")
             return
 
         # 运行规则引擎
-        # Assuming self.processed_data is a pandas DataFrame or similar structure
-        # that rule_engine can process.
-        # The rule engine should return a DataFrame with review results.
-        # For demonstration, we'll simulate rule engine output.
-        # self.review_results = self.rule_engine.apply_rules(self.processed_data)
-
-        # Simulate rule engine application
-        # For each report in processed_data, apply rules and get a result
-        simulated_rule_results = []
-        for index, row in self.processed_data.iterrows():
-            report_id = row.get('报告ID', f'Report_{index+1}')
-            # Simulate rule application based on some conditions
-            if '金额' in row and row['金额'] > 5000:
-                violation_details = "金额超过5000元，需要重点关注。"
-                is_compliant = False
-            else:
-                violation_details = "无重大违规。"
-                is_compliant = True
-            simulated_rule_results.append({
-                '报告ID': report_id,
-                '是否合规': '是' if is_compliant else '否',
-                '违规详情': violation_details
-            })
-        self.rule_review_results = pd.DataFrame(simulated_rule_results)
-
-        # 运行LLM模块进行分析
-        # Assuming llm_module.batch_analyze_reports takes a list of reports
-        # and returns a list of analysis results.
-        # For demonstration, we'll simulate LLM analysis output.
-        # llm_analysis_results = self.llm_module.batch_analyze_reports(self.processed_data.to_dict(orient='records'))
-
-        # Simulate LLM analysis
-        simulated_llm_results = []
-        for index, row in self.processed_data.iterrows():
-            report_id = row.get('报告ID', f'Report_{index+1}')
-            # Simulate LLM analysis based on some conditions
-            if '描述' in row and '异常' in row['描述']:
-                llm_analysis = "LLM分析：发现描述中存在异常关键词，建议人工复核。"
-            else:
-                llm_analysis = "LLM分析：未发现明显异常。"
-            simulated_llm_results.append({
-                '报告ID': report_id,
-                'LLM分析结果': llm_analysis
-            })
-        self.llm_analysis_results = pd.DataFrame(simulated_llm_results)
+        self.update_status("正在执行规则校验...", "processing")
+        self.violation_table = self.rule_engine.apply_rules_compact(self.processed_data)
+
+        # 分流：auto-pass / auto-flag 不调用LLM，只有 needs-llm 的报告进入LLM复核
+        triaged_data = self.review_triage.triage(self.processed_data, self.violation_table)
+        report_ids = self._report_ids(self.processed_data)
+
+        # 运行LLM模块进行分析（仅 needs-llm）
+        needs_llm_mask = (triaged_data['triage_route'] == ROUTE_NEEDS_LLM).to_numpy()
+        needs_llm_positions = needs_llm_mask.nonzero()[0]
+        self.update_status(f"正在进行LLM分析（{len(needs_llm_positions)}/{len(triaged_data)} 份报告）...", "processing")
+        llm_inputs = self.processed_data.iloc[needs_llm_positions].to_dict(orient='records')
+        # 按严重程度、涉及金额与手动置顶排序发送，高风险报告最先得到结果
+        from review_engine.llm_scheduler import priority_inputs
+        severities, amounts = priority_inputs(self.processed_data, self.violation_table, needs_llm_positions)
+        risks = (triaged_data['local_risk_score'].iloc[needs_llm_positions].tolist()
+                 if 'local_risk_score' in triaged_data.columns else None)
+        llm_ids = [report_ids[pos] for pos in needs_llm_positions]
+
+        def send(positions):
+            return self.llm_scheduler.run_batch(
+                [llm_inputs[p] for p in positions], [llm_ids[p] for p in positions],
+                [severities[p] for p in positions], [amounts[p] for p in positions],
+                pinned=self.pinned_reports, risks=[risks[p] for p in positions] if risks is not None else None)
+
+        # 近似相同的报告（模板化报告，仅单位与金额不同）只分析代表报告，其余沿用其结论并标注差异；
+        # 置顶报告始终单独分析
+        pinned = {str(report_id) for report_id in self.pinned_reports}
+        pinned_positions = [i for i, report_id in enumerate(llm_ids) if str(report_id) in pinned]
+        llm_outputs = self.report_clusterer.analyze(llm_inputs, send, report_ids=llm_ids,
+                                                    force_individual=pinned_positions)
+
+        llm_by_position = dict(zip(needs_llm_positions, llm_outputs))
+        self.rule_review_results, self.llm_analysis_results = self._build_review_frames(
+            triaged_data, self.violation_table, report_ids, llm_by_position)
 
         # 合并规则引擎和LLM分析结果
         # Merge on '报告ID' or a similar unique identifier
@@ -640,34 +771,203 @@ class MainWindow:
             how='left'
         )
 
+        # 持久化本次复核结果，便于按报告/规则/严重程度/期间回查
+        self._store_review_results(triaged_data, report_ids, llm_by_position,
+                                   self.rule_review_results, self.violation_table)
+
         # Update the Treeview with processed data
         self.update_review_results_display(self.review_results)
+        self.update_status(f"复核完成，分流结果: {self.review_triage.summarize(triaged_data)}", "info")
+        print(f"规则耗时统计:\n{self.rule_engine.profile_report().to_string(index=False)}")
 
         messagebox.showinfo("信息", "审计报告复核完成！")
 
+    @staticmethod
+    def _report_ids(records, offset=0):
+        return [row.get('报告ID', row.get('报告编号', f'Report_{offset+pos+1}'))
+                for pos, row in enumerate(records.to_dict(orient='records'))]
+
+    @staticmethod
+    def _build_review_frames(triaged_data, violation_table, report_ids, llm_by_position):
+        """Builds the rule-result and LLM-result display frames of one reviewed batch."""
+        import pandas as pd
+        from review_engine.triage import ROUTE_AUTO_FLAG
+
+        rule_results = []
+        # 违规明细仅在展示时展开为字典
+        for pos, (violations, route, reason) in enumerate(zip(violation_table.to_lists(),
+                                                              triaged_data['triage_route'],
+                                                              triaged_data['triage_reason'])):
+            rule_results.append({
+                '报告ID': report_ids[pos],
+                '是否合规': '否' if violations or route == ROUTE_AUTO_FLAG else '是',
+                '违规详情': '; '.join(v['rule_name'] for v in violations) if violations else "无重大违规。",
+                '复核路径': route,
+                '分流原因': reason
+            })
+
+        llm_results = []
+        for pos, route in enumerate(triaged_data['triage_route']):
+            if pos in llm_by_position:
+                analysis = llm_by_position[pos]
+                llm_analysis = f"LLM分析：{analysis['assessment']} - {analysis['analysis_details']}"
+            elif route == ROUTE_AUTO_FLAG:
+                llm_analysis = "未调用LLM：规则已判定为高风险，直接标记。"
+            else:
+                llm_analysis = "未调用LLM：规则全部通过，自动放行。"
+            llm_results.append({
+                '报告ID': report_ids[pos],
+                'LLM分析结果': llm_analysis
+            })
+        return pd.DataFrame(rule_results), pd.DataFrame(llm_results)
+
+    def _store_review_results(self, triaged_data, report_ids, llm_by_position, rule_review_results,
+                              violation_table, review_id=None):
+        """将一批复核的报告、规则违规与LLM评估批量写入结果库。
+        review_id 为空时登记一次新的复核；返回本次使用的 review_id。
+        """
+        import pandas as pd
+
+        try:
+            reports = pd.DataFrame({
+                'report_id': [str(report_id) for report_id in report_ids],
+                'route': triaged_data['triage_route'].tolist(),
+                'route_reason': triaged_data['triage_reason'].tolist(),
+                'compliant': (rule_review_results['是否合规'] == '是').tolist(),
+            })
+            for column, candidates in (('entity', ['被审计单位', 'entity']), ('period', ['报告期间', 'period', '年度'])):
+                source = next((c for c in candidates if c in triaged_data.columns), None)
+                if source is not None:
+                    reports[column] = triaged_data[source].astype(str).tolist()
+            llm_results = {str(report_ids[pos]): analysis for pos, analysis in llm_by_position.items()}
+            if review_id is None:
+                review_id = self.results_store.start_review(source='gui')
+            self.current_review_id = review_id
+            self.results_store.insert_batch(review_id, reports, violation_table, llm_results)
+        except Exception as e:
+            print(f"保存复核结果到数据库失败: {e}")
+        return review_id
+
+    def run_pipelined_review(self):
+        """流水线复核：分块加载、OCR、规则校验与LLM分析并行推进，每批结果到达即显示。"""
+        file_path = filedialog.askopenfilename(
+            title="选择待复核的审计数据（取消则仅复核已加载的支撑文件）",
+            filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+        )
+        if not file_path and not self.image_attachment_paths:
+            messagebox.showwarning("警告", "请选择审计数据文件或先加载支撑文件！")
+            return
+        if getattr(self, '_pipeline', None) is not None:
+            messagebox.showwarning("警告", "已有流水线复核正在运行！")
+            return
+
+        from review_engine.pipeline_executor import ReviewPipeline
+        self._pipeline = ReviewPipeline(self.data_loader, self.ocr_processor, self.data_cleaner,
+                                        self.rule_engine, self.review_triage, self.llm_module,
+                                        llm_scheduler=self.llm_scheduler,
+                                        report_clusterer=self.report_clusterer,
+                                        pinned_reports=self.pinned_reports)
+        self._pipeline_batches = []
+        self._pipeline_review_id = None
+        for i in self.tree.get_children():
+            self.tree.delete(i)
+        self._pipeline.start(structured_path=file_path or None, attachment_paths=list(self.image_attachment_paths))
+        self.update_status("流水线复核进行中...", "processing")
+        self._pipeline_poll_id = self.master.after(200, self._poll_pipeline)
+
+    def _poll_pipeline(self):
+        """在界面线程中取回已完成的批次并追加显示（Tk 控件只能在界面线程中更新）。"""
+        import queue as queue_module
+        import pandas as pd
+
+        self._pipeline_poll_id = None
+        # 重置后仍可能有已排定的回调，流水线已撤销时直接返回
+        if getattr(self, '_pipeline', None) is None:
+            return
+        while True:
+            try:
+                result = self._pipeline.results.get_nowait()
+            except queue_module.Empty:
+                self._pipeline_poll_id = self.master.after(200, self._poll_pipeline)
+                return
+            if result is None:
+                break
+            if 'error' in result:
+                messagebox.showerror("错误", f"流水线复核失败: {result['error']}")
+                self._pipeline = None
+                self.update_status("流水线复核失败", "error")
+                return
+
+            report_ids = self._report_ids(result['records'], result['offset'])
+            rule_df, llm_df = self._build_review_frames(result['triaged'], result['violation_table'],
+                                                        report_ids, result['llm_by_position'])
+            batch_results = pd.merge(rule_df, llm_df, on='报告ID', how='left')
+            self._pipeline_review_id = self._store_review_results(
+                result['triaged'], report_ids, result['llm_by_position'], rule_df,
+                result['violation_table'], self._pipeline_review_id)
+            self._pipeline_batches.append((result, rule_df, llm_df, batch_results))
+
+            if len(self._pipeline_batches) == 1:
+                self.tree["columns"] = list(batch_results.columns)
+                for col in batch_results.columns:
+                    self.tree.heading(col, text=col)
+                    self.tree.column(col, width=100)
+            for row in batch_results.itertuples(index=False):
+                self.tree.insert("", "end", values=list(row))
+            self.update_status(f"流水线复核进行中：已完成 {result['offset'] + len(batch_results)} 份报告"
+                               f"（首批结果用时 {self._pipeline_batches[0][0]['elapsed']:.1f}s）", "processing")
+
+        # 全部批次完成后汇总为常规复核结果，供导出与快照使用
+        from review_engine.violation_table import concat_violation_tables
+        batches = self._pipeline_batches
+        self._pipeline = None
+        if not batches:
+            self.update_status("流水线复核完成：没有可复核的数据", "info")
+            return
+        self.processed_data = pd.concat([b[0]['records'] for b in batches], ignore_index=True)
+        self.violation_table = concat_violation_tables([b[0]['violation_table'] for b in batches])
+        self.rule_review_results = pd.concat([b[1] for b in batches], ignore_index=True)
+        self.llm_analysis_results = pd.concat([b[2] for b in batches], ignore_index=True)
+        self.review_results = pd.concat([b[3] for b in batches], ignore_index=True)
+        self.update_review_results_display(self.review_results)
+        self.update_status(f"流水线复核完成：{len(self.review_results)} 份报告，{len(batches)} 批", "success")
+
     def export_review_results(self):
-        """导出复核结果到CSV文件。"""
+        """分块流式导出复核结果（CSV / CSV.gz / Parquet / XLSX），规则违规明细单独成表。"""
         if not hasattr(self, 'review_results') or self.review_results.empty:
             messagebox.showwarning("警告", "没有复核结果可导出！")
             return
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("Compressed CSV", "*.csv.gz"),
+                       ("Parquet files", "*.parquet"), ("Excel files", "*.xlsx"), ("All files", "*.*")]
         )
         if file_path:
             try:
-                self.review_results.to_csv(file_path, index=False, encoding='utf-8-sig')
-                messagebox.showinfo("信息", f"复核结果已成功导出到 {file_path}")
+                from utils.result_exporter import export_in_chunks
+                self.update_status("正在导出复核结果...", "processing")
+                exporter = export_in_chunks(file_path, self.review_results, getattr(self, 'violation_table', None))
+                self.update_status(f"已导出 {exporter.rows_written} 条结果", "info")
+                messagebox.showinfo("信息", f"复核结果已成功导出到 {file_path}\n"
+                                          f"违规明细 {exporter.violations_written} 条已写入单独的明细表")
             except Exception as e:
                 messagebox.showerror("错误", f"导出失败: {e}")
 
     def reset_system(self):
         """重置系统状态，清空所有加载的数据和结果。"""
+        if getattr(self, '_pipeline_poll_id', None) is not None:
+            self.master.after_cancel(self._pipeline_poll_id)
+            self._pipeline_poll_id = None
+        if getattr(self, '_pipeline', None) is not None:
+            self._pipeline.cancel()
+            self._pipeline = None
         if hasattr(self, 'processed_data'):
             del self.processed_data
         if hasattr(self, 'rule_review_results'):
             del self.rule_review_results
+        if hasattr(self, 'violation_table'):
+            del self.violation_table
         if hasattr(self, 'llm_analysis_results'):
             del self.llm_analysis_results
         if hasattr(self, 'review_results'):
@@ -679,6 +979,8 @@ class MainWindow:
         
         # 清空附件路径列表
         self.image_attachment_paths = []
+        self.document_texts = {}
+        self.pinned_reports.clear()  # 原地清空，运行中的流水线持有同一集合
 
         # 清空Treeview
         for i in self.tree.get_children():
@@ -696,6 +998,86 @@ class MainWindow:
 
         messagebox.showinfo("信息", "系统已重置！所有数据已清空。")
 
+    def save_session(self):
+        """将当前会话（数据表、附件路径、报告全文）保存为快照，下次启动可直接恢复。"""
+        try:
+            import pandas as pd
+            from utils.session_snapshot import SessionSnapshot
+            self.update_status("正在保存会话快照...", "processing")
+            audit_reports = getattr(self, 'audit_reports', None)
+            SessionSnapshot().save(
+                frames={
+                    'loaded_data': getattr(self, 'loaded_data', None),
+                    'processed_data': getattr(self, 'processed_data', None),
+                    'review_results': getattr(self, 'review_results', None),
+                    'audit_reports': pd.DataFrame(audit_reports) if audit_reports else None,
+                },
+                lists={'image_attachment_paths': self.image_attachment_paths},
+                texts=[self.document_texts[content_hash] for content_hash in self.document_texts],
+            )
+            self.update_status("会话快照已保存", "success")
+        except Exception as e:
+            messagebox.showerror("错误", f"保存会话失败: {e}")
+
+    def _offer_session_restore(self):
+        try:
+            from utils.session_snapshot import SessionSnapshot
+            snapshot = SessionSnapshot()
+            if snapshot.exists() and messagebox.askyesno("恢复会话", "检测到上次保存的会话快照，是否恢复？"):
+                self.restore_session()
+        except Exception as e:
+            print(f"检查会话快照失败: {e}")
+
+    def restore_session(self):
+        """从快照恢复会话：数据表以内存映射方式读取，报告全文按需加载。"""
+        try:
+            from utils.session_snapshot import SessionSnapshot
+            snapshot = SessionSnapshot()
+            if not snapshot.exists():
+                messagebox.showwarning("警告", "没有可恢复的会话快照！")
+                return
+            self.update_status("正在恢复会话快照...", "processing")
+            frames, lists, texts = snapshot.load()
+        except Exception as e:
+            messagebox.showerror("错误", f"恢复会话失败: {e}")
+            return
+
+        self.loaded_data = frames.get('loaded_data')
+        self.processed_data = frames.get('processed_data')
+        self.review_results = frames.get('review_results')
+        if 'audit_reports' in frames:
+            self.audit_reports = frames['audit_reports'].to_dict(orient='records')
+        self.image_attachment_paths = lists.get('image_attachment_paths', [])
+        self.document_texts = texts
+
+        if self.review_results is not None:
+            self.update_review_results_display(self.review_results)
+        else:
+            for frame in (self.processed_data, self.loaded_data, frames.get('audit_reports')):
+                if frame is not None:
+                    self.update_treeview(frame)
+                    break
+        self.update_status(f"会话已恢复（{len(self.image_attachment_paths)} 个附件，{len(texts)} 份报告全文）", "success")
+
+    def pin_selected_report(self):
+        """将选中的报告置顶：尚未发送给LLM的请求立即排到队首。"""
+        selected_item = self.tree.focus()
+        if not selected_item:
+            messagebox.showwarning("警告", "请先在左侧表格中选择一份报告！")
+            return
+        columns = list(self.tree['columns'])
+        id_column = next((c for c in ('报告ID', '报告编号') if c in columns), None)
+        if id_column is None:
+            messagebox.showwarning("警告", "当前表格中没有报告编号列！")
+            return
+        report_id = self.tree.item(selected_item, 'values')[columns.index(id_column)]
+        self.pinned_reports.add(report_id)
+        scheduler = self._engines.get('llm_scheduler')
+        if scheduler is not None and scheduler.pin(report_id):
+            self.update_status(f"报告 {report_id} 已置顶，将优先进行LLM复核", "info")
+        else:
+            self.update_status(f"报告 {report_id} 已标记置顶，下次复核时优先处理", "info")
+
     def on_tree_select(self, event):
         """处理Treeview选择事件，显示选中行的详细信息。"""
         selected_item = self.tree.focus()
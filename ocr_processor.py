@@ -4,12 +4,22 @@
 # In a real application, you would integrate with an OCR engine like Tesseract, Baidu OCR, Google Vision AI, etc.
 
 class OCRProcessor:
-    def __init__(self):
+    def __init__(self, image_cache=None):
+        """Args:
+            image_cache (ImageCache, optional): Preprocesses raw scans (once per content hash)
+                                                before OCR. Paths already produced by the cache
+                                                are used as they are.
+        """
         # Initialize OCR engine client here
-        pass
+        self.image_cache = image_cache
 
     def process_image(self, image_path):
         """Performs OCR on an image file and extracts text."""
+        if self.image_cache is not None:
+            try:
+                image_path = self.image_cache.ocr_input(image_path)
+            except ImportError:
+                self.image_cache = None
         print(f"Simulating OCR processing for image: {image_path}")
         # Placeholder for actual OCR logic
         # Example: Use pytesseract.image_to_string(Image.open(image_path))
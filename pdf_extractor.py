@@ -0,0 +1,168 @@
+# data_processing/pdf_extractor.py
+import mmap
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# 每个工作进程最多保留的已映射文档数
+_WORKER_CACHE_SIZE = 4
+_worker_documents = OrderedDict()
+
+
+class MappedDocument:
+    def __init__(self, path):
+        """Read-only memory map of a document file.
+        The mapping is file-backed: every process that maps the same file shares the page-cache
+        pages, so nothing is copied into private memory until a page is actually parsed.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise ValueError(f"Cannot map empty document: {path}")
+        stat = os.fstat(self._file.fileno())
+        self.stamp = (stat.st_size, stat.st_mtime_ns)
+
+    def stream(self):
+        """The mapping itself: a seekable file-like object PyPDF2 can read without a full copy."""
+        self._mmap.seek(0)
+        return self._mmap
+
+    def view(self):
+        """Zero-copy memoryview of the whole document."""
+        return memoryview(self._mmap)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_reader(path, stamp):
+    """Returns the worker's PdfReader for a document, mapping and parsing it once per worker."""
+    import PyPDF2
+
+    key = (path, stamp)
+    entry = _worker_documents.get(key)
+    if entry is None:
+        document = MappedDocument(path)
+        entry = (document, PyPDF2.PdfReader(document.stream()))
+        _worker_documents[key] = entry
+        while len(_worker_documents) > _WORKER_CACHE_SIZE:
+            old_document, _ = _worker_documents.popitem(last=False)[1]
+            try:
+                old_document.close()
+            except BufferError:
+                pass  # 仍被引用时交由进程退出回收
+    else:
+        _worker_documents.move_to_end(key)
+    return entry[1]
+
+
+def _extract_page_range(path, stamp, start, stop):
+    """Worker task: texts of pages [start, stop) as (page_num, text, error) tuples."""
+    reader = _open_reader(path, stamp)
+    pages = []
+    for page_num in range(start, stop):
+        try:
+            pages.append((page_num, reader.pages[page_num].extract_text() or '', None))
+        except Exception as e:
+            pages.append((page_num, '', str(e)))
+    return pages
+
+
+class PageParallelExtractor:
+    def __init__(self, workers=None, pages_per_task=4):
+        """Extracts PDF text page-parallel in a pool of worker processes.
+        Workers receive only the path; each maps the file read-only (MappedDocument) and keeps the
+        mapping and parsed reader for later tasks, so a document is never read into private memory
+        per worker. Resident memory grows with the pages being extracted, not with document size
+        times worker count.
+        Args:
+            workers (int, optional): Worker processes. Defaults to os.cpu_count().
+            pages_per_task (int): Contiguous pages per task; small enough to balance load, large
+                                  enough to amortize inter-process overhead.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def extract(self, path, max_pages=100, timeout=None):
+        """Extracts the text of the first max_pages pages.
+        Args:
+            path (str): PDF file.
+            max_pages (int): Page limit.
+            timeout (float, optional): Seconds; pages not done by then are dropped.
+        Returns:
+            tuple: (text, page_offsets, total_pages, processed_pages)
+        """
+        import PyPDF2
+
+        with MappedDocument(path) as document:
+            total_pages = len(PyPDF2.PdfReader(document.stream()).pages)
+            stamp = document.stamp
+        n_pages = min(total_pages, max_pages)
+        deadline = time.time() + timeout if timeout else None
+
+        pool = self._pool()
+        futures = {pool.submit(_extract_page_range, path, stamp, start, min(start + self.pages_per_task, n_pages)): start
+                   for start in range(0, n_pages, self.pages_per_task)}
+        done_ranges = {}
+        pending = set(futures)
+        while pending:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                done_ranges[futures[future]] = future.result()
+        for future in pending:
+            future.cancel()
+
+        # 只拼接从第一页起连续完成的部分，保证页码与偏移一致
+        text_parts, page_offsets, length = [], [], 0
+        processed = 0
+        for start in range(0, n_pages, self.pages_per_task):
+            if start not in done_ranges:
+                print(f"PDF处理超时，已处理 {processed} 页")
+                break
+            for page_num, page_text, error in done_ranges[start]:
+                # 出错的页记为空区间，保持 page_offsets[i] 对应第 i+1 页
+                page_offsets.append(length)
+                if error is not None:
+                    print(f"处理第 {page_num + 1} 页时出错: {error}")
+                    continue
+                text_parts.append(page_text)
+                length += len(page_text)
+            processed = min(start + self.pages_per_task, n_pages)
+        return ''.join(text_parts), page_offsets, total_pages, processed
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+if __name__ == '__main__':
+    import sys
+
+    extractor = PageParallelExtractor()
+    for pdf_path in sys.argv[1:]:
+        started = time.time()
+        pdf_text, offsets, pages_total, pages_done = extractor.extract(pdf_path)
+        print(f"{pdf_path}: {pages_done}/{pages_total} pages, {len(pdf_text)} chars in {time.time() - started:.2f}s")
+    extractor.close()
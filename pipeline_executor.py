@@ -0,0 +1,270 @@
+# review_engine/pipeline_executor.py
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+from review_engine.triage import ROUTE_NEEDS_LLM
+
+# 队列结束标记
+_END = object()
+STRUCTURED_EXTENSIONS = ('.csv', '.xls', '.xlsx')
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class ReviewPipeline:
+    def __init__(self, data_loader, ocr_processor, data_cleaner, rule_engine, review_triage, llm_module,
+                 batch_size=500, queue_size=4, llm_scheduler=None, report_clusterer=None, pinned_reports=()):
+        """Streams record batches through load -> OCR/clean -> rules/triage -> LLM, one thread per stage.
+        Stages are connected by bounded queues: a slow stage (usually the LLM) blocks the stages
+        before it instead of letting batches pile up in memory, and the first results are available
+        as soon as the first batch has passed every stage.
+        Batch rules (duplicates, Benford, ...) are run once over the whole structured input before it is
+        split, so their findings match a non-streamed review; the structured input is therefore read
+        completely before the first batch is emitted.
+        Args:
+            batch_size (int): Records per batch.
+            queue_size (int): Capacity, in batches, of each queue between stages.
+            llm_scheduler (LLMScheduler, optional): Sends the LLM requests of each batch by priority.
+            report_clusterer (ReportClusterer, optional): Reuses one analysis across near-identical
+                                                          reports of a batch.
+            pinned_reports (set, optional): Report IDs sent first and always analyzed individually.
+                                            Read at analysis time, so later additions apply.
+        """
+        self.data_loader = data_loader
+        self.ocr_processor = ocr_processor
+        self.data_cleaner = data_cleaner
+        self.rule_engine = rule_engine
+        self.review_triage = review_triage
+        self.llm_module = llm_module
+        self.llm_scheduler = llm_scheduler
+        self.report_clusterer = report_clusterer
+        self.pinned_reports = pinned_reports
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.results = queue.Queue()
+        self.stage_times = {}
+        self._stop = threading.Event()
+        self._threads = []
+        self._error = None
+
+    # --- queue helpers -------------------------------------------------
+    def _put(self, out_queue, item):
+        while True:
+            if self._stop.is_set():
+                raise PipelineCancelled()
+            try:
+                out_queue.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, in_queue):
+        while True:
+            if self._stop.is_set():
+                raise PipelineCancelled()
+            try:
+                return in_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+    def _run_stage(self, name, func, in_queue, out_queue):
+        """Applies func to every batch from in_queue and forwards the result (None results are dropped)."""
+        try:
+            while True:
+                batch = self._get(in_queue)
+                if batch is _END:
+                    break
+                start = time.perf_counter()
+                output = func(batch)
+                self.stage_times[name] = self.stage_times.get(name, 0.0) + time.perf_counter() - start
+                if output is not None:
+                    self._put(out_queue, output)
+            self._put(out_queue, _END)
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            self._fail(name, e)
+
+    def _fail(self, name, error):
+        print(f"Pipeline stage '{name}' failed: {error}")
+        self._error = error
+        self._stop.set()
+        self.results.put({'error': f"{name}: {error}"})
+        self.results.put(None)
+
+    # --- stages ----------------------------------------------------------
+    def _read_source(self, structured_path, records_df, attachment_paths, out_queue):
+        """Stage 1: emits structured record chunks and batches of attachment paths."""
+        try:
+            if records_df is None and structured_path is not None:
+                if structured_path.lower().endswith('.csv'):
+                    records_df = pd.read_csv(structured_path)
+                else:
+                    records_df = self.data_loader.load_structured_data(structured_path)
+                    if records_df is None:
+                        raise ValueError(f"could not load {structured_path}")
+            if records_df is not None:
+                records_df = records_df.reset_index(drop=True)
+                # 跨记录规则在整批上执行一次，结果按批拆分并换算为批内位置
+                findings_by_batch = {}
+                for finding in self.rule_engine.apply_batch_rules(records_df):
+                    row_idx = finding[0]
+                    findings_by_batch.setdefault(row_idx // self.batch_size, []).append(
+                        (row_idx % self.batch_size,) + tuple(finding[1:]))
+                for start in range(0, len(records_df), self.batch_size):
+                    self._put(out_queue, {'kind': 'records', 'records': records_df.iloc[start:start + self.batch_size],
+                                          'batch_findings': findings_by_batch.get(start // self.batch_size, [])})
+            attachment_paths = list(attachment_paths or [])
+            for start in range(0, len(attachment_paths), self.batch_size):
+                self._put(out_queue, {'kind': 'attachments', 'paths': attachment_paths[start:start + self.batch_size]})
+            self._put(out_queue, _END)
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            self._fail('load', e)
+
+    def _extract(self, batch):
+        """Stage 2: OCR and cleaning of attachments; structured chunks pass through unchanged."""
+        if batch['kind'] == 'records':
+            # 不逐块压缩类型：各块推断出的类别与位宽不一致，合并结果时会互相冲突
+            return {'records': batch['records'].reset_index(drop=True), 'batch_findings': batch['batch_findings']}
+
+        fields_list = []
+        for path in batch['paths']:
+            if path.lower().endswith('.pdf'):
+                text = self.data_loader.load_document_data(path)
+                if text is None:
+                    # 不回退到模拟OCR文本，避免以虚构字段值参与复核
+                    print(f"Pipeline: no text extracted from {path}, attachment skipped")
+                    continue
+            else:
+                text = self.ocr_processor.process_image(self.data_loader.load_image_data(path))
+            fields = self.ocr_processor.extract_key_fields(self.data_cleaner.clean_ocr_text(str(text)))
+            fields['source_file'] = os.path.basename(path)
+            fields_list.append(fields)
+        records = self.data_cleaner.integrate_data(None, fields_list)
+        return {'records': records.reset_index(drop=True)} if not records.empty else None
+
+    def _review(self, batch):
+        """Stage 3: rule engine and triage. Structured batches carry the batch rule findings of the
+        whole input; attachment batches run the batch rules on themselves."""
+        records = batch['records']
+        batch['violation_table'] = self.rule_engine.apply_rules_compact(records, batch_findings=batch.get('batch_findings'))
+        batch['triaged'] = self.review_triage.triage(records, batch['violation_table'])
+        return batch
+
+    def _analyze(self, batch):
+        """Stage 4: LLM analysis of the needs-llm reports only."""
+        routes = batch['triaged']['triage_route'].tolist()
+        needs_llm = [pos for pos, route in enumerate(routes) if route == ROUTE_NEEDS_LLM]
+        reports = batch['records'].iloc[needs_llm].to_dict(orient='records')
+        report_ids = [report.get('报告ID', report.get('报告编号', f"batch{id(batch)}-{pos}"))
+                      for pos, report in zip(needs_llm, reports)]
+        if self.llm_scheduler is not None:
+            # 与界面中的整批复核一致：按严重程度、金额、本地风险分与手动置顶排序发送
+            from review_engine.llm_scheduler import priority_inputs
+            severities, amounts = priority_inputs(batch['records'], batch['violation_table'], needs_llm)
+            triaged = batch['triaged']
+            risks = (triaged['local_risk_score'].iloc[needs_llm].tolist()
+                     if 'local_risk_score' in triaged.columns else None)
+
+            def send(positions):
+                return self.llm_scheduler.run_batch(
+                    [reports[p] for p in positions], [report_ids[p] for p in positions],
+                    [severities[p] for p in positions], [amounts[p] for p in positions],
+                    pinned=self.pinned_reports, risks=[risks[p] for p in positions] if risks is not None else None)
+        else:
+            def send(positions):
+                return self.llm_module.batch_analyze_reports([reports[p] for p in positions])
+
+        if self.report_clusterer is not None:
+            # 置顶报告始终单独分析
+            pinned = {str(report_id) for report_id in self.pinned_reports}
+            outputs = self.report_clusterer.analyze(
+                reports, send, report_ids=report_ids,
+                force_individual=[i for i, report_id in enumerate(report_ids) if str(report_id) in pinned])
+        else:
+            outputs = send(list(range(len(reports))))
+        batch['llm_by_position'] = dict(zip(needs_llm, outputs))
+        return batch
+
+    # --- control ---------------------------------------------------------
+    def start(self, structured_path=None, records_df=None, attachment_paths=None):
+        """Starts the stage threads. Finished batches appear on self.results, followed by None.
+        Each result is a dict with 'batch', 'offset', 'records', 'violation_table', 'triaged',
+        'llm_by_position' and 'elapsed' (seconds since start), or {'error': text} on failure.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(4)]
+        started = time.perf_counter()
+        counter = {'batch': 0, 'offset': 0}
+
+        def emit(batch):
+            batch.update(batch=counter['batch'], offset=counter['offset'], elapsed=time.perf_counter() - started)
+            counter['batch'] += 1
+            counter['offset'] += len(batch['records'])
+            self.results.put(batch)
+
+        def finish():
+            try:
+                while True:
+                    batch = self._get(queues[3])
+                    if batch is _END:
+                        break
+                    emit(batch)
+                self.results.put(None)
+            except PipelineCancelled:
+                self.results.put(None)
+
+        targets = [
+            (self._read_source, (structured_path, records_df, attachment_paths, queues[0])),
+            (self._run_stage, ('extract', self._extract, queues[0], queues[1])),
+            (self._run_stage, ('review', self._review, queues[1], queues[2])),
+            (self._run_stage, ('llm', self._analyze, queues[2], queues[3])),
+            (finish, ()),
+        ]
+        for target, args in targets:
+            thread = threading.Thread(target=target, args=args, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def cancel(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self, structured_path=None, records_df=None, attachment_paths=None):
+        """Generator yielding finished batches in order; raises RuntimeError if a stage failed."""
+        self.start(structured_path, records_df, attachment_paths)
+        while True:
+            result = self.results.get()
+            if result is None:
+                break
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            yield result
+        self.join()
+
+
+if __name__ == '__main__':
+    from data_processing.data_loader import DataLoader
+    from data_processing.ocr_processor import OCRProcessor
+    from data_processing.data_cleaner import DataCleaner
+    from review_engine.rule_engine import RuleEngine
+    from review_engine.triage import ReviewTriage
+    from review_engine.llm_module import LLMModule
+
+    pipeline = ReviewPipeline(DataLoader(), OCRProcessor(), DataCleaner(), RuleEngine(), ReviewTriage(),
+                              LLMModule(), batch_size=5)
+    for result in pipeline.run(structured_path='audit_report_data.csv'):
+        print(f"Batch {result['batch']}: {len(result['records'])} reports, "
+              f"{len(result['violation_table'])} violations, {len(result['llm_by_position'])} LLM calls, "
+              f"ready after {result['elapsed']:.2f}s")
+    print(f"Stage busy time: {pipeline.stage_times}")
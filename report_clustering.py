@@ -0,0 +1,238 @@
+# review_engine/report_clustering.py
+import hashlib
+import re
+
+import numpy as np
+
+from review_engine.duplicate_index import MinHashLSH, _groups_from_labels
+
+# 不参与相似度比较的标识列
+ID_FIELDS = ('报告编号', '报告ID', 'report_id', 'source_file')
+# 被审计单位名称在签名中替换为占位符，使仅单位不同的报告落入同一簇
+ENTITY_FIELDS = ('被审计单位', 'entity', 'supplier_name', '供应商名称')
+# LLM 结论所依据的内容字段：审计意见、结论叙述、风险/匹配标志与全文证据。
+# 报告中一个都没有时改用全部非标识字段（去掉批内近乎唯一的字段）
+CONTENT_FIELDS = ('审计意见', '关键结论描述', '风险提示是否充分', '建议与结论匹配度',
+                  'audit_opinion', 'key_audit_matters', 'kam_description', 'significant_risks',
+                  'management_discussion', '审计报告全文', 'pdf_text', '证据摘要')
+_NUMBER_PATTERN = re.compile(r'[-+]?\d+(?:[.,]\d+)*%?')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+
+class ReportClusterer:
+    def __init__(self, similarity=0.85, outlier_similarity=0.9, numeric_tolerance=0.5, lsh=None,
+                 content_fields=CONTENT_FIELDS, max_unique_ratio=0.5):
+        """Groups near-identical reports so that one LLM analysis can serve a whole cluster.
+        Reports are reduced to a normalized signature of their content fields (entity names and
+        numbers replaced by placeholders). Identical signatures form a cluster directly; clusters
+        whose signatures are near-identical under MinHash LSH are merged.
+        Args:
+            similarity (float): Minimum estimated Jaccard similarity to merge signatures.
+            outlier_similarity (float): Members less similar than this to the representative are
+                                        analyzed individually.
+            numeric_tolerance (float): Members whose numeric fields differ from the representative's
+                                       by more than this relative amount are analyzed individually.
+            lsh (MinHashLSH, optional): Near-duplicate index. Defaults to one using `similarity`.
+            content_fields (tuple): Fields the LLM analysis depends on; only these enter the signature.
+            max_unique_ratio (float): Without any content field, fields whose share of distinct values
+                                      in the batch exceeds this are left out of the signature.
+        """
+        self.similarity = similarity
+        self.outlier_similarity = outlier_similarity
+        self.numeric_tolerance = numeric_tolerance
+        self.lsh = lsh or MinHashLSH(num_perm=64, bands=16, shingle_size=3, threshold=similarity)
+        self.content_fields = tuple(content_fields)
+        self.max_unique_ratio = max_unique_ratio
+
+    @staticmethod
+    def _is_number(value):
+        return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+    def signature_fields(self, reports):
+        """Fields compared when clustering this batch.
+        The configured content fields when the reports have any; otherwise every text field except
+        identifiers, entity names and fields that are nearly unique per report (dates, free IDs),
+        which would keep near-duplicates apart.
+        """
+        keys = {key for report in reports for key in report}
+        fields = [key for key in self.content_fields if key in keys]
+        if fields:
+            return fields
+        candidates = sorted((key for key in keys if key not in ID_FIELDS and key not in ENTITY_FIELDS), key=str)
+        if len(reports) < 2:
+            return candidates
+        return [key for key in candidates
+                if len({str(report.get(key)) for report in reports}) / len(reports) <= self.max_unique_ratio]
+
+    def signature(self, report, fields=None):
+        """Normalized text of a report used for clustering.
+        Args:
+            report (dict): LLM input package.
+            fields (list, optional): Fields to compare (see signature_fields). Defaults to all fields
+                                     except identifiers and entity names.
+        """
+        entities = [str(report[f]) for f in ENTITY_FIELDS if report.get(f) not in (None, '')]
+        parts = []
+        for key in (fields if fields is not None else sorted(report, key=str)):
+            value = report.get(key)
+            if key in ID_FIELDS or key in ENTITY_FIELDS or self._is_number(value) or value is None:
+                continue
+            text = str(value)
+            for entity in entities:
+                text = text.replace(entity, '<单位>')
+            text = _NUMBER_PATTERN.sub('#', _SPACE_PATTERN.sub(' ', text).strip())
+            parts.append(f"{key}={text}")
+        return '|'.join(parts)
+
+    def _numeric_outlier(self, report, representative):
+        for key, value in report.items():
+            other = representative.get(key)
+            if key in ID_FIELDS or not self._is_number(value) or not self._is_number(other):
+                continue
+            if value != value or other != other:
+                continue
+            scale = max(abs(value), abs(other), 1e-9)
+            if abs(value - other) / scale > self.numeric_tolerance:
+                return True
+        return False
+
+    def cluster(self, reports, force_individual=()):
+        """Clusters a batch of reports.
+        Args:
+            reports (list of dict): LLM input packages.
+            force_individual (iterable of int): Positions that must get their own call (e.g. pinned).
+        Returns:
+            list of dict: {'representative': pos, 'members': [pos, ...], 'outliers': [pos, ...]}
+                          covering every report exactly once; singletons have no members.
+        """
+        n_reports = len(reports)
+        if n_reports == 0:
+            return []
+        force_individual = set(force_individual)
+        fields = self.signature_fields(reports)
+        signatures = [self.signature(report, fields) for report in reports]
+
+        # 1) 完全相同的签名直接归为一组
+        labels = np.fromiter((int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+                              for s in signatures), dtype=np.uint64, count=n_reports)
+        sig_leader = np.arange(n_reports)
+        for group in _groups_from_labels(labels, np.arange(n_reports)):
+            sig_leader[group] = group[0]
+        leaders = np.flatnonzero(sig_leader == np.arange(n_reports))
+        leader_row = {int(leader): row for row, leader in enumerate(leaders)}
+        minhashes = self.lsh.signatures([signatures[i] for i in leaders])
+
+        # 2) 每种签名取一个代表做 LSH，近似相同的签名组用并查集合并（LSH 分组之间可能相互重叠）
+        parent = {int(leader): int(leader) for leader in leaders}
+
+        def find(pos):
+            top = pos
+            while parent[top] != top:
+                top = parent[top]
+            while parent[pos] != top:  # 路径压缩
+                parent[pos], pos = top, parent[pos]
+            return top
+
+        if len(leaders) > 1:
+            for group in self.lsh.find_groups([signatures[i] for i in leaders]):
+                first = find(int(leaders[group[0]]))
+                for member in leaders[group[1:]]:
+                    other = find(int(member))
+                    if other != first:
+                        parent[max(first, other)] = min(first, other)
+                        first = min(first, other)
+        root = np.fromiter((find(int(leader)) for leader in sig_leader), dtype=np.int64, count=n_reports)
+
+        def minhash_of(pos):
+            return minhashes[leader_row[int(sig_leader[pos])]]
+
+        clusters = []
+        for group_root in np.unique(root):
+            group = np.flatnonzero(root == group_root)
+            clusters.extend({'representative': int(pos), 'members': [], 'outliers': []}
+                            for pos in group if pos in force_individual)
+            candidates = [int(pos) for pos in group if pos not in force_individual]
+            if not candidates:
+                continue
+            # 代表：签名与簇内其他签名平均相似度最高的报告
+            candidate_sigs = sorted({int(sig_leader[pos]) for pos in candidates})
+            if len(candidate_sigs) > 1:
+                rows = minhashes[[leader_row[sig] for sig in candidate_sigs]]
+                mean_similarity = (rows[:, None, :] == rows[None, :, :]).mean(axis=2).mean(axis=1)
+                best_sig = candidate_sigs[int(np.argmax(mean_similarity))]
+                representative = next(pos for pos in candidates if sig_leader[pos] == best_sig)
+            else:
+                representative = candidates[0]
+            cluster = {'representative': representative, 'members': [], 'outliers': []}
+            for pos in candidates:
+                if pos == representative:
+                    continue
+                similar = sig_leader[pos] == sig_leader[representative] or \
+                    (minhash_of(pos) == minhash_of(representative)).mean() >= self.outlier_similarity
+                if similar and not self._numeric_outlier(reports[pos], reports[representative]):
+                    cluster['members'].append(pos)
+                else:
+                    cluster['outliers'].append(pos)
+            clusters.append(cluster)
+        return clusters
+
+    @staticmethod
+    def differences(report, representative):
+        """Fields whose values differ from the representative, as 'field: rep value → value' lines."""
+        lines = []
+        for key in report:
+            if key in ('报告编号', '报告ID', 'report_id'):
+                continue
+            value, rep_value = report.get(key), representative.get(key)
+            if str(value) != str(rep_value):
+                lines.append(f"{key}: {rep_value} → {value}")
+        return lines
+
+    def analyze(self, reports, analyze_batch, report_ids=None, force_individual=()):
+        """Runs the LLM once per cluster representative and per outlier, then fans the results out.
+        Args:
+            reports (list of dict): LLM input packages.
+            analyze_batch (callable): Takes a list of positions into reports and returns their
+                                      analysis dicts in the same order (e.g. a scheduler/LLM call).
+            report_ids (list, optional): IDs used when referring to the representative.
+            force_individual (iterable of int): Positions that always get their own call.
+        Returns:
+            list of dict: One analysis per report, in input order.
+        """
+        clusters = self.cluster(reports, force_individual)
+        to_send = sorted({c['representative'] for c in clusters} | {p for c in clusters for p in c['outliers']})
+        sent_results = dict(zip(to_send, analyze_batch(to_send))) if to_send else {}
+        report_ids = report_ids if report_ids is not None else list(range(len(reports)))
+
+        results = [None] * len(reports)
+        for pos, result in sent_results.items():
+            results[pos] = result
+        for cluster in clusters:
+            representative = cluster['representative']
+            base = sent_results[representative]
+            for pos in cluster['members']:
+                differences = self.differences(reports[pos], reports[representative])
+                shared = dict(base)
+                shared['cluster_representative'] = report_ids[representative]
+                shared['differences'] = differences
+                shared['analysis_details'] = (f"（沿用同类报告 {report_ids[representative]} 的分析"
+                                              f"{'；差异：' + '；'.join(differences) if differences else ''}）"
+                                              f"{base.get('analysis_details', '')}")
+                results[pos] = shared
+        saved = len(reports) - len(to_send)
+        if saved:
+            print(f"Clustering: {len(reports)} reports -> {len(to_send)} LLM calls "
+                  f"({len(clusters)} clusters, {saved} analyses reused)")
+        return results
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    audit_reports = pd.read_csv('audit_report_data.csv').to_dict(orient='records')
+    clusterer = ReportClusterer()
+    demo_clusters = clusterer.cluster(audit_reports)
+    for demo_cluster in demo_clusters[:5]:
+        print(demo_cluster)
+    calls = sum(1 + len(c['outliers']) for c in demo_clusters)
+    print(f"{len(audit_reports)} reports -> {calls} LLM calls")
@@ -0,0 +1,204 @@
+# utils/result_exporter.py
+import bz2
+import gzip
+import lzma
+import os
+
+import pandas as pd
+
+from review_engine.violation_table import SEVERITY_LEVELS
+
+_TEXT_OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+_COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+VIOLATION_COLUMNS = ['报告ID', 'rule_name', 'severity', 'details']
+
+
+def detect_format(path):
+    """Infers (format, compression) from a file name such as results.csv.gz or results.xlsx."""
+    stem, ext = os.path.splitext(path.lower())
+    compression = _COMPRESSION_SUFFIXES.get(ext)
+    if compression:
+        ext = os.path.splitext(stem)[1]
+    fmt = {'.csv': 'csv', '.parquet': 'parquet', '.xlsx': 'xlsx'}.get(ext)
+    if fmt is None:
+        raise ValueError(f"Unsupported export format: {path}")
+    return fmt, compression
+
+
+class StreamingResultExporter:
+    def __init__(self, path, fmt=None, compression=None, id_column='报告ID'):
+        """Writes review results chunk by chunk to CSV, Parquet or XLSX without holding them all in memory.
+        Rule violations are flattened into summary columns on the main output and written in full
+        to a child table: a second sheet for XLSX, a '<name>_violations' file for CSV/Parquet.
+        Args:
+            path (str): Output file.
+            fmt (str, optional): 'csv', 'parquet' or 'xlsx'. Inferred from path if omitted.
+            compression (str, optional): 'gzip'/'bz2'/'xz' for CSV, 'snappy'/'zstd'/'gzip' for Parquet.
+                                         Inferred from a .gz/.bz2/.xz suffix if omitted.
+            id_column (str): Column identifying the report in each chunk.
+        """
+        detected_fmt, detected_compression = detect_format(path) if fmt is None else (fmt, None)
+        self.path = path
+        self.fmt = detected_fmt
+        self.compression = compression or detected_compression
+        self.id_column = id_column
+        self.rows_written = 0
+        self.violations_written = 0
+        self._main = None
+        self._child = None
+        self._workbook = None
+        self._schemas = {}
+
+        if self.fmt == 'xlsx':
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                raise ImportError("XLSX export requires openpyxl (pip install openpyxl).")
+            # write_only 模式逐行落盘，内存占用与总行数无关
+            self._workbook = Workbook(write_only=True)
+            self._main = self._workbook.create_sheet('review_results')
+            self._child = self._workbook.create_sheet('rule_violations')
+        elif self.fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("Parquet export requires pyarrow (pip install pyarrow).")
+
+    def _child_path(self):
+        base = self.path
+        suffix = ''
+        for ext in _COMPRESSION_SUFFIXES:
+            if base.lower().endswith(ext):
+                base, suffix = base[:-len(ext)], ext
+        stem, ext = os.path.splitext(base)
+        return f"{stem}_violations{ext}{suffix}"
+
+    def _open_text(self, path):
+        opener = _TEXT_OPENERS.get(self.compression)
+        if opener is not None:
+            return opener(path, 'wt', encoding='utf-8-sig', newline='')
+        return open(path, 'w', encoding='utf-8-sig', newline='')
+
+    def _flatten(self, results_df, violation_table):
+        """Splits a chunk into (main frame with violation summary columns, long violations frame)."""
+        main_df = results_df.drop(columns=['rule_violations'], errors='ignore').reset_index(drop=True)
+        report_ids = main_df[self.id_column].tolist() if self.id_column in main_df.columns \
+            else list(range(self.rows_written, self.rows_written + len(main_df)))
+
+        if violation_table is not None:
+            records = violation_table.to_records()
+            counts = violation_table.counts_per_row()
+            max_codes = violation_table.max_severity_per_row()
+        elif 'rule_violations' in results_df.columns:
+            records = [dict(violation, row_idx=pos)
+                       for pos, violations in enumerate(results_df['rule_violations'])
+                       for violation in (violations or [])]
+            counts = [len(violations or []) for violations in results_df['rule_violations']]
+            max_codes = [max((SEVERITY_LEVELS.index(v['severity']) for v in violations or []
+                              if v['severity'] in SEVERITY_LEVELS), default=-1)
+                         for violations in results_df['rule_violations']]
+        else:
+            return main_df, pd.DataFrame(columns=VIOLATION_COLUMNS)
+
+        names_per_row = [[] for _ in range(len(main_df))]
+        for record in records:
+            names_per_row[record['row_idx']].append(record['rule_name'])
+        main_df['violation_count'] = list(counts)
+        main_df['max_severity'] = [SEVERITY_LEVELS[code] if code >= 0 else '' for code in max_codes]
+        main_df['violated_rules'] = ['; '.join(names) for names in names_per_row]
+
+        violations_df = pd.DataFrame({
+            '报告ID': [report_ids[r['row_idx']] for r in records],
+            'rule_name': [r['rule_name'] for r in records],
+            'severity': [r['severity'] for r in records],
+            'details': [r['details'] for r in records],
+        }, columns=VIOLATION_COLUMNS)
+        return main_df, violations_df
+
+    def _write_parquet(self, key, path, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if key not in self._schemas:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            self._schemas[key] = table.schema
+            writer = pq.ParquetWriter(path, table.schema, compression=self.compression or 'snappy')
+            if key == 'main':
+                self._main = writer
+            else:
+                self._child = writer
+        else:
+            table = pa.Table.from_pandas(frame, schema=self._schemas[key], preserve_index=False)
+        (self._main if key == 'main' else self._child).write_table(table)
+
+    def write_chunk(self, results_df, violation_table=None):
+        """Appends one chunk of results.
+        Args:
+            results_df (pd.DataFrame): Results of the chunk, optionally with a 'rule_violations' list column.
+            violation_table (ViolationTable, optional): Violations of this chunk with row positions
+                                                        relative to results_df.
+        """
+        main_df, violations_df = self._flatten(results_df, violation_table)
+
+        if self.fmt == 'csv':
+            if self._main is None:
+                self._main = self._open_text(self.path)
+                self._child = self._open_text(self._child_path())
+                main_df.to_csv(self._main, index=False)
+                violations_df.to_csv(self._child, index=False)
+            else:
+                main_df.to_csv(self._main, index=False, header=False)
+                violations_df.to_csv(self._child, index=False, header=False)
+        elif self.fmt == 'parquet':
+            self._write_parquet('main', self.path, main_df)
+            self._write_parquet('child', self._child_path(), violations_df)
+        else:
+            if self.rows_written == 0:
+                self._main.append(list(main_df.columns))
+                self._child.append(VIOLATION_COLUMNS)
+            for row in main_df.itertuples(index=False):
+                self._main.append([None if pd.isna(v) else v for v in row])
+            for row in violations_df.itertuples(index=False):
+                self._child.append(list(row))
+
+        self.rows_written += len(main_df)
+        self.violations_written += len(violations_df)
+
+    def close(self):
+        """Finalizes the output files."""
+        if self.fmt == 'xlsx':
+            self._workbook.save(self.path)
+        else:
+            for handle in (self._main, self._child):
+                if handle is not None:
+                    handle.close()
+        print(f"Exported {self.rows_written} results and {self.violations_written} violations to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def export_in_chunks(path, results_df, violation_table=None, chunk_size=50000, **kwargs):
+    """Exports an in-memory result set through StreamingResultExporter, chunk_size rows at a time."""
+    with StreamingResultExporter(path, **kwargs) as exporter:
+        for start in range(0, max(len(results_df), 1), chunk_size):
+            stop = min(start + chunk_size, len(results_df))
+            chunk_table = violation_table.slice_rows(start, stop) if violation_table is not None else None
+            exporter.write_chunk(results_df.iloc[start:stop], chunk_table)
+    return exporter
+
+
+if __name__ == '__main__':
+    demo_results = pd.DataFrame({
+        '报告ID': ['AR202501', 'AR202502'],
+        '是否合规': ['是', '否'],
+        'rule_violations': [[], [{'rule_name': 'Revenue Data Consistency Check (within 1%)', 'severity': 'High',
+                                  'description': '收入差异检查', 'details': 'Failed on report AR202502'}]],
+    })
+    with StreamingResultExporter('demo_results.csv.gz') as demo_exporter:
+        demo_exporter.write_chunk(demo_results.iloc[:1])
+        demo_exporter.write_chunk(demo_results.iloc[1:])
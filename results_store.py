@@ -0,0 +1,216 @@
+# database/results_store.py
+import sqlite3
+import time
+import uuid
+
+import pandas as pd
+
+from review_engine.violation_table import SEVERITY_CODES, SEVERITY_LEVELS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    review_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    source TEXT,
+    n_reports INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS reports (
+    review_id TEXT NOT NULL,
+    report_id TEXT NOT NULL,
+    entity TEXT,
+    period TEXT,
+    route TEXT,
+    route_reason TEXT,
+    compliant INTEGER,
+    max_severity INTEGER,
+    PRIMARY KEY (review_id, report_id)
+);
+CREATE TABLE IF NOT EXISTS rule_violations (
+    review_id TEXT NOT NULL,
+    report_id TEXT NOT NULL,
+    rule_name TEXT NOT NULL,
+    severity INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    details TEXT
+);
+CREATE TABLE IF NOT EXISTS llm_assessments (
+    review_id TEXT NOT NULL,
+    report_id TEXT NOT NULL,
+    assessment TEXT,
+    analysis_details TEXT,
+    identified_risks TEXT,
+    suggested_actions TEXT,
+    prompt_tokens INTEGER,
+    PRIMARY KEY (review_id, report_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reports_report ON reports (report_id);
+CREATE INDEX IF NOT EXISTS idx_reports_period ON reports (period, entity);
+CREATE INDEX IF NOT EXISTS idx_reports_severity ON reports (max_severity);
+CREATE INDEX IF NOT EXISTS idx_violations_review_report ON rule_violations (review_id, report_id);
+CREATE INDEX IF NOT EXISTS idx_violations_report ON rule_violations (report_id);
+CREATE INDEX IF NOT EXISTS idx_violations_rule ON rule_violations (rule_name, severity);
+CREATE INDEX IF NOT EXISTS idx_violations_severity ON rule_violations (severity);
+CREATE INDEX IF NOT EXISTS idx_llm_report ON llm_assessments (report_id);
+"""
+
+
+class ResultsStore:
+    def __init__(self, db_path='audit_reports.db'):
+        """Persistent, indexed store of review results (SQLite in WAL mode).
+        Args:
+            db_path (str): SQLite database file.
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def start_review(self, source=None):
+        """Registers a new review run and returns its review_id."""
+        review_id = time.strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        with self.conn:
+            self.conn.execute("INSERT INTO reviews (review_id, created_at, source) VALUES (?, ?, ?)",
+                              (review_id, time.time(), source))
+        return review_id
+
+    def insert_batch(self, review_id, reports, violation_table=None, llm_results=None):
+        """Bulk-inserts one batch of results in a single transaction.
+        Args:
+            review_id (str): Review run the batch belongs to.
+            reports (pd.DataFrame): One row per report with 'report_id' and optionally 'entity',
+                                    'period', 'route', 'route_reason' and 'compliant'. Row order
+                                    must match violation_table row positions.
+            violation_table (ViolationTable, optional): Rule violations of the batch.
+            llm_results (dict, optional): report_id -> LLMModule.analyze_report result.
+        """
+        report_ids = reports['report_id'].astype(str).tolist()
+        max_severity = [-1] * len(report_ids)
+        violation_rows = []
+        if violation_table is not None and len(violation_table):
+            max_severity = violation_table.max_severity_per_row().tolist()
+            for record, severity, status in zip(violation_table.to_records(), violation_table.severity.tolist(),
+                                                violation_table.status.tolist()):
+                violation_rows.append((review_id, report_ids[record['row_idx']], record['rule_name'],
+                                       severity, status, record['details']))
+
+        def column(name):
+            if name in reports.columns:
+                return [None if pd.isna(v) else v for v in reports[name].tolist()]
+            return [None] * len(report_ids)
+
+        report_rows = list(zip(
+            [review_id] * len(report_ids), report_ids,
+            column('entity'), column('period'), column('route'), column('route_reason'),
+            [None if v is None else int(bool(v)) for v in column('compliant')],
+            max_severity,
+        ))
+        llm_rows = [
+            (review_id, str(report_id), result.get('assessment'), result.get('analysis_details'),
+             '; '.join(result.get('identified_risks', [])), '; '.join(result.get('suggested_actions', [])),
+             result.get('prompt_tokens'))
+            for report_id, result in (llm_results or {}).items()
+        ]
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, ?)", report_rows)
+            self.conn.executemany(
+                "INSERT INTO rule_violations VALUES (?, ?, ?, ?, ?, ?)", violation_rows)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO llm_assessments VALUES (?, ?, ?, ?, ?, ?, ?)", llm_rows)
+            self.conn.execute("UPDATE reviews SET n_reports = n_reports + ? WHERE review_id = ?",
+                              (len(report_rows), review_id))
+        print(f"Stored {len(report_rows)} reports, {len(violation_rows)} violations, "
+              f"{len(llm_rows)} LLM assessments in review {review_id}")
+
+    @staticmethod
+    def _where(filters):
+        clauses = [clause for clause, value in filters if value is not None]
+        params = [value for _, value in filters if value is not None]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_violations(self, review_id=None, report_id=None, rule_name=None, min_severity=None,
+                         period=None, entity=None, limit=None):
+        """Returns rule violations matching all given filters, newest review first.
+        Args:
+            min_severity (str, optional): e.g. 'High' returns High and Critical violations.
+            period (str, optional): Reporting period as stored in the reports table.
+        """
+        where, params = self._where([
+            ("v.review_id = ?", review_id),
+            ("v.report_id = ?", report_id),
+            ("v.rule_name = ?", rule_name),
+            ("v.severity >= ?", SEVERITY_CODES[min_severity] if min_severity else None),
+            ("r.period = ?", period),
+            ("r.entity = ?", entity),
+        ])
+        sql = ("SELECT v.review_id, v.report_id, r.entity, r.period, v.rule_name, v.severity, v.details "
+               "FROM rule_violations v JOIN reports r ON r.review_id = v.review_id AND r.report_id = v.report_id"
+               + where + " ORDER BY v.review_id DESC, v.report_id")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        result = pd.read_sql_query(sql, self.conn, params=params)
+        result['severity'] = result['severity'].map(lambda code: SEVERITY_LEVELS[code])
+        return result
+
+    def query_reports(self, review_id=None, report_id=None, period=None, entity=None, route=None,
+                      min_severity=None, limit=None):
+        """Returns report-level results joined with their LLM assessment, if any."""
+        where, params = self._where([
+            ("r.review_id = ?", review_id),
+            ("r.report_id = ?", report_id),
+            ("r.period = ?", period),
+            ("r.entity = ?", entity),
+            ("r.route = ?", route),
+            ("r.max_severity >= ?", SEVERITY_CODES[min_severity] if min_severity else None),
+        ])
+        sql = ("SELECT r.*, l.assessment, l.analysis_details, l.prompt_tokens FROM reports r "
+               "LEFT JOIN llm_assessments l ON l.review_id = r.review_id AND l.report_id = r.report_id"
+               + where + " ORDER BY r.review_id DESC, r.report_id")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def list_reviews(self):
+        return pd.read_sql_query("SELECT * FROM reviews ORDER BY created_at DESC", self.conn)
+
+    def latest_review_id(self):
+        row = self.conn.execute("SELECT review_id FROM reviews ORDER BY created_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查询复核结果数据库")
+    parser.add_argument('db_path', nargs='?', default='audit_reports.db')
+    parser.add_argument('--review-id')
+    parser.add_argument('--report-id')
+    parser.add_argument('--rule')
+    parser.add_argument('--min-severity', choices=SEVERITY_LEVELS)
+    parser.add_argument('--period')
+    parser.add_argument('--entity')
+    parser.add_argument('--reports', action='store_true', help="查询报告级结果而非规则违规明细")
+    parser.add_argument('--list-reviews', action='store_true')
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db_path)
+    start = time.perf_counter()
+    if args.list_reviews:
+        output = store.list_reviews()
+    elif args.reports:
+        output = store.query_reports(review_id=args.review_id, report_id=args.report_id, period=args.period,
+                                     entity=args.entity, min_severity=args.min_severity, limit=args.limit)
+    else:
+        output = store.query_violations(review_id=args.review_id, report_id=args.report_id, rule_name=args.rule,
+                                        min_severity=args.min_severity, period=args.period,
+                                        entity=args.entity, limit=args.limit)
+    print(output.to_string(index=False))
+    print(f"\n{len(output)} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+    store.close()
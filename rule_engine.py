@@ -1,10 +1,45 @@
 # review_engine/rule_engine.py
+import time
+
 import pandas as pd
 
+from review_engine.rule_profiler import RuleProfiler
+from review_engine.violation_table import ViolationTableBuilder, STATUS_FAILED, STATUS_ERROR
+from review_engine.duplicate_index import (
+    find_exact_duplicate_groups, find_near_duplicate_groups, groups_to_details, MinHashLSH
+)
+from review_engine.statistical_rules import benford_first_digit, amount_outliers, round_amount_clustering
+from review_engine.claim_rules import numeric_claim_mismatches
+from review_engine.history_rules import yoy_growth_check, opinion_change_check, kam_continuity_check
+
+# fail_fast 模式下，出现这些严重程度的违规即可判定结果，跳过该报告的其余规则
+DECISIVE_SEVERITIES = ('Critical', 'High')
+
 class RuleEngine:
-    def __init__(self):
+    def __init__(self, ordering='insertion', fail_fast=False, profiler=None, verbose=False):
+        """Initializes the rule engine.
+        Args:
+            ordering (str): 'insertion' runs rules in the order they were added; 'adaptive' runs
+                            cheap, high-selectivity rules first based on collected statistics.
+            fail_fast (bool): Stop evaluating a report once a Critical/High violation is found.
+            profiler (RuleProfiler, optional): Collects per-rule timing and failure rates during
+                                               batch runs. Defaults to an in-memory profiler.
+            verbose (bool): Print a line for every rule added.
+        """
+        if ordering not in ('insertion', 'adaptive'):
+            raise ValueError("ordering must be 'insertion' or 'adaptive'.")
+        self.ordering = ordering
+        self.fail_fast = fail_fast
+        self.profiler = profiler or RuleProfiler()
+        self.verbose = verbose
         self.rules = []
+        # 跨期间规则使用的历史报告库，见 attach_history_store
+        self.history_store = None
+        # 跨记录规则：一次作用于整批数据，例如重复发票、雷同结论
+        self.batch_rules = []
         self._load_default_rules()
+        self._load_default_batch_rules()
+        print(f"RuleEngine loaded {len(self.rules)} rules and {len(self.batch_rules)} batch rules.")
 
     def _load_default_rules(self):
         """Loads a predefined set of rules for audit report review."""
@@ -37,8 +72,63 @@ class RuleEngine:
         )
         # Add more rules here based on user's requirements
 
+    def _load_default_batch_rules(self):
+        """Loads cross-record rules that compare reports with each other."""
+        self.add_batch_rule(
+            name="Duplicate Invoice Check",
+            detector=lambda df: groups_to_details(
+                find_exact_duplicate_groups(df, ['invoice_code', 'invoice_number']),
+                self._batch_report_ids(df), '同一发票被多次使用'),
+            description="检查同一发票（发票代码+发票号码）是否在多份报销/报告中重复使用。",
+            severity="High"
+        )
+        self.add_batch_rule(
+            name="Near-Duplicate Conclusion Check",
+            detector=lambda df: groups_to_details(
+                find_near_duplicate_groups(df, '关键结论描述', MinHashLSH(threshold=0.9)),
+                self._batch_report_ids(df), '关键结论描述与其他报告雷同'),
+            description="检查不同报告的关键结论描述是否存在复制粘贴的雷同文本。",
+            severity="Medium"
+        )
+
+        # 批量统计异常规则（整批向量化计算）
+        self.add_batch_rule(
+            name="Benford First-Digit Test",
+            detector=benford_first_digit,
+            description="按单位检验金额首位数字分布是否符合Benford定律，标记偏离单位中过度集中的首位数字。",
+            severity="Medium"
+        )
+        self.add_batch_rule(
+            name="Amount Outlier Check (z-score/IQR)",
+            detector=amount_outliers,
+            description="检查金额在同一供应商、同一期间内是否为z-score与IQR双重离群值。",
+            severity="Medium"
+        )
+        self.add_batch_rule(
+            name="Round Amount Clustering Check",
+            detector=round_amount_clustering,
+            description="检查单位整千元金额占比是否异常偏高，提示可能的人为凑整。",
+            severity="Low"
+        )
+
+        # 叙述与账面核对：整列抽取结论中的指标、方向与数值，与账面列一次性比对
+        self.add_batch_rule(
+            name="Narrative Numeric Claim Check",
+            detector=numeric_claim_mismatches,
+            description="检查关键结论描述等叙述中的增减幅度与金额（如“应收账款余额较上年增长30%”）是否与账面数据一致。",
+            severity="High"
+        )
+
     # Helper functions for rules can be added here if needed, similar to _is_valid_date_sequence
 
+    @staticmethod
+    def _batch_report_ids(vouchers_df):
+        """Report IDs of a batch, falling back to 报告编号 or the row position."""
+        for column in ('report_id', '报告编号'):
+            if column in vouchers_df.columns:
+                return vouchers_df[column].tolist()
+        return [f"Row_{pos + 1}" for pos in range(len(vouchers_df))]
+
     def add_rule(self, name, condition, description, severity):
         """Adds a new rule to the engine.
         Args:
@@ -54,7 +144,67 @@ class RuleEngine:
             'description': description,
             'severity': severity
         })
-        print(f"Rule '{name}' added.")
+        if self.verbose:
+            print(f"Rule '{name}' added.")
+
+    def add_batch_rule(self, name, detector, description, severity):
+        """Adds a batch-level rule evaluated once over a whole DataFrame.
+        Args:
+            name (str): Name of the rule.
+            detector (callable): A function that takes the batch DataFrame and returns a dict
+                                 {row position: details text} for every violating row.
+            description (str): Description of what the rule checks.
+            severity (str): Severity of the rule if violated (e.g., High, Medium, Low).
+        """
+        self.batch_rules.append({
+            'name': name,
+            'detector': detector,
+            'description': description,
+            'severity': severity
+        })
+        if self.verbose:
+            print(f"Batch rule '{name}' added.")
+
+    def attach_history_store(self, history_store, yoy_threshold=0.5):
+        """Enables the cross-period batch rules, which look up each report's prior-period report
+        in history_store (a HistoryStore) with one batched join per rule.
+        Args:
+            history_store (HistoryStore): Past reports indexed by (被审计单位, period).
+            yoy_threshold (float): Relative year-over-year change above which a metric is flagged.
+        """
+        first_attach = self.history_store is None
+        self.history_store = history_store
+        if not first_attach:
+            return  # 规则通过 self.history_store 取库，替换后立即生效
+        self.add_batch_rule(
+            name="Year-over-Year Change Check",
+            detector=lambda df: yoy_growth_check(df, self.history_store, threshold=yoy_threshold),
+            description=f"检查营业收入、净利润等指标较上期报告的变动是否超过±{yoy_threshold:.0%}。",
+            severity="Medium"
+        )
+        self.add_batch_rule(
+            name="Audit Opinion Change Check",
+            detector=lambda df: opinion_change_check(df, self.history_store),
+            description="检查审计意见是否由上期的无保留意见变为保留意见、否定意见或无法表示意见。",
+            severity="High"
+        )
+        self.add_batch_rule(
+            name="Key Audit Matter Continuity Check",
+            detector=lambda df: kam_continuity_check(df, self.history_store),
+            description="检查上期关键审计事项在本期是否仍有列示或说明。",
+            severity="Low"
+        )
+
+    def _ordered_rules(self):
+        """Returns (rule_id, rule) pairs in the configured evaluation order."""
+        rules = list(enumerate(self.rules))
+        if self.ordering == 'adaptive':
+            return self.profiler.order(rules)
+        return rules
+
+    def profile_report(self):
+        """Returns the time spent per rule across profiled batch runs."""
+        return self.profiler.report()
 
     def apply_rules(self, voucher_data):
         """Applies all loaded rules to a single voucher.
@@ -67,7 +217,7 @@ class RuleEngine:
         """
         violations = []
         print(f"\nApplying rules to report: {voucher_data.get('report_id', 'N/A')}")
-        for rule in self.rules:
+        for _, rule in self._ordered_rules():
             try:
                 if not rule['condition'](voucher_data):
                     violations.append({
@@ -85,31 +235,108 @@ class RuleEngine:
                     'severity': 'Critical',
                     'details': f"Error on report {voucher_data.get('report_id', 'N/A')}"
                 })
+            if self.fail_fast and violations and violations[-1]['severity'] in DECISIVE_SEVERITIES:
+                break
         return violations
 
-    def apply_rules_to_batch(self, vouchers_df):
-        """Applies rules to a DataFrame of vouchers.
+    def apply_batch_rules(self, vouchers_df):
+        """Runs the cross-record rules once over the whole batch.
         Args:
             vouchers_df (pd.DataFrame): DataFrame where each row is a voucher.
         Returns:
-            pd.DataFrame: DataFrame with an additional 'rule_violations' column containing
-                          a list of violation dicts for each voucher.
+            list of tuple: (row position, batch rule name, status, error message, details) per finding.
+        """
+        findings = []
+        n_rows = len(vouchers_df)
+        for batch_rule in self.batch_rules:
+            start = time.perf_counter()
+            try:
+                flagged = batch_rule['detector'](vouchers_df)
+                findings.extend((row_idx, batch_rule['name'], STATUS_FAILED, None, details)
+                                for row_idx, details in sorted(flagged.items()))
+                self.profiler.record(batch_rule['name'], time.perf_counter() - start, n_rows, len(flagged))
+            except Exception as e:
+                print(f"Error applying batch rule '{batch_rule['name']}': {e}")
+                # 批量规则对整批都未能执行，逐行记为执行出错，与单行规则一致
+                findings.extend((row_idx, batch_rule['name'], STATUS_ERROR, str(e), None) for row_idx in range(n_rows))
+                self.profiler.record(batch_rule['name'], time.perf_counter() - start, n_rows, n_rows)
+        return findings
+
+    def apply_rules_compact(self, vouchers_df, batch_findings=None):
+        """Applies all loaded rules to a DataFrame of vouchers, keeping violations in columnar form.
+        Args:
+            vouchers_df (pd.DataFrame): DataFrame where each row is a voucher.
+            batch_findings (list, optional): Batch rule findings computed elsewhere (apply_batch_rules on
+                                             the full batch, with positions relative to vouchers_df).
+                                             When given, the batch rules are not run on vouchers_df itself.
+        Returns:
+            ViolationTable: One (row_idx, rule_id, status) entry per violation, with rule
+                            metadata stored once. Use to_lists()/to_records() to expand.
         """
         if not isinstance(vouchers_df, pd.DataFrame):
             raise TypeError("Input must be a pandas DataFrame.")
 
         print(f"\nApplying rules to batch of {len(vouchers_df)} vouchers...")
-        results = []
-        for index, row in vouchers_df.iterrows():
-            voucher_dict = row.to_dict()
-            violations = self.apply_rules(voucher_dict)
-            results.append(violations)
+        builder = ViolationTableBuilder()
+        records = vouchers_df.to_dict(orient='records')
+        ordered_rules = self._ordered_rules()
+        # 逐规则累计耗时与失败次数，批次结束后一次性写入 profiler
+        elapsed = [0.0] * len(self.rules)
+        evaluations = [0] * len(self.rules)
+        failures = [0] * len(self.rules)
+        clock = time.perf_counter
+        for row_idx, voucher_dict in enumerate(records):
+            for rule_id, rule in ordered_rules:
+                decisive = False
+                start = clock()
+                try:
+                    if not rule['condition'](voucher_dict):
+                        builder.add(row_idx, rule_id)
+                        failures[rule_id] += 1
+                        decisive = rule['severity'] in DECISIVE_SEVERITIES
+                except Exception as e:
+                    print(f"Error applying rule '{rule['name']}' to report {voucher_dict.get('report_id', 'N/A')}: {e}")
+                    builder.add(row_idx, rule_id, STATUS_ERROR, str(e))
+                    failures[rule_id] += 1
+                    decisive = True
+                elapsed[rule_id] += clock() - start
+                evaluations[rule_id] += 1
+                if self.fail_fast and decisive:
+                    break
+        for rule_id, rule in enumerate(self.rules):
+            if evaluations[rule_id]:
+                self.profiler.record(rule['name'], elapsed[rule_id], evaluations[rule_id], failures[rule_id])
+
+        # 跨记录规则：整批只执行一次，结果并入同一张违规表（按规则名对应，调用方的规则顺序可以不同）
+        if batch_findings is None:
+            batch_findings = self.apply_batch_rules(vouchers_df)
+        batch_rule_ids = {rule['name']: rule_id for rule_id, rule in enumerate(self.batch_rules, start=len(self.rules))}
+        for row_idx, rule_name, status, error_message, details in batch_findings:
+            if rule_name not in batch_rule_ids:
+                print(f"Ignoring finding of unknown batch rule '{rule_name}'")
+                continue
+            builder.add(row_idx, batch_rule_ids[rule_name], status, error_message, details)
+        self.profiler.save()
+
+        report_ids = [voucher_dict.get('report_id', 'N/A') for voucher_dict in records]
+        violation_table = builder.build(self.rules + self.batch_rules, len(records), report_ids)
+        print(f"Batch rule application complete: {len(violation_table)} violations {violation_table.count_by_severity()}")
+        return violation_table
+
+    def apply_rules_to_batch(self, vouchers_df):
+        """Applies rules to a DataFrame of vouchers.
+        Args:
+            vouchers_df (pd.DataFrame): DataFrame where each row is a voucher.
+        Returns:
+            pd.DataFrame: DataFrame with an additional 'rule_violations' column containing
+                          a list of violation dicts for each voucher.
+        """
+        violation_table = self.apply_rules_compact(vouchers_df)
         
         # It's often better to return a new DataFrame or add as a new column
         # For simplicity, we can add it as a new column to the input DataFrame
         vouchers_df_copy = vouchers_df.copy()
-        vouchers_df_copy['rule_violations'] = results
-        print("Batch rule application complete.")
+        vouchers_df_copy['rule_violations'] = violation_table.to_lists()
         return vouchers_df_copy
 
 if __name__ == '__main__':
@@ -204,4 +431,14 @@ if __name__ == '__main__':
     reports_df = pd.DataFrame(reports_list)
     reviewed_reports_df = engine.apply_rules_to_batch(reports_df)
     print("\n--- Batch Review Results (DataFrame) ---")
-    print(reviewed_reports_df[['report_id', 'rule_violations']])
\ No newline at end of file
+    print(reviewed_reports_df[['report_id', 'rule_violations']])
+
+    print("\n--- Compact Violation Table ---")
+    violation_table = engine.apply_rules_compact(reports_df)
+    print(violation_table.count_by_rule())
+    print(violation_table.filter(min_severity='High').to_records())
+
+    print("\n--- Adaptive Ordering with Fail-Fast ---")
+    adaptive_engine = RuleEngine(ordering='adaptive', fail_fast=True, profiler=engine.profiler)
+    adaptive_engine.apply_rules_compact(reports_df)
+    print(adaptive_engine.profile_report())
\ No newline at end of file
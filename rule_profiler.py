@@ -0,0 +1,94 @@
+# review_engine/rule_profiler.py
+import json
+import os
+
+import pandas as pd
+
+
+class RuleProfiler:
+    def __init__(self, profile_path=None):
+        """Collects per-rule timing and failure-rate statistics across batch runs.
+        Args:
+            profile_path (str, optional): JSON file the statistics are loaded from and saved to,
+                                          so they carry over between sessions. None keeps them in memory.
+        """
+        self.profile_path = profile_path
+        self.stats = {}
+        if profile_path and os.path.exists(profile_path):
+            self.load()
+
+    def record(self, rule_name, elapsed, evaluations=1, failures=0):
+        """Adds the outcome of evaluating a rule (possibly over many reports at once)."""
+        entry = self.stats.setdefault(rule_name, {'evaluations': 0, 'failures': 0, 'total_time': 0.0})
+        entry['evaluations'] += evaluations
+        entry['failures'] += failures
+        entry['total_time'] += elapsed
+
+    def mean_time(self, rule_name):
+        entry = self.stats.get(rule_name)
+        if not entry or not entry['evaluations']:
+            return None
+        return entry['total_time'] / entry['evaluations']
+
+    def failure_rate(self, rule_name):
+        entry = self.stats.get(rule_name)
+        if not entry or not entry['evaluations']:
+            return None
+        return entry['failures'] / entry['evaluations']
+
+    def order(self, rules):
+        """Orders rules so that cheap, high-selectivity rules run first.
+        Rules are ranked by mean cost divided by failure rate, the expected cost of finding one
+        violation. Rules without statistics yet keep their insertion order at the front so they
+        get profiled.
+        Args:
+            rules (list of tuple): (rule_id, rule dict) pairs in insertion order.
+        Returns:
+            list of tuple: The same pairs, reordered.
+        """
+        def rank(item):
+            position, (_, rule) = item
+            mean_time = self.mean_time(rule['name'])
+            if mean_time is None:
+                return (0, 0.0, position)
+            failure_rate = self.failure_rate(rule['name'])
+            return (1, mean_time / max(failure_rate, 1e-6), position)
+
+        return [pair for _, pair in sorted(enumerate(rules), key=rank)]
+
+    def report(self):
+        """Returns per-rule time spent, mean cost and failure rate, most expensive first."""
+        rows = []
+        grand_total = sum(entry['total_time'] for entry in self.stats.values()) or 1.0
+        for name, entry in self.stats.items():
+            evaluations = max(entry['evaluations'], 1)
+            rows.append({
+                'rule_name': name,
+                'evaluations': entry['evaluations'],
+                'total_time_s': round(entry['total_time'], 6),
+                'mean_time_us': round(entry['total_time'] / evaluations * 1e6, 3),
+                'failure_rate': round(entry['failures'] / evaluations, 4),
+                'time_share': round(entry['total_time'] / grand_total, 4),
+            })
+        if not rows:
+            return pd.DataFrame(columns=['rule_name', 'evaluations', 'total_time_s', 'mean_time_us',
+                                         'failure_rate', 'time_share'])
+        return pd.DataFrame(rows).sort_values('total_time_s', ascending=False).reset_index(drop=True)
+
+    def load(self):
+        try:
+            with open(self.profile_path, 'r', encoding='utf-8') as f:
+                self.stats = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable rule profile {self.profile_path}: {e}")
+            self.stats = {}
+
+    def save(self):
+        if not self.profile_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.profile_path)), exist_ok=True)
+            with open(self.profile_path, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"Could not save rule profile to {self.profile_path}: {e}")
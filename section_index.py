@@ -0,0 +1,155 @@
+# data_processing/section_index.py
+import bisect
+import json
+import os
+import re
+
+# 审计报告常见章节标题（按出现的典型顺序）
+SECTION_HEADINGS = [
+    '审计意见',
+    '形成审计意见的基础',
+    '与持续经营相关的重大不确定性',
+    '强调事项',
+    '关键审计事项',
+    '其他信息',
+    '管理层和治理层对财务报表的责任',
+    '管理层责任',
+    '注册会计师对财务报表审计的责任',
+    '按照要求报告的事项',
+]
+
+# 同一章节的不同写法，查询时统一到规范名称
+SECTION_ALIASES = {
+    '管理层和治理层对财务报表的责任': '管理层责任',
+    '管理层对财务报表的责任': '管理层责任',
+    '注册会计师的责任': '注册会计师对财务报表审计的责任',
+}
+
+_HEADING_PATTERN = re.compile(
+    r'^\s*(?:[一二三四五六七八九十]+[、.．]|\(?[一二三四五六七八九十\d]+\)|\d+[、.．])?\s*(' +
+    '|'.join(re.escape(h) for h in sorted(set(SECTION_HEADINGS) | set(SECTION_ALIASES), key=len, reverse=True)) +
+    r')\s*[:：]?\s*$',
+    re.MULTILINE)
+
+
+class SectionIndex:
+    def __init__(self, doc_hash, sections, text_length, page_offsets=None):
+        """Character and page offsets of the sections of one extracted document.
+        Args:
+            doc_hash (str): Content hash of the document text.
+            sections (list of dict): One entry per heading in document order, each with
+                                     'name', 'heading', 'start', 'end', 'page_start', 'page_end'.
+            text_length (int): Length of the indexed text.
+            page_offsets (list of int, optional): Character offset at which each page starts. None
+                                                  when the text was indexed without page information.
+        """
+        self.doc_hash = doc_hash
+        self.sections = sections
+        self.text_length = text_length
+        self.page_offsets = page_offsets
+        # 同名章节只保留第一次出现的位置
+        self._by_name = {}
+        for section in sections:
+            self._by_name.setdefault(section['name'], section)
+
+    def get(self, name):
+        """Returns the index entry of a section by canonical name or alias, or None."""
+        return self._by_name.get(SECTION_ALIASES.get(name, name))
+
+    def section_text(self, text, name):
+        """Slices a section's body out of the indexed text without rescanning it."""
+        section = self.get(name)
+        if section is None:
+            return ''
+        return text[section['start']:section['end']]
+
+    def names(self):
+        return list(self._by_name)
+
+    def page_of(self, offset):
+        """1-based page containing a character offset, or None without page information."""
+        if not self.page_offsets:
+            return None
+        return _page_of(self.page_offsets, offset)
+
+    def to_dict(self):
+        return {'doc_hash': self.doc_hash, 'text_length': self.text_length, 'sections': self.sections,
+                'page_offsets': self.page_offsets}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['doc_hash'], data['sections'], data['text_length'], data.get('page_offsets'))
+
+    def save(self, index_dir):
+        """Writes the index to <index_dir>/<doc_hash>.json."""
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, f"{self.doc_hash}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        return path
+
+    @classmethod
+    def load(cls, index_dir, doc_hash):
+        """Loads a saved index, or returns None if it does not exist."""
+        path = os.path.join(index_dir, f"{doc_hash}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def _page_of(page_offsets, offset):
+    return max(bisect.bisect_right(page_offsets, offset) - 1, 0) + 1
+
+
+def build_section_index(text, doc_hash, page_offsets=None):
+    """Finds audit report headings in text and records their character and page offsets.
+    Args:
+        text (str): Extracted document text.
+        doc_hash (str): Content hash of text.
+        page_offsets (list of int, optional): Character offset at which each page starts, one entry
+                                              per page; empty or failed pages repeat the next offset.
+    Returns:
+        SectionIndex: The index. Text before the first heading is recorded as '前言'.
+    """
+    offsets = page_offsets or [0]
+    matches = list(_HEADING_PATTERN.finditer(text))
+    spans = []
+    if not matches or matches[0].start() > 0:
+        spans.append(('前言', '', 0, matches[0].start() if matches else len(text)))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        heading = match.group(1)
+        spans.append((SECTION_ALIASES.get(heading, heading), heading, match.end(), end))
+
+    sections = [{
+        'name': name,
+        'heading': heading,
+        'start': start,
+        'end': end,
+        'page_start': _page_of(offsets, start),
+        'page_end': _page_of(offsets, max(end - 1, start)),
+    } for name, heading, start, end in spans]
+    return SectionIndex(doc_hash, sections, len(text), page_offsets or None)
+
+
+if __name__ == '__main__':
+    import hashlib
+
+    pages = [
+        "审计报告\n一、审计意见\n我们认为，财务报表在所有重大方面公允反映了公司的财务状况。\n",
+        "二、形成审计意见的基础\n我们按照中国注册会计师审计准则的规定执行了审计工作。\n三、关键审计事项\n收入确认。该事项为何对审计重要：收入是关键业绩指标。\n",
+        "四、管理层和治理层对财务报表的责任\n管理层负责编制财务报表。\n",
+    ]
+    offsets = []
+    position = 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page)
+    full_text = ''.join(pages)
+    index = build_section_index(full_text, hashlib.sha256(full_text.encode('utf-8')).hexdigest(), offsets)
+    for entry in index.sections:
+        print(entry)
+    print(index.section_text(full_text, '关键审计事项'))
+    print(index.get('管理层和治理层对财务报表的责任'))
+    print(index.page_of(full_text.index('收入确认')))
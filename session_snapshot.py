@@ -0,0 +1,197 @@
+# utils/session_snapshot.py
+import json
+import os
+import time
+
+import pandas as pd
+
+from data_processing.text_summarizer import document_hash
+
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Session snapshots require pyarrow (pip install pyarrow).")
+
+
+def _json_columns(frame):
+    """Object columns holding lists/dicts (e.g. rule_violations), which Parquet stores as JSON text."""
+    columns = []
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            sample = frame[column].dropna()
+            if len(sample) and isinstance(sample.iloc[0], (list, dict)):
+                columns.append(column)
+    return columns
+
+
+class SnapshotTexts:
+    def __init__(self, texts_dir, hashes):
+        """Read-only mapping of content hash -> extracted text, loaded from disk on first access."""
+        self.texts_dir = texts_dir
+        self._hashes = set(hashes)
+        self._cache = {}
+
+    def __contains__(self, content_hash):
+        return content_hash in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __iter__(self):
+        return iter(self._hashes)
+
+    def keys(self):
+        return set(self._hashes)
+
+    def get(self, content_hash, default=None):
+        if content_hash not in self._hashes:
+            return default
+        return self[content_hash]
+
+    def __getitem__(self, content_hash):
+        if content_hash not in self._cache:
+            with open(os.path.join(self.texts_dir, f"{content_hash}.txt"), 'r', encoding='utf-8') as f:
+                self._cache[content_hash] = f.read()
+        return self._cache[content_hash]
+
+
+class SessionSnapshot:
+    def __init__(self, snapshot_dir='cache/session_snapshot'):
+        """Saves and restores the working state of a review session.
+        Layout:
+            manifest.json          frame files, row counts, lists and text hashes
+            frames/<name>.parquet  one Parquet file per DataFrame
+            texts/<sha256>.txt     extracted document texts, content-addressed (written once)
+        Args:
+            snapshot_dir (str): Directory holding the snapshot.
+        """
+        self.snapshot_dir = snapshot_dir
+        self.frames_dir = os.path.join(snapshot_dir, 'frames')
+        self.texts_dir = os.path.join(snapshot_dir, 'texts')
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.snapshot_dir, MANIFEST_NAME)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def read_manifest(self):
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_frame(self, name, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        json_columns = _json_columns(frame)
+        frame = frame.copy()
+        for column in frame.columns:
+            if column in json_columns:
+                frame[column] = [None if v is None else json.dumps(v, ensure_ascii=False, default=str)
+                                 for v in frame[column]]
+            elif frame[column].dtype == object:
+                # 混合类型的 object 列统一转为字符串，避免 Arrow 类型推断失败
+                frame[column] = [None if v is None or (isinstance(v, float) and pd.isna(v))
+                                 else v if isinstance(v, str) else str(v) for v in frame[column]]
+
+        file_name = f"{name}.parquet"
+        tmp_path = os.path.join(self.frames_dir, file_name + '.tmp')
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp_path)
+        os.replace(tmp_path, os.path.join(self.frames_dir, file_name))
+        return {'file': file_name, 'rows': len(frame), 'json_columns': json_columns}
+
+    def _write_text(self, text):
+        content_hash = document_hash(text)
+        path = os.path.join(self.texts_dir, f"{content_hash}.txt")
+        if not os.path.exists(path):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        return content_hash
+
+    def save(self, frames=None, lists=None, texts=None):
+        """Writes a snapshot, replacing the previous manifest atomically.
+        Args:
+            frames (dict): name -> pd.DataFrame (None values are skipped).
+            lists (dict): name -> JSON-serializable list, e.g. image_attachment_paths.
+            texts (iterable of str): Extracted document texts; only texts not yet on disk are written.
+        Returns:
+            dict: The manifest.
+        """
+        _require_pyarrow()
+        start = time.perf_counter()
+        os.makedirs(self.frames_dir, exist_ok=True)
+        os.makedirs(self.texts_dir, exist_ok=True)
+
+        manifest = {'version': SNAPSHOT_VERSION, 'created_at': time.time(), 'frames': {}, 'lists': {}, 'texts': []}
+        for name, frame in (frames or {}).items():
+            if frame is not None:
+                manifest['frames'][name] = self._write_frame(name, frame)
+        for name, values in (lists or {}).items():
+            manifest['lists'][name] = list(values or [])
+        manifest['texts'] = sorted({self._write_text(text) for text in (texts or []) if text})
+
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        # 清理已不在清单中的旧数据表文件
+        referenced = {entry['file'] for entry in manifest['frames'].values()}
+        for file_name in os.listdir(self.frames_dir):
+            if file_name.endswith('.parquet') and file_name not in referenced:
+                os.remove(os.path.join(self.frames_dir, file_name))
+
+        rows = sum(entry['rows'] for entry in manifest['frames'].values())
+        print(f"Saved session snapshot ({rows} rows, {len(manifest['texts'])} texts) "
+              f"to {self.snapshot_dir} in {time.perf_counter() - start:.2f}s")
+        return manifest
+
+    def load(self, memory_map=True):
+        """Restores a snapshot.
+        Frames are read with pyarrow memory mapping; texts are loaded lazily on access.
+        Returns:
+            tuple: (frames dict, lists dict, SnapshotTexts)
+        """
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        start = time.perf_counter()
+        manifest = self.read_manifest()
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+
+        frames = {}
+        for name, entry in manifest['frames'].items():
+            table = pq.read_table(os.path.join(self.frames_dir, entry['file']), memory_map=memory_map)
+            frame = table.to_pandas()
+            for column in entry['json_columns']:
+                frame[column] = [None if v is None else json.loads(v) for v in frame[column]]
+            frames[name] = frame
+        texts = SnapshotTexts(self.texts_dir, manifest['texts'])
+        print(f"Loaded session snapshot from {self.snapshot_dir} in {time.perf_counter() - start:.2f}s")
+        return frames, manifest['lists'], texts
+
+
+if __name__ == '__main__':
+    snapshot = SessionSnapshot('demo_snapshot')
+    demo_text = "审计意见\n我们审计了某某公司财务报表……"
+    snapshot.save(
+        frames={
+            'loaded_data': pd.DataFrame({'报告编号': ['AR202501', 'AR202502'], '营业收入': [100.0, 250.5]}),
+            'review_results': pd.DataFrame({'报告ID': ['AR202501'], 'rule_violations': [[{'rule_name': 'Demo'}]]}),
+        },
+        lists={'image_attachment_paths': ['voucher_001.png']},
+        texts=[demo_text],
+    )
+    restored_frames, restored_lists, restored_texts = snapshot.load()
+    print(restored_frames['review_results'])
+    print(restored_lists, restored_texts[document_hash(demo_text)][:10])
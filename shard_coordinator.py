@@ -0,0 +1,397 @@
+# review_engine/shard_coordinator.py
+import json
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+import pandas as pd
+
+# 队列目录下的状态子目录；认领通过 os.rename 原子完成，可放在多台主机共享的网络盘上
+QUEUE_STATES = ('pending', 'running', 'done', 'failed')
+CLAIM_SEPARATOR = '~'
+REPORT_ID_COLUMNS = ['report_id', '报告ID', '报告编号']
+
+
+def shard_of(report_id, n_shards):
+    """Stable shard number of a report ID (unlike hash(), identical across processes and hosts)."""
+    return zlib.crc32(str(report_id).encode('utf-8')) % n_shards
+
+
+def _write_pickle(path, payload):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _read_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class ShardQueue:
+    def __init__(self, queue_dir):
+        """File-based work queue: pending/ -> running/ -> done/ or failed/.
+        Args:
+            queue_dir (str): Directory shared by the coordinator and all workers.
+        """
+        self.queue_dir = queue_dir
+        for state in QUEUE_STATES + ('jobs',):
+            os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+    def path(self, state, name):
+        return os.path.join(self.queue_dir, state, name)
+
+    def names(self, state, job_id=None):
+        names = [name for name in os.listdir(os.path.join(self.queue_dir, state)) if name.endswith('.pkl')]
+        if job_id is not None:
+            names = [name for name in names if name.startswith(job_id + '-')]
+        return sorted(names)
+
+    def put(self, name, payload):
+        _write_pickle(self.path('pending', name), payload)
+
+    def claim(self):
+        """Atomically moves one pending shard to running/ under a claim-specific name.
+        Returns:
+            tuple: (shard name, running file name), or None if nothing is pending.
+        """
+        for name in self.names('pending'):
+            # 每次认领使用唯一文件名，租约过期后被重新认领时，原 worker 不会误删新的认领
+            running_name = f"{name[:-len('.pkl')]}{CLAIM_SEPARATOR}{uuid.uuid4().hex[:8]}.pkl"
+            try:
+                os.rename(self.path('pending', name), self.path('running', running_name))
+                return name, running_name
+            except FileNotFoundError:
+                continue  # 已被其他 worker 认领
+        return None
+
+    @staticmethod
+    def shard_name(running_name):
+        return running_name.split(CLAIM_SEPARATOR)[0] + '.pkl'
+
+
+class ShardWorker:
+    def __init__(self, queue_dir, worker_id=None, heartbeat_interval=10.0):
+        """Processes shards from a ShardQueue: DataLoader -> RuleEngine -> triage -> LLMModule.
+        Workers apply only the row rules; cross-record batch rules (duplicates, Benford, outliers, ...)
+        need the whole batch and arrive precomputed by the coordinator in the shard payload.
+        Args:
+            queue_dir (str): Shared queue directory.
+            worker_id (str, optional): Name used in logs. Defaults to host:pid.
+            heartbeat_interval (float): Seconds between lease renewals while a shard is running.
+        """
+        self.queue = ShardQueue(queue_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self._engines = None
+
+    def _get_engines(self):
+        if self._engines is None:
+            from data_processing.data_loader import DataLoader
+            from review_engine.rule_engine import RuleEngine
+            from review_engine.triage import ReviewTriage
+            from review_engine.llm_module import LLMModule
+            from data_processing.text_summarizer import EvidenceSummarizer
+            # 报告全文以证据摘要的形式送入LLM
+            self._engines = (DataLoader(), RuleEngine(), ReviewTriage(),
+                             LLMModule(evidence_summarizer=EvidenceSummarizer()))
+        return self._engines
+
+    def process_shard(self, payload):
+        """Reviews the reports of one shard.
+        Returns:
+            dict: {'results': DataFrame with one row per report, 'violations': DataFrame, one row per violation}
+        """
+        from review_engine.triage import ROUTE_NEEDS_LLM
+
+        data_loader, rule_engine, review_triage, llm_module = self._get_engines()
+        records_df = payload['records'].reset_index(drop=True)
+        id_column = payload['id_column']
+        # 报告PDF按路径传递，由 worker 自行提取全文（路径需在 worker 所在主机可访问）
+        documents = payload.get('documents') or {}
+        if documents:
+            records_df['审计报告全文'] = [
+                data_loader.load_document_data(documents[report_id]) if report_id in documents else None
+                for report_id in records_df[id_column]
+            ]
+
+        # 批量规则已由 coordinator 在整批上执行，这里只并入本分片的结果
+        violation_table = rule_engine.apply_rules_compact(records_df, batch_findings=payload.get('batch_findings', []))
+        triaged = review_triage.triage(records_df, violation_table)
+        needs_llm = [pos for pos, route in enumerate(triaged['triage_route']) if route == ROUTE_NEEDS_LLM]
+        llm_outputs = llm_module.batch_analyze_reports(records_df.iloc[needs_llm].to_dict(orient='records'))
+        llm_by_position = dict(zip(needs_llm, llm_outputs))
+
+        counts = violation_table.counts_per_row()
+        results = pd.DataFrame({
+            '_batch_pos': records_df['_batch_pos'],
+            id_column: records_df[id_column],
+            'violation_count': counts,
+            '复核路径': triaged['triage_route'].tolist(),
+            '分流原因': triaged['triage_reason'].tolist(),
+            'llm_assessment': [llm_by_position[pos]['assessment'] if pos in llm_by_position else None
+                               for pos in range(len(records_df))],
+            'llm_analysis': [llm_by_position[pos]['analysis_details'] if pos in llm_by_position else None
+                             for pos in range(len(records_df))],
+        })
+        violation_records = violation_table.to_records()
+        violations = pd.DataFrame({
+            '_batch_pos': [int(records_df['_batch_pos'].iat[r['row_idx']]) for r in violation_records],
+            id_column: [records_df[id_column].iat[r['row_idx']] for r in violation_records],
+            'rule_name': [r['rule_name'] for r in violation_records],
+            'severity': [r['severity'] for r in violation_records],
+            'details': [r['details'] for r in violation_records],
+        })
+        return {'results': results, 'violations': violations}
+
+    def _heartbeat(self, running_path, stop):
+        # 定期刷新 mtime 作为租约续期，coordinator 据此判断 worker 是否失联
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                os.utime(running_path)
+            except FileNotFoundError:
+                return
+
+    def run_once(self):
+        """Claims and processes a single shard. Returns False when the queue had nothing pending."""
+        claimed = self.queue.claim()
+        if claimed is None:
+            return False
+        name, running_name = claimed
+        running_path = self.queue.path('running', running_name)
+        os.utime(running_path)
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(running_path, stop), daemon=True)
+        heartbeat.start()
+        payload = None
+        try:
+            payload = _read_pickle(running_path)
+            start = time.perf_counter()
+            output = self.process_shard(payload)
+            output.update(shard=payload['shard'], worker=self.worker_id, attempt=payload['attempt'],
+                          elapsed=time.perf_counter() - start)
+            _write_pickle(self.queue.path('done', name), output)
+            print(f"[{self.worker_id}] {name}: {len(output['results'])} reports in {output['elapsed']:.2f}s")
+        except Exception as e:
+            print(f"[{self.worker_id}] {name} failed: {e}")
+            if payload is not None:
+                payload['attempt'] += 1
+                payload['last_error'] = f"{self.worker_id}: {e}"
+                state = 'pending' if payload['attempt'] < payload['max_attempts'] else 'failed'
+                _write_pickle(self.queue.path(state, name), payload)
+        finally:
+            stop.set()
+            heartbeat.join()
+            try:
+                os.remove(running_path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def run(self, poll_interval=1.0, exit_when_idle=False):
+        """Processes shards until interrupted (or until the queue is empty with exit_when_idle)."""
+        print(f"Shard worker {self.worker_id} polling {self.queue.queue_dir}")
+        try:
+            while True:
+                if not self.run_once():
+                    if exit_when_idle:
+                        return
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print(f"Shard worker {self.worker_id} stopped.")
+
+
+def run_worker(queue_dir, worker_id=None, exit_when_idle=False):
+    """Process entry point for local multiprocessing workers."""
+    ShardWorker(queue_dir, worker_id).run(exit_when_idle=exit_when_idle)
+
+
+class ShardCoordinator:
+    def __init__(self, queue_dir='cache/shard_queue', n_shards=16, lease_timeout=300.0, max_attempts=3,
+                 rule_engine=None):
+        """Partitions a batch into shards by report ID hash, tracks them and merges the results.
+        Cross-record batch rules are run here once on the full batch, so groups spanning shards are found.
+        Args:
+            queue_dir (str): Shared queue directory (a network share for workers on other hosts).
+            n_shards (int): Number of shards per batch.
+            lease_timeout (float): Seconds without heartbeat after which a running shard is
+                                   considered lost and requeued.
+            max_attempts (int): Attempts per shard before it is moved to failed/.
+            rule_engine (RuleEngine, optional): Engine whose batch rules run on the full batch.
+                                                Defaults to a RuleEngine() created on first submit.
+        """
+        self.queue = ShardQueue(queue_dir)
+        self.n_shards = n_shards
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.rule_engine = rule_engine
+
+    def _batch_findings(self, records_df):
+        if self.rule_engine is None:
+            from review_engine.rule_engine import RuleEngine
+            self.rule_engine = RuleEngine()
+        return self.rule_engine.apply_batch_rules(records_df)
+
+    def submit(self, records_df, id_column=None, documents=None):
+        """Splits records_df into shards and enqueues them.
+        Args:
+            records_df (pd.DataFrame): One row per report.
+            id_column (str, optional): Report ID column. Defaults to the first of REPORT_ID_COLUMNS present.
+            documents (dict, optional): report_id -> PDF path for reports whose full text should be extracted.
+        Returns:
+            str: job_id used to wait for and merge the results.
+        """
+        if id_column is None:
+            id_column = next((c for c in REPORT_ID_COLUMNS if c in records_df.columns), None)
+        if id_column is None:
+            raise ValueError(f"records_df needs a report ID column ({', '.join(REPORT_ID_COLUMNS)}).")
+
+        job_id = time.strftime('%Y%m%d%H%M%S') + uuid.uuid4().hex[:6]
+        records_df = records_df.reset_index(drop=True).assign(_batch_pos=range(len(records_df)))
+        shards = records_df[id_column].map(lambda report_id: shard_of(report_id, self.n_shards))
+        # 批量规则在整批上执行一次，结果按分片拆分并换算为分片内的行位置
+        findings_by_shard = {}
+        for finding in self._batch_findings(records_df):
+            findings_by_shard.setdefault(int(shards.iat[finding[0]]), []).append(finding)
+        documents = documents or {}
+        for shard, shard_df in records_df.groupby(shards, sort=True):
+            shard_ids = set(shard_df[id_column])
+            local_pos = {batch_pos: pos for pos, batch_pos in enumerate(shard_df['_batch_pos'])}
+            self.queue.put(f"{job_id}-{shard:04d}.pkl", {
+                'job_id': job_id, 'shard': int(shard), 'id_column': id_column, 'records': shard_df,
+                'batch_findings': [(local_pos[row_idx],) + tuple(rest)
+                                   for row_idx, *rest in findings_by_shard.get(int(shard), [])],
+                'documents': {rid: path for rid, path in documents.items() if rid in shard_ids},
+                'attempt': 0, 'max_attempts': self.max_attempts,
+            })
+        # 作业清单落盘，其他进程中的 coordinator 也能等待与合并该作业
+        with open(os.path.join(self.queue.queue_dir, 'jobs', f"{job_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump({'job_id': job_id, 'n_shards': int(shards.nunique()), 'id_column': id_column,
+                       'n_reports': len(records_df), 'submitted_at': time.time()}, f, ensure_ascii=False)
+        print(f"Submitted job {job_id}: {len(records_df)} reports in {shards.nunique()} shards")
+        return job_id
+
+    def requeue_expired(self):
+        """Moves running shards whose lease expired back to pending (or failed/ after max_attempts)."""
+        now = time.time()
+        for running_name in self.queue.names('running'):
+            name = ShardQueue.shard_name(running_name)
+            running_path = self.queue.path('running', running_name)
+            try:
+                if now - os.path.getmtime(running_path) < self.lease_timeout:
+                    continue
+                payload = _read_pickle(running_path)
+                os.remove(running_path)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                continue
+            payload['attempt'] += 1
+            payload['last_error'] = 'lease expired'
+            state = 'pending' if payload['attempt'] < payload['max_attempts'] else 'failed'
+            _write_pickle(self.queue.path(state, name), payload)
+            print(f"Shard {name} lease expired, moved to {state}")
+
+    def status(self, job_id):
+        return {state: len(self.queue.names(state, job_id)) for state in QUEUE_STATES}
+
+    def wait(self, job_id, timeout=None, poll_interval=1.0):
+        """Blocks until every shard of the job is done or failed, then returns merge(job_id)."""
+        with open(os.path.join(self.queue.queue_dir, 'jobs', f"{job_id}.json"), 'r', encoding='utf-8') as f:
+            expected = json.load(f)['n_shards']
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            self.requeue_expired()
+            status = self.status(job_id)
+            if len(set(self.queue.names('done', job_id)) | set(self.queue.names('failed', job_id))) >= expected:
+                break
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"Job {job_id} not finished after {timeout}s: {status}")
+            time.sleep(poll_interval)
+        return self.merge(job_id)
+
+    def merge(self, job_id):
+        """Merges shard outputs in original batch order, independent of which worker finished first.
+        Returns:
+            tuple: (results DataFrame, violations DataFrame, list of failed shard numbers)
+        """
+        outputs = [_read_pickle(self.queue.path('done', name)) for name in self.queue.names('done', job_id)]
+        done_names = set(self.queue.names('done', job_id))
+        # 租约过期后重跑成功的分片可能同时留有失败记录，以完成结果为准
+        failed = [_read_pickle(self.queue.path('failed', name))
+                  for name in self.queue.names('failed', job_id) if name not in done_names]
+        for payload in failed:
+            print(f"Shard {payload['shard']} failed after {payload['attempt']} attempts: {payload.get('last_error')}")
+
+        if outputs:
+            results = pd.concat([o['results'] for o in outputs], ignore_index=True)
+            violations = pd.concat([o['violations'] for o in outputs], ignore_index=True)
+        else:
+            results, violations = pd.DataFrame(columns=['_batch_pos']), pd.DataFrame(columns=['_batch_pos'])
+        results = results.sort_values('_batch_pos', kind='stable').drop(columns='_batch_pos').reset_index(drop=True)
+        if 'rule_name' in violations.columns:
+            violations = violations.sort_values(['_batch_pos', 'rule_name'], kind='stable')
+        violations = violations.drop(columns='_batch_pos').reset_index(drop=True)
+        return results, violations, sorted(payload['shard'] for payload in failed)
+
+    def cleanup(self, job_id):
+        for state in QUEUE_STATES:
+            for name in self.queue.names(state, job_id):
+                os.remove(self.queue.path(state, name))
+        job_path = os.path.join(self.queue.queue_dir, 'jobs', f"{job_id}.json")
+        if os.path.exists(job_path):
+            os.remove(job_path)
+
+    def run_local(self, records_df, workers=4, id_column=None, documents=None, timeout=None):
+        """Runs a job with local worker processes (same code path as workers on other hosts)."""
+        import multiprocessing
+
+        job_id = self.submit(records_df, id_column=id_column, documents=documents)
+        processes = [multiprocessing.Process(target=run_worker, args=(self.queue.queue_dir, f"local-{i}", True))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        try:
+            return self.wait(job_id, timeout=timeout)
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self.cleanup(job_id)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="分片批量复核：coordinator 负责切分与合并，worker 可运行在多台主机上")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    worker_parser = subparsers.add_parser('worker', help="从共享队列目录领取分片并处理")
+    worker_parser.add_argument('queue_dir')
+    worker_parser.add_argument('--worker-id')
+    run_parser = subparsers.add_parser('run', help="切分数据文件、等待所有分片完成并合并结果")
+    run_parser.add_argument('data_path')
+    run_parser.add_argument('--queue-dir', default='cache/shard_queue')
+    run_parser.add_argument('--shards', type=int, default=16)
+    run_parser.add_argument('--local-workers', type=int, default=0,
+                            help="同时在本机启动的 worker 进程数；0 表示只等待外部 worker")
+    run_parser.add_argument('--output', default='shard_review_results.csv')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        ShardWorker(args.queue_dir, args.worker_id).run()
+    else:
+        from data_processing.data_loader import DataLoader
+        coordinator = ShardCoordinator(args.queue_dir, n_shards=args.shards)
+        data = DataLoader().load_structured_data(args.data_path)
+        if args.local_workers:
+            merged, merged_violations, failed_shards = coordinator.run_local(data, workers=args.local_workers)
+        else:
+            job = coordinator.submit(data)
+            merged, merged_violations, failed_shards = coordinator.wait(job)
+            coordinator.cleanup(job)
+        merged.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"{len(merged)} reports, {len(merged_violations)} violations, failed shards: {failed_shards or 'none'}")
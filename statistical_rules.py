@@ -0,0 +1,157 @@
+# review_engine/statistical_rules.py
+import numpy as np
+import pandas as pd
+
+# 各类字段的候选列名，按顺序取第一个存在的列
+AMOUNT_COLUMNS = ['amount', '金额', 'total_amount']
+ENTITY_COLUMNS = ['entity', '被审计单位', 'supplier_name']
+SUPPLIER_COLUMNS = ['supplier_name', '供应商名称']
+DATE_COLUMNS = ['date', '日期', 'voucher_date']
+
+# Benford 首位数字的理论分布
+BENFORD_EXPECTED = np.log10(1 + 1 / np.arange(1, 10))
+
+
+def resolve_column(records_df, candidates):
+    """Returns the first candidate column present in records_df, or None."""
+    for column in candidates:
+        if column in records_df.columns:
+            return column
+    return None
+
+
+def _amounts(records_df, amount_col):
+    return pd.to_numeric(records_df[amount_col], errors='coerce').to_numpy(dtype=np.float64)
+
+
+def benford_first_digit(records_df, entity_col=None, amount_col=None, min_count=50, mad_threshold=0.015):
+    """Benford first-digit test per entity.
+    Entities whose mean absolute deviation from the Benford distribution exceeds mad_threshold
+    are nonconforming; their rows whose first digit is over-represented are flagged.
+    Returns:
+        dict: {row position: details text}
+    """
+    entity_col = entity_col or resolve_column(records_df, ENTITY_COLUMNS)
+    amount_col = amount_col or resolve_column(records_df, AMOUNT_COLUMNS)
+    if entity_col is None or amount_col is None or records_df.empty:
+        return {}
+
+    amounts = np.abs(_amounts(records_df, amount_col))
+    valid = np.isfinite(amounts) & (amounts >= 1)
+    positions = np.flatnonzero(valid)
+    values = amounts[valid]
+    digits = (values // 10 ** np.floor(np.log10(values))).astype(np.int64).clip(1, 9)
+    entity_codes, entity_names = pd.factorize(records_df[entity_col].iloc[positions])
+    known = entity_codes >= 0
+    positions, digits, entity_codes = positions[known], digits[known], entity_codes[known]
+    n_entities = len(entity_names)
+    if n_entities == 0:
+        return {}
+
+    counts = np.bincount(entity_codes * 9 + (digits - 1), minlength=n_entities * 9).reshape(n_entities, 9)
+    totals = counts.sum(axis=1)
+    observed = counts / np.maximum(totals, 1)[:, None]
+    deviation = observed - BENFORD_EXPECTED
+    mad = np.abs(deviation).mean(axis=1)
+    nonconforming = (totals >= min_count) & (mad > mad_threshold)
+
+    row_deviation = deviation[entity_codes, digits - 1]
+    flagged = nonconforming[entity_codes] & (row_deviation > mad_threshold)
+    return {
+        int(positions[i]): (f"{entity_names[entity_codes[i]]} 首位数字分布偏离Benford定律 "
+                            f"(MAD={mad[entity_codes[i]]:.4f})，首位数字 {digits[i]} 占比 "
+                            f"{observed[entity_codes[i], digits[i] - 1]:.1%}，理论 {BENFORD_EXPECTED[digits[i] - 1]:.1%}")
+        for i in np.flatnonzero(flagged)
+    }
+
+
+def amount_outliers(records_df, supplier_col=None, date_col=None, amount_col=None,
+                    z_threshold=3.0, iqr_k=1.5, min_group=8):
+    """Flags amounts that are z-score and IQR outliers within their supplier and month.
+    Returns:
+        dict: {row position: details text}
+    """
+    supplier_col = supplier_col or resolve_column(records_df, SUPPLIER_COLUMNS)
+    amount_col = amount_col or resolve_column(records_df, AMOUNT_COLUMNS)
+    if supplier_col is None or amount_col is None or records_df.empty:
+        return {}
+    date_col = date_col or resolve_column(records_df, DATE_COLUMNS)
+
+    keys = [records_df[supplier_col].astype(str)]
+    if date_col is not None:
+        keys.append(pd.to_datetime(records_df[date_col], errors='coerce').dt.to_period('M').astype(str))
+    amounts = pd.Series(_amounts(records_df, amount_col), index=records_df.index)
+    grouped = amounts.groupby(keys, sort=True)
+    codes = grouped.ngroup().to_numpy()
+
+    # 每组统计量只算一次，再按组编号广播回每一行
+    size = grouped.count().to_numpy()[codes]
+    mean = grouped.mean().to_numpy()[codes]
+    std = grouped.std(ddof=0).to_numpy()[codes]
+    q1 = grouped.quantile(0.25).to_numpy()[codes]
+    q3 = grouped.quantile(0.75).to_numpy()[codes]
+
+    values = amounts.to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(std > 0, (values - mean) / std, 0.0)
+    iqr = q3 - q1
+    outside_fence = (values < q1 - iqr_k * iqr) | (values > q3 + iqr_k * iqr)
+    flagged = (size >= min_group) & np.isfinite(values) & (np.abs(z) > z_threshold) & outside_fence
+    return {
+        int(pos): (f"金额 {values[pos]:,.2f} 在同供应商同期间内异常 (z={z[pos]:.1f}, "
+                   f"IQR区间 [{q1[pos] - iqr_k * iqr[pos]:,.2f}, {q3[pos] + iqr_k * iqr[pos]:,.2f}])")
+        for pos in np.flatnonzero(flagged)
+    }
+
+
+def round_amount_clustering(records_df, entity_col=None, amount_col=None, round_unit=1000,
+                            min_count=20, max_share=0.3):
+    """Flags entities where an unusually high share of amounts are exact multiples of round_unit.
+    Returns:
+        dict: {row position: details text}
+    """
+    entity_col = entity_col or resolve_column(records_df, ENTITY_COLUMNS)
+    amount_col = amount_col or resolve_column(records_df, AMOUNT_COLUMNS)
+    if entity_col is None or amount_col is None or records_df.empty:
+        return {}
+
+    amounts = _amounts(records_df, amount_col)
+    valid = np.isfinite(amounts) & (amounts != 0)
+    is_round = valid & (np.mod(np.round(amounts, 2), round_unit) == 0)
+    entity_codes, _ = pd.factorize(records_df[entity_col])
+    n_entities = entity_codes.max() + 1 if len(entity_codes) else 0
+    if n_entities <= 0:
+        return {}
+
+    known = entity_codes >= 0
+    totals = np.bincount(entity_codes[known], weights=valid[known], minlength=n_entities)
+    rounds = np.bincount(entity_codes[known], weights=is_round[known], minlength=n_entities)
+    share = rounds / np.maximum(totals, 1)
+    clustered = (totals >= min_count) & (share > max_share)
+
+    flagged = known & is_round & clustered[np.maximum(entity_codes, 0)]
+    return {
+        int(pos): f"整{round_unit}元金额占比 {share[entity_codes[pos]]:.1%} (共{int(totals[entity_codes[pos]])}笔)，疑似人为凑整"
+        for pos in np.flatnonzero(flagged)
+    }
+
+
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    vouchers_df = pd.DataFrame({
+        'entity': rng.choice([f"公司_{i}" for i in range(200)], size=n),
+        'supplier_name': rng.choice([f"供应商_{i}" for i in range(2000)], size=n),
+        'date': pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, size=n), unit='D'),
+        'amount': np.round(np.exp(rng.normal(8, 1.5, size=n)), 2),
+    })
+    # 人为制造异常：一个单位大量整千金额，一个单位首位数字集中在 9
+    vouchers_df.loc[vouchers_df['entity'] == '公司_7', 'amount'] = rng.integers(1, 50, size=(vouchers_df['entity'] == '公司_7').sum()) * 1000.0
+    vouchers_df.loc[vouchers_df['entity'] == '公司_9', 'amount'] = rng.uniform(9000, 9999, size=(vouchers_df['entity'] == '公司_9').sum())
+
+    for rule in (benford_first_digit, amount_outliers, round_amount_clustering):
+        start = time.perf_counter()
+        result = rule(vouchers_df)
+        print(f"{rule.__name__}: {len(result)} rows flagged in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,209 @@
+# data_processing/text_summarizer.py
+import hashlib
+import json
+import os
+import re
+
+from data_processing.section_index import SectionIndex, build_section_index
+
+# 各章节的重要程度，未列出的章节权重为 1.0
+SECTION_WEIGHTS = {
+    '审计意见': 3.0,
+    '形成审计意见的基础': 2.5,
+    '关键审计事项': 3.0,
+    '与持续经营相关的重大不确定性': 2.5,
+    '强调事项': 2.0,
+}
+
+# 规则与Prompt关注的关键词及其权重
+EVIDENCE_KEYWORDS = {
+    '关键审计事项': 3.0,
+    '审计意见': 3.0,
+    '无保留意见': 2.5,
+    '保留意见': 2.5,
+    '否定意见': 2.5,
+    '无法表示意见': 2.5,
+    '我们认为': 2.0,
+    '公允反映': 2.0,
+    '为何对审计重要': 3.0,
+    '审计应对': 2.0,
+    '收入': 2.0,
+    '营业收入': 2.5,
+    '收入确认': 2.5,
+    '应收账款': 2.0,
+    '存货': 1.5,
+    '减值': 1.5,
+    '关联方': 2.0,
+    '持续经营': 2.0,
+    '审计调整': 2.0,
+    '函证': 1.5,
+    '监盘': 1.5,
+    '重大错报': 2.0,
+}
+
+_SENTENCE_PATTERN = re.compile(r'[^。！？；!?\n]+[。！？；!?]?')
+_NUMBER_PATTERN = re.compile(r'\d[\d,，.]*\s*(?:%|万元|亿元|元)?')
+# 证据包的生成方式变化时递增，使旧缓存失效
+EVIDENCE_FORMAT_VERSION = 2
+
+
+def document_hash(text):
+    """Returns the content hash used to key cached results for a document."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _page_label(first, last):
+    if first is None:
+        return ''
+    return f"（第{first}页）" if first == last else f"（第{first}-{last}页）"
+
+
+class EvidenceSummarizer:
+    def __init__(self, max_chars=3000, cache_dir='cache/evidence', keywords=None,
+                 section_index_dir='cache/section_index'):
+        """Local extractive summarizer that cuts long report text down to a bounded evidence pack.
+        Args:
+            max_chars (int): Upper bound on the evidence pack size in characters.
+            cache_dir (str, optional): Directory for on-disk cache entries. None disables disk caching.
+            keywords (dict, optional): Keyword -> weight. Defaults to EVIDENCE_KEYWORDS.
+            section_index_dir (str, optional): Where DataLoader saves the section indexes (with page
+                                               offsets) of extracted PDFs; used when summarize gets
+                                               no index, so evidence cites pages.
+        """
+        self.max_chars = max_chars
+        self.cache_dir = cache_dir
+        self.section_index_dir = section_index_dir
+        self.keywords = keywords or EVIDENCE_KEYWORDS
+        self._keyword_pattern = re.compile('|'.join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True)))
+        self._memory_cache = {}
+        # 缓存键 = 文档哈希 + 摘要配置指纹：不同长度上限或关键词下的证据包互不复用
+        config = {'version': EVIDENCE_FORMAT_VERSION, 'max_chars': max_chars,
+                  'keywords': sorted(self.keywords.items()), 'section_weights': sorted(SECTION_WEIGHTS.items())}
+        self.config_hash = hashlib.sha256(json.dumps(config, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+    def _score_sentence(self, sentence, section_weight):
+        keyword_score = sum(self.keywords[m.group(0)] for m in self._keyword_pattern.finditer(sentence))
+        number_score = 0.5 * min(len(_NUMBER_PATTERN.findall(sentence)), 4)
+        length_penalty = 0.5 if len(sentence) < 10 else 1.0
+        return (keyword_score + number_score) * section_weight * length_penalty
+
+    def summarize(self, text, section_index=None):
+        """Builds the evidence pack for one document, using the cache when possible.
+        Args:
+            text (str): Extracted document text.
+            section_index (SectionIndex, optional): Precomputed index of text. Loaded from
+                                                    section_index_dir or built on demand if omitted.
+        Returns:
+            dict: {'doc_hash', 'original_chars', 'evidence_chars', 'sections', 'pages', 'evidence_text'}
+                  'pages' holds the [first, last] page of the sentences taken from each entry of
+                  'sections' (None without page information); each section heading in
+                  evidence_text carries the same range, e.g. 【关键审计事项（第3-4页）】.
+        """
+        doc_hash = document_hash(text)
+        if section_index is None and self.section_index_dir:
+            try:
+                section_index = SectionIndex.load(self.section_index_dir, doc_hash)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable section index for {doc_hash[:12]}: {e}")
+        # 有页码的证据包与无页码的分开缓存，PDF 提取后建立的索引能补上页码
+        paged = section_index is not None and section_index.page_offsets is not None
+        cache_key = f"{doc_hash}-{self.config_hash}{'-paged' if paged else ''}"
+        cached = self._load_cached(cache_key)
+        if cached is not None:
+            return cached
+
+        if section_index is None:
+            section_index = build_section_index(text, doc_hash)
+
+        candidates = []
+        for order, section in enumerate(section_index.sections):
+            heading = section['name']
+            weight = SECTION_WEIGHTS.get(heading, 1.0)
+            for match in _SENTENCE_PATTERN.finditer(text, section['start'], section['end']):
+                sentence = match.group(0).strip()
+                if not sentence:
+                    continue
+                score = self._score_sentence(sentence, weight)
+                if score > 0:
+                    candidates.append((score, order, match.start(), heading, sentence))
+
+        # 按得分选取句子直至达到字符上限，再按原文顺序输出
+        selected = []
+        used_chars = 0
+        for candidate in sorted(candidates, key=lambda c: (-c[0], c[2])):
+            sentence = candidate[4]
+            if used_chars + len(sentence) > self.max_chars:
+                continue
+            selected.append(candidate)
+            used_chars += len(sentence)
+        selected.sort(key=lambda c: c[2])
+
+        # 连续取自同一章节的句子归为一段，段首标注章节名与所在页码范围
+        runs = []  # [章节, 起始页, 结束页, 句子列表]
+        for _, _, start, heading, sentence in selected:
+            page = section_index.page_of(start)
+            if not runs or runs[-1][0] != heading:
+                runs.append([heading, page, page, []])
+            runs[-1][2] = page
+            runs[-1][3].append(sentence)
+        lines = []
+        for heading, first, last, sentences in runs:
+            lines.append(f"【{heading}{_page_label(first, last)}】")
+            lines.extend(sentences)
+        evidence_text = '\n'.join(lines)
+        sections = [run[0] for run in runs]
+        pages = [[run[1], run[2]] if run[1] is not None else None for run in runs]
+
+        evidence = {
+            'doc_hash': doc_hash,
+            'original_chars': len(text),
+            'evidence_chars': len(evidence_text),
+            'sections': sections,
+            'pages': pages,
+            'evidence_text': evidence_text,
+        }
+        self._store_cached(cache_key, evidence)
+        print(f"Evidence pack built: {len(text)} -> {len(evidence_text)} chars ({doc_hash[:12]})")
+        return evidence
+
+    def _cache_path(self, cache_key):
+        return os.path.join(self.cache_dir, f"{cache_key}.json")
+
+    def _load_cached(self, cache_key):
+        if cache_key in self._memory_cache:
+            return self._memory_cache[cache_key]
+        if self.cache_dir and os.path.exists(self._cache_path(cache_key)):
+            try:
+                with open(self._cache_path(cache_key), 'r', encoding='utf-8') as f:
+                    evidence = json.load(f)
+                self._memory_cache[cache_key] = evidence
+                return evidence
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable evidence cache for {cache_key[:12]}: {e}")
+        return None
+
+    def _store_cached(self, cache_key, evidence):
+        self._memory_cache[cache_key] = evidence
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._cache_path(cache_key), 'w', encoding='utf-8') as f:
+                json.dump(evidence, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Could not write evidence cache for {cache_key[:12]}: {e}")
+
+
+if __name__ == '__main__':
+    summarizer = EvidenceSummarizer(max_chars=200, cache_dir=None)
+    sample_text = (
+        "审计报告\n致ABC公司全体股东：\n"
+        "一、审计意见\n我们审计了ABC公司财务报表。我们认为，财务报表在所有重大方面公允反映了公司的财务状况。\n"
+        "二、形成审计意见的基础\n我们按照中国注册会计师审计准则的规定执行了审计工作。\n"
+        "三、关键审计事项\n收入确认：2024年度营业收入为12.5亿元，较上年增长30%。该事项为何对审计重要：收入是关键业绩指标。\n"
+        "我们执行的审计应对包括函证和细节测试。\n"
+        "四、管理层和治理层对财务报表的责任\n管理层负责按照企业会计准则的规定编制财务报表。\n"
+    )
+    result = summarizer.summarize(sample_text)
+    print(result['sections'])
+    print(result['evidence_text'])
@@ -0,0 +1,225 @@
+# review_engine/triage.py
+import re
+
+import pandas as pd
+
+from review_engine.violation_table import SEVERITY_LEVELS
+
+# 分流结果
+ROUTE_AUTO_PASS = 'auto-pass'
+ROUTE_AUTO_FLAG = 'auto-flag'
+ROUTE_NEEDS_LLM = 'needs-llm'
+REPORT_ID_COLUMNS = ['报告ID', '报告编号', 'report_id']
+# 比较雷同文本前去掉空白和标点
+_NORMALIZE_PATTERN = re.compile(r'[\s，。、；：！？,.;:!?"“”‘’()（）]+')
+
+# 默认分流配置，可在构造 ReviewTriage 时整体或部分覆盖
+DEFAULT_TRIAGE_CONFIG = {
+    # 命中这些严重程度的规则违规直接标记，无需LLM
+    'auto_flag_severities': ['Critical', 'High'],
+    # 命中这些严重程度的规则违规交给LLM进一步判断
+    'llm_severities': ['Medium', 'Low'],
+    # 数值容差检查：差异比例超过 tolerance 直接标记；
+    # 落在 [tolerance * (1 - ambiguous_band), tolerance) 之间视为临界，交给LLM
+    'margin_checks': [
+        {
+            'name': '营业收入差异',
+            'reported': 'reported_revenue',
+            'reference': 'ledger_revenue',
+            'tolerance': 0.01,
+            'ambiguous_band': 0.5,
+        },
+    ],
+    # 文本/标志字段：取值命中 values 时交给LLM
+    'review_flags': [
+        {'column': '风险提示是否充分', 'values': ['否', False]},
+        {'column': '建议与结论匹配度', 'values': ['不匹配', False]},
+        {'column': '审计意见', 'values': ['保留意见', '否定意见', '无法表示意见']},
+    ],
+    # 配置了本地打分模型时，needs-llm 的报告风险分低于该阈值则自动放行
+    'llm_risk_threshold': 0.5,
+    # 批量雷同规则 -> 比较列：同组报告（该列文本相同且其余送LLM理由相同）只送代表报告给LLM，
+    # 其余成员直接标记人工复核
+    'representative_rules': {'Near-Duplicate Conclusion Check': '关键结论描述'},
+}
+
+
+class ReviewTriage:
+    def __init__(self, config=None, risk_scorer=None):
+        """Initializes the triage stage that sits between RuleEngine and LLMModule.
+        Args:
+            config (dict, optional): Overrides for DEFAULT_TRIAGE_CONFIG. Keys not given
+                                     fall back to the defaults.
+            risk_scorer (LocalRiskScorer, optional): Local pre-filter model. When set, only
+                                                     needs-llm reports scoring at or above
+                                                     'llm_risk_threshold' are sent to the LLM.
+        """
+        self.config = dict(DEFAULT_TRIAGE_CONFIG)
+        if config:
+            self.config.update(config)
+        self.risk_scorer = risk_scorer
+
+    def _margin_ratios(self, reports_df, check):
+        """Returns the relative difference between two numeric columns, or None if they are absent."""
+        if check['reported'] not in reports_df.columns or check['reference'] not in reports_df.columns:
+            return None
+        reported = pd.to_numeric(reports_df[check['reported']], errors='coerce')
+        reference = pd.to_numeric(reports_df[check['reference']], errors='coerce')
+        return (reported - reference).abs() / (reference.abs() + 1e-9)
+
+    def triage(self, reviewed_df, violation_table=None):
+        """Routes every report to auto-pass, auto-flag or needs-llm.
+        Args:
+            reviewed_df (pd.DataFrame): Output of RuleEngine.apply_rules_to_batch, i.e. the
+                                        reports plus a 'rule_violations' column.
+            violation_table (ViolationTable, optional): Output of RuleEngine.apply_rules_compact.
+                                                        Used instead of the 'rule_violations' column.
+        Returns:
+            pd.DataFrame: A copy with 'triage_route' and 'triage_reason' columns added.
+        """
+        if not isinstance(reviewed_df, pd.DataFrame):
+            raise TypeError("Input must be a pandas DataFrame.")
+
+        n = len(reviewed_df)
+        flag_reasons = [[] for _ in range(n)]
+        llm_reasons = [[] for _ in range(n)]
+
+        # 1. 规则结果
+        auto_flag_severities = set(self.config['auto_flag_severities'])
+        llm_severities = set(self.config['llm_severities'])
+        representative_rules = self.config['representative_rules']
+        group_hits = {}  # 雷同规则名 -> {行位置: 该规则的理由}
+        if violation_table is not None:
+            rule_hits = ((pos, violation_table.rules[rule_id]['name'], SEVERITY_LEVELS[severity])
+                    for pos, rule_id, severity in zip(violation_table.row_idx, violation_table.rule_id,
+                                                      violation_table.severity))
+        elif 'rule_violations' in reviewed_df.columns:
+            rule_hits = ((pos, violation['rule_name'], violation['severity'])
+                    for pos, violations in enumerate(reviewed_df['rule_violations'])
+                    for violation in violations or [])
+        else:
+            rule_hits = ()
+        for pos, rule_name, severity in rule_hits:
+            label = f"规则违规: {rule_name} ({severity})"
+            if severity in auto_flag_severities:
+                flag_reasons[pos].append(label)
+            elif severity in llm_severities:
+                llm_reasons[pos].append(label)
+                if rule_name in representative_rules:
+                    group_hits.setdefault(rule_name, {})[pos] = label
+
+        # 2. 数值容差（整列计算）
+        for check in self.config['margin_checks']:
+            ratios = self._margin_ratios(reviewed_df, check)
+            if ratios is None:
+                continue
+            tolerance = check['tolerance']
+            lower = tolerance * (1 - check.get('ambiguous_band', 0.5))
+            over = (ratios >= tolerance).to_numpy()
+            near = ((ratios >= lower) & (ratios < tolerance)).to_numpy()
+            values = ratios.to_numpy()
+            for pos in over.nonzero()[0]:
+                flag_reasons[pos].append(f"{check['name']}超出容差: {values[pos]:.2%} >= {tolerance:.2%}")
+            for pos in near.nonzero()[0]:
+                llm_reasons[pos].append(f"{check['name']}接近容差: {values[pos]:.2%} (容差 {tolerance:.2%})")
+
+        # 3. 文本/标志字段
+        for flag in self.config['review_flags']:
+            column = flag['column']
+            if column not in reviewed_df.columns:
+                continue
+            hits = reviewed_df[column].isin(flag['values']).to_numpy()
+            for pos in hits.nonzero()[0]:
+                llm_reasons[pos].append(f"{column}={reviewed_df[column].iat[pos]}")
+
+        # 4. 雷同报告只送代表报告
+        covered = self._group_representatives(reviewed_df, group_hits, flag_reasons, llm_reasons)
+
+        routes = []
+        reasons = []
+        for pos in range(n):
+            if pos in covered:
+                routes.append(ROUTE_AUTO_FLAG)
+                reasons.append('; '.join(llm_reasons[pos]) + '; ' + covered[pos])
+            elif flag_reasons[pos]:
+                routes.append(ROUTE_AUTO_FLAG)
+                reasons.append('; '.join(flag_reasons[pos]))
+            elif llm_reasons[pos]:
+                routes.append(ROUTE_NEEDS_LLM)
+                reasons.append('; '.join(llm_reasons[pos]))
+            else:
+                routes.append(ROUTE_AUTO_PASS)
+                reasons.append('规则全部通过且数值在容差范围内')
+
+        triaged_df = reviewed_df.copy()
+        triaged_df['triage_route'] = routes
+        triaged_df['triage_reason'] = reasons
+
+        # 5. 本地模型预筛：只对 needs-llm 的报告打分，一次向量化完成
+        if self.risk_scorer is not None:
+            self._apply_risk_scores(triaged_df)
+        print(f"Triage complete: {self.summarize(triaged_df)}")
+        return triaged_df
+
+    def _group_representatives(self, reviewed_df, group_hits, flag_reasons, llm_reasons):
+        """Keeps one needs-llm representative per group of near-identical reports.
+        A report flagged by a representative rule is covered by an earlier report when the compared
+        column has the same normalized text and all its other LLM reasons are identical, so the
+        representative's LLM review applies to it as well.
+        Returns:
+            dict: {row position: reason} of the covered reports.
+        """
+        id_column = next((c for c in REPORT_ID_COLUMNS if c in reviewed_df.columns), None)
+        covered = {}
+        for rule_name, labels in group_hits.items():
+            column = self.config['representative_rules'][rule_name]
+            if column not in reviewed_df.columns:
+                continue
+            representatives = {}
+            for pos in sorted(labels):
+                if flag_reasons[pos] or pos in covered:
+                    continue
+                text = _NORMALIZE_PATTERN.sub('', str(reviewed_df[column].iat[pos]))
+                others = tuple(reason for reason in llm_reasons[pos] if reason != labels[pos])
+                representative = representatives.setdefault((text, others), pos)
+                if representative != pos:
+                    name = reviewed_df[id_column].iat[representative] if id_column else f"第{representative + 1}行"
+                    covered[pos] = f"与代表报告 {name} 雷同且复核要点相同，由代表报告送LLM，本报告直接标记人工复核"
+        return covered
+
+    def _apply_risk_scores(self, triaged_df):
+        """Scores needs-llm reports locally and auto-passes those below the risk threshold."""
+        threshold = self.config['llm_risk_threshold']
+        needs_llm = (triaged_df['triage_route'] == ROUTE_NEEDS_LLM).to_numpy()
+        scores = pd.Series(float('nan'), index=triaged_df.index)
+        if needs_llm.any():
+            scores[needs_llm] = self.risk_scorer.score(triaged_df[needs_llm])
+        triaged_df['local_risk_score'] = scores
+
+        low_risk = needs_llm & (scores < threshold).to_numpy()
+        triaged_df.loc[low_risk, 'triage_reason'] = (
+            triaged_df.loc[low_risk, 'triage_reason']
+            + scores[low_risk].map(lambda s: f"; 本地模型风险分 {s:.2f} < {threshold:.2f}，自动放行")
+        )
+        triaged_df.loc[low_risk, 'triage_route'] = ROUTE_AUTO_PASS
+
+    def summarize(self, triaged_df):
+        """Returns the number of reports per route."""
+        counts = triaged_df['triage_route'].value_counts()
+        return {route: int(counts.get(route, 0)) for route in (ROUTE_AUTO_PASS, ROUTE_AUTO_FLAG, ROUTE_NEEDS_LLM)}
+
+
+if __name__ == '__main__':
+    triage = ReviewTriage()
+    reports_df = pd.DataFrame([
+        {'report_id': 'AR202501', 'reported_revenue': 1000000.0, 'ledger_revenue': 1000500.0,
+         'rule_violations': [], '风险提示是否充分': '是'},
+        {'report_id': 'AR202502', 'reported_revenue': 993000.0, 'ledger_revenue': 1000000.0,
+         'rule_violations': [], '风险提示是否充分': '是'},
+        {'report_id': 'AR202503', 'reported_revenue': 900000.0, 'ledger_revenue': 1000000.0,
+         'rule_violations': [{'rule_name': 'Revenue Data Consistency Check (within 1%)', 'severity': 'High'}],
+         '风险提示是否充分': '是'},
+        {'report_id': 'AR202504', 'reported_revenue': 500000.0, 'ledger_revenue': 500000.0,
+         'rule_violations': [], '风险提示是否充分': '否'},
+    ])
+    print(triage.triage(reports_df)[['report_id', 'triage_route', 'triage_reason']])
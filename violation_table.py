@@ -0,0 +1,229 @@
+# review_engine/violation_table.py
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# 违规状态
+STATUS_FAILED = 0  # 规则条件不满足
+STATUS_ERROR = 1   # 规则执行出错
+
+# 严重程度按从低到高编码，便于向量化比较
+SEVERITY_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+SEVERITY_CODES = {name: code for code, name in enumerate(SEVERITY_LEVELS)}
+
+
+class ViolationTableBuilder:
+    def __init__(self):
+        """Accumulates violations into typed arrays while rules are being applied."""
+        self._row_idx = array('i')
+        self._rule_id = array('h')
+        self._status = array('b')
+        self._error_messages = {}
+        self._details = {}
+
+    def add(self, row_idx, rule_id, status=STATUS_FAILED, error_message=None, details=None):
+        if error_message is not None:
+            self._error_messages[len(self._row_idx)] = error_message
+        if details is not None:
+            self._details[len(self._row_idx)] = details
+        self._row_idx.append(row_idx)
+        self._rule_id.append(rule_id)
+        self._status.append(status)
+
+    def build(self, rules, n_rows, report_ids=None):
+        """Freezes the accumulated violations into a ViolationTable."""
+        return ViolationTable(
+            rules,
+            np.frombuffer(self._row_idx, dtype=np.int32).copy(),
+            np.frombuffer(self._rule_id, dtype=np.int16).copy(),
+            np.frombuffer(self._status, dtype=np.int8).copy(),
+            n_rows,
+            report_ids=report_ids,
+            error_messages=self._error_messages,
+            details=self._details,
+        )
+
+
+class ViolationTable:
+    def __init__(self, rules, row_idx, rule_id, status, n_rows, report_ids=None, error_messages=None, details=None):
+        """Long-format rule violations: one (row_idx, rule_id, status) triple per violation.
+        Args:
+            rules (list of dict): Rule catalog indexed by rule_id; each dict has at least
+                                  'name', 'description' and 'severity'. Stored once, not per row.
+            row_idx (np.ndarray[int32]): Position of the violating report in the batch.
+            rule_id (np.ndarray[int16]): Index of the violated rule in rules.
+            status (np.ndarray[int8]): STATUS_FAILED or STATUS_ERROR.
+            n_rows (int): Number of reports in the batch.
+            report_ids (array-like, optional): Report ID per row, used when expanding to dicts.
+            error_messages (dict, optional): Violation position -> error text for STATUS_ERROR entries.
+            details (dict, optional): Violation position -> details text overriding the default
+                                      'Failed on report ...' (used by batch rules).
+        """
+        self.rules = rules
+        self.row_idx = row_idx
+        self.rule_id = rule_id
+        self.status = status
+        self.n_rows = n_rows
+        self.report_ids = report_ids
+        self.error_messages = error_messages or {}
+        self.details = details or {}
+        self._rule_severity = np.array([SEVERITY_CODES.get(r['severity'], 0) for r in rules], dtype=np.int8)
+
+    def __len__(self):
+        return len(self.row_idx)
+
+    @property
+    def severity(self):
+        """Severity code per violation; rule execution errors count as Critical."""
+        codes = self._rule_severity[self.rule_id] if len(self.rules) else np.zeros(len(self), dtype=np.int8)
+        return np.where(self.status == STATUS_ERROR, SEVERITY_CODES['Critical'], codes).astype(np.int8)
+
+    def _take(self, mask):
+        positions = np.flatnonzero(mask)
+        error_messages = {}
+        details = {}
+        if self.error_messages or self.details:
+            remap = {old: new for new, old in enumerate(positions)}
+            error_messages = {remap[pos]: msg for pos, msg in self.error_messages.items() if pos in remap}
+            details = {remap[pos]: text for pos, text in self.details.items() if pos in remap}
+        return ViolationTable(self.rules, self.row_idx[positions], self.rule_id[positions], self.status[positions],
+                              self.n_rows, report_ids=self.report_ids, error_messages=error_messages, details=details)
+
+    def filter(self, min_severity=None, severities=None, rule_names=None, rows=None):
+        """Returns the subset of violations matching all given criteria.
+        Args:
+            min_severity (str, optional): Keep violations at or above this severity.
+            severities (list of str, optional): Keep only these severities.
+            rule_names (list of str, optional): Keep only these rules.
+            rows (array-like, optional): Keep only these row positions.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_severity is not None:
+            mask &= self.severity >= SEVERITY_CODES[min_severity]
+        if severities is not None:
+            mask &= np.isin(self.severity, [SEVERITY_CODES[s] for s in severities])
+        if rule_names is not None:
+            wanted = [i for i, r in enumerate(self.rules) if r['name'] in set(rule_names)]
+            mask &= np.isin(self.rule_id, wanted)
+        if rows is not None:
+            mask &= np.isin(self.row_idx, np.asarray(rows))
+        return self._take(mask)
+
+    def slice_rows(self, start, stop):
+        """Violations of rows [start, stop), with row positions rebased to start at 0."""
+        sliced = self._take((self.row_idx >= start) & (self.row_idx < stop))
+        sliced.row_idx = (sliced.row_idx - start).astype(np.int32)
+        sliced.n_rows = stop - start
+        if self.report_ids is not None:
+            sliced.report_ids = list(self.report_ids[start:stop])
+        return sliced
+
+    def count_by_rule(self):
+        """Returns {rule name: number of violations}."""
+        counts = np.bincount(self.rule_id, minlength=len(self.rules))
+        return {rule['name']: int(counts[i]) for i, rule in enumerate(self.rules) if counts[i]}
+
+    def count_by_severity(self):
+        """Returns {severity: number of violations}."""
+        counts = np.bincount(self.severity, minlength=len(SEVERITY_LEVELS))
+        return {name: int(counts[code]) for code, name in enumerate(SEVERITY_LEVELS) if counts[code]}
+
+    def counts_per_row(self):
+        """Number of violations of every report in the batch."""
+        return np.bincount(self.row_idx, minlength=self.n_rows)
+
+    def max_severity_per_row(self):
+        """Highest severity code per report, -1 for reports without violations."""
+        result = np.full(self.n_rows, -1, dtype=np.int8)
+        np.maximum.at(result, self.row_idx, self.severity)
+        return result
+
+    def rows_with_violations(self):
+        return np.unique(self.row_idx)
+
+    def _expand(self, position):
+        """Builds the legacy violation dict for one entry."""
+        row = int(self.row_idx[position])
+        rule = self.rules[self.rule_id[position]]
+        report_id = self.report_ids[row] if self.report_ids is not None else 'N/A'
+        if self.status[position] == STATUS_ERROR:
+            return {
+                'rule_name': rule['name'],
+                'description': f"Error during rule execution: {self.error_messages.get(position, '')}",
+                'severity': 'Critical',
+                'details': f"Error on report {report_id}"
+            }
+        return {
+            'rule_name': rule['name'],
+            'description': rule['description'],
+            'severity': rule['severity'],
+            'details': self.details.get(position, f"Failed on report {report_id}")
+        }
+
+    def to_records(self):
+        """Expands every violation into a dict (for display or export only)."""
+        return [dict(self._expand(pos), row_idx=int(self.row_idx[pos])) for pos in range(len(self))]
+
+    def to_lists(self):
+        """Expands into one list of violation dicts per report, the format of the 'rule_violations' column."""
+        lists = [[] for _ in range(self.n_rows)]
+        for pos in np.argsort(self.row_idx, kind='stable'):
+            lists[self.row_idx[pos]].append(self._expand(pos))
+        return lists
+
+    def to_frame(self):
+        """Long-format DataFrame with categorical rule metadata, suitable for group-by and export."""
+        names = pd.Categorical.from_codes(self.rule_id, categories=[r['name'] for r in self.rules]) \
+            if self.rules else pd.Categorical([])
+        return pd.DataFrame({
+            'row_idx': self.row_idx,
+            'rule_name': names,
+            'severity': pd.Categorical.from_codes(self.severity, categories=SEVERITY_LEVELS),
+            'status': self.status,
+        })
+
+    def memory_bytes(self):
+        return self.row_idx.nbytes + self.rule_id.nbytes + self.status.nbytes
+
+
+
+def concat_violation_tables(tables):
+    """Stacks the tables of consecutive batches reviewed by the same RuleEngine into one table.
+    Row positions are rebased so that each batch follows the previous one.
+    """
+    if not tables:
+        return ViolationTable([], np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int16),
+                              np.zeros(0, dtype=np.int8), 0)
+    row_offset = 0
+    violation_offset = 0
+    row_idx, error_messages, details, report_ids = [], {}, {}, []
+    for table in tables:
+        row_idx.append(table.row_idx + row_offset)
+        error_messages.update({pos + violation_offset: msg for pos, msg in table.error_messages.items()})
+        details.update({pos + violation_offset: text for pos, text in table.details.items()})
+        if report_ids is not None and table.report_ids is not None:
+            report_ids.extend(table.report_ids)
+        else:
+            report_ids = None
+        row_offset += table.n_rows
+        violation_offset += len(table)
+    return ViolationTable(tables[0].rules, np.concatenate(row_idx).astype(np.int32),
+                          np.concatenate([t.rule_id for t in tables]), np.concatenate([t.status for t in tables]),
+                          row_offset, report_ids=report_ids, error_messages=error_messages, details=details)
+
+if __name__ == '__main__':
+    catalog = [
+        {'name': 'Revenue Data Consistency Check (within 1%)', 'description': '收入差异检查', 'severity': 'High'},
+        {'name': 'Key Audit Matters Analysis Check', 'description': '关键审计事项检查', 'severity': 'Medium'},
+    ]
+    builder = ViolationTableBuilder()
+    builder.add(0, 1)
+    builder.add(2, 0)
+    builder.add(2, 1, STATUS_ERROR, "KeyError: 'kam_description'")
+    table = builder.build(catalog, n_rows=3, report_ids=['AR202501', 'AR202502', 'AR202503'])
+    print(table.count_by_rule())
+    print(table.count_by_severity())
+    print(table.max_severity_per_row())
+    print(table.filter(min_severity='High').to_records())
+    print(table.to_lists())